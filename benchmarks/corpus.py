@@ -0,0 +1,189 @@
+r"""
+Seeded generator of synthetic documents (and the extension configs to render them with) for benchmarks.
+
+Usage:
+    .. code-block:: py
+
+        from corpus import CorpusParams, generate_document, make_extension_configs
+
+        params = CorpusParams(extensions=("thms", "div"), envs=500, max_depth=3)
+        text = generate_document(params, seed=0)
+        extension_configs = make_extension_configs(params)
+
+The same parameters and seed always generate the same document.
+"""
+
+import random
+from dataclasses import dataclass
+
+
+EXTENSIONS = ("captioned_figure", "cited_blockquote", "div", "dropdown", "thms")
+
+WORDS = (
+    "let be a the of and with for every there exists such that if then we have all finite group ring field map "
+    "continuous bounded open set space prime integer sequence converges"
+).split()
+
+
+@dataclass(frozen=True)
+class CorpusParams:
+    r"""
+    Parameters of generated documents.
+
+    Attributes:
+        extensions: Extensions whose environments to generate (see `EXTENSIONS`).
+        envs: Number of top-level environments per document.
+        types: Number of types defined for each of `div`, `dropdown`, and `thms`' div and dropdown environments.
+        max_depth: Maximum depth of environments nested in each other (`1` for no nesting).
+        nest_rate: Chance of each environment containing a nested environment, if `max_depth` allows it.
+        counter_depth: Number of segments in theorem counters (e.g. `2` for "Theorem 1.3").
+        ref_rate: Chance of each paragraph containing a theorem `\ref{}`.
+        paragraphs: Number of paragraphs in each environment's content.
+        words: Number of words per paragraph.
+        unclosed_rate: Chance of an unclosed `\begin{}` after each top-level environment.
+        bad_ref_rate: Chance of a `\ref{}` that resolves to nothing after each top-level environment.
+    """
+
+    extensions: tuple = EXTENSIONS
+    envs: int = 200
+    types: int = 3
+    max_depth: int = 2
+    nest_rate: float = 0.3
+    counter_depth: int = 2
+    ref_rate: float = 0.3
+    paragraphs: int = 2
+    words: int = 30
+    unclosed_rate: float = 0.0
+    bad_ref_rate: float = 0.0
+
+
+def make_extension_configs(params: CorpusParams) -> dict:
+    r"""
+    Return `Renderer` extension configs defining every environment that `generate_document()` generates.
+    """
+
+    counter_incr = ",".join(["0"] * (params.counter_depth - 1) + ["1"])
+    extension_configs = {}
+    if "captioned_figure" in params.extensions:
+        extension_configs["CaptionedFigureExtension"] = {"html_class": "figure", "caption_html_class": "caption"}
+    if "cited_blockquote" in params.extensions:
+        extension_configs["CitedBlockquoteExtension"] = {"html_class": "quote", "citation_html_class": "citation"}
+    if "div" in params.extensions:
+        extension_configs["DivExtension"] = {
+            "html_class": "md-div", "types": {f"box{i}": {"html_class": f"box-{i}"} for i in range(params.types)}
+        }
+    if "dropdown" in params.extensions:
+        extension_configs["DropdownExtension"] = {
+            "html_class": "md-dropdown", "summary_html_class": "summary", "content_html_class": "content",
+            "types": {f"drop{i}": {"html_class": f"drop-{i}"} for i in range(params.types)}
+        }
+    if "thms" in params.extensions:
+        extension_configs["ThmsExtension"] = {
+            "div_config": {
+                "html_class": "md-thm",
+                "types": {
+                    f"thm{i}": {"thm_type": f"Theorem{i}", "html_class": f"thm-{i}", "thm_counter_incr": counter_incr}
+                    for i in range(params.types)
+                }
+            },
+            "dropdown_config": {
+                "html_class": "md-proof",
+                "types": {f"proof{i}": {"thm_type": f"Proof{i}"} for i in range(params.types)}
+            },
+            "thm_counter_config": {"add_html_elem": True, "html_id_prefix": "thm-counter-"},
+            "thm_heading_config": {"html_id_prefix": "thm-"}
+        }
+    return extension_configs
+
+
+class DocumentGenerator:
+
+    def __init__(self, params: CorpusParams, seed: int):
+        self.params = params
+        self.rng = random.Random(seed)
+        self.ref_names = []
+        self.thm_count = 0
+        # kinds of environments that can be generated
+        self.kinds = [kind for kind in ("captioned_figure", "cited_blockquote", "div", "dropdown")
+                      if kind in params.extensions]
+        if "thms" in params.extensions:
+            self.kinds += ["thm_div", "thm_dropdown"]
+        # every `(kind, type index)` that can be generated
+        self.choices = [
+            (kind, typ) for kind in self.kinds
+            for typ in (range(params.types) if kind not in ("captioned_figure", "cited_blockquote") else [0])
+        ]
+
+    def paragraph(self) -> str:
+        words = [self.rng.choice(WORDS) for _ in range(self.params.words)]
+        # a little inline Markdown, so inline processing isn't trivially cheap
+        words[0] = words[0].capitalize()
+        words[len(words) // 3] = f"*{words[len(words) // 3]}*"
+        words[len(words) // 2] = f"`{words[len(words) // 2]}`"
+        if self.ref_names and self.rng.random() < self.params.ref_rate:
+            words.append(f"(see \\ref{{{self.rng.choice(self.ref_names)}}})")
+        return " ".join(words) + "."
+
+    def content(self, ancestors: tuple) -> list:
+        blocks = [self.paragraph() for _ in range(self.params.paragraphs)]
+        # environments can't be nested in environments of the same type
+        choices = [choice for choice in self.choices if choice not in ancestors]
+        if choices and len(ancestors) < self.params.max_depth and self.rng.random() < self.params.nest_rate:
+            blocks[1:1] = self.env(ancestors, choices)
+        return blocks
+
+    def env(self, ancestors: tuple = (), choices: list | None = None) -> list:
+        kind, typ = self.rng.choice(choices if choices is not None else self.choices)
+        ancestors += ((kind, typ),)
+        if kind == "captioned_figure":
+            return [
+                "\\begin{captioned_figure}", "![plot](img/plot.png)", "\\begin{caption}", self.paragraph(),
+                "\\end{caption}", "\\end{captioned_figure}"
+            ]
+        if kind == "cited_blockquote":
+            return [
+                "\\begin{cited_blockquote}", *self.content(ancestors), "\\begin{citation}", "Someone, *Some Book*",
+                "\\end{citation}", "\\end{cited_blockquote}"
+            ]
+        if kind == "div":
+            return [f"\\begin{{box{typ}}}", *self.content(ancestors), f"\\end{{box{typ}}}"]
+        if kind == "dropdown":
+            return [
+                f"\\begin{{drop{typ}}}", "\\begin{summary}", self.paragraph(), "\\end{summary}",
+                *self.content(ancestors), f"\\end{{drop{typ}}}"
+            ]
+        if kind == "thm_div":
+            number = self.thm_count
+            self.thm_count += 1
+            # `\ref{}`s resolve to a theorem's name, or its hidden name if it has no name
+            if number % 2 == 0:
+                ref_name = f"Result {number}"
+                start = f"\\begin{{thm{typ}}}[{ref_name}]"
+            else:
+                ref_name = f"r{number}"
+                start = f"\\begin{{thm{typ}}}{{{ref_name}}}"
+            blocks = [start, *self.content(ancestors), f"\\end{{thm{typ}}}"]
+            # only referenced after being defined, like most real documents
+            self.ref_names.append(ref_name)
+            return blocks
+        return [f"\\begin{{proof{typ}}}", *self.content(ancestors), f"\\end{{proof{typ}}}"]
+
+    def document(self) -> str:
+        blocks = ["# Generated document", self.paragraph()]
+        for i in range(self.params.envs):
+            if i % 50 == 0:
+                blocks.append(f"## Section {i // 50 + 1}")
+            blocks += self.env() if self.kinds else [self.paragraph()]
+            if self.kinds and self.rng.random() < self.params.unclosed_rate:
+                blocks.append(self.env()[0])
+            if self.rng.random() < self.params.bad_ref_rate:
+                blocks.append("See \\ref{missing}.")
+        return "\n\n".join(blocks)
+
+
+def generate_document(params: CorpusParams, seed: int = 0) -> str:
+    r"""
+    Generate a document.
+    """
+
+    return DocumentGenerator(params, seed).document()
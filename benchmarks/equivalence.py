@@ -0,0 +1,86 @@
+r"""
+Check every alternative rendering path against `Renderer.convert()` on the test fixtures, generated corpora, and fuzzed
+variants of both, reporting mismatches (minimized) and each path's time relative to `Renderer.convert()`.
+
+Run from the project's root directory with::
+
+    python benchmarks/equivalence.py [--engines parallel,fragment_cache,stream,codegen] [--fuzz 20] [--docs 5] [--envs 50]
+        [--output equivalence.json]
+
+Documents are generated with `corpus.py` in two flavors: well-formed, and with deeper nesting and the occasional
+unclosed environment and unresolved `\ref{}`. The test fixtures are rendered with the configs of
+`tests/equivalence/`. The exit status is `1` if there were any mismatches.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+from corpus import CorpusParams, generate_document, make_extension_configs
+from markdown_environments.equivalence import ENGINES, EquivalenceChecker, Fuzzer
+from tests.equivalence.test_equivalence import EXTENSION_CONFIGS as FIXTURE_EXTENSION_CONFIGS
+
+
+def read_fixtures() -> dict:
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, "tests", "**", "*.txt"), recursive=True)):
+        if not path.endswith("_expected.txt"):
+            with open(path, "r", encoding="utf-8") as file:
+                fixtures[os.path.relpath(path, ROOT)] = file.read()
+    return fixtures
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engines to check")
+    parser.add_argument("--fuzz", type=int, default=20, help="fuzzed variants per document")
+    parser.add_argument("--mutations", type=int, default=3, help="mutations per fuzzed variant")
+    parser.add_argument("--docs", type=int, default=5, help="generated documents per corpus")
+    parser.add_argument("--envs", type=int, default=50, help="top-level environments per generated document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args(argv)
+
+    corpora = {
+        "fixtures": (FIXTURE_EXTENSION_CONFIGS, read_fixtures()),
+    }
+    for name, params in (
+        ("corpus", CorpusParams(envs=args.envs)),
+        ("corpus-malformed", CorpusParams(
+            envs=args.envs, max_depth=3, nest_rate=0.6, unclosed_rate=0.05, bad_ref_rate=0.05
+        ))
+    ):
+        docs = {f"{name}-{i}": generate_document(params, seed=args.seed + i) for i in range(args.docs)}
+        corpora[name] = (make_extension_configs(params), docs)
+
+    results = {}
+    fuzzer = Fuzzer(args.seed)
+    for corpus_name, (extension_configs, docs) in corpora.items():
+        with EquivalenceChecker(extension_configs, engines=args.engines.split(",")) as checker:
+            for source, text in docs.items():
+                checker.check(text, source=source)
+                for i in range(args.fuzz):
+                    checker.check(fuzzer.mutate(text, args.mutations), source=f"{source}#fuzz-{i}")
+        results[corpus_name] = checker.report()
+        for mismatch in checker.mismatches:
+            print(mismatch, end="\n\n")
+        ratios = ", ".join(f"{name} {ratio:.2f}x" for name, ratio in results[corpus_name]["timing_ratios"].items())
+        print(
+            f"{corpus_name}: {results[corpus_name]['documents']} documents, "
+            f"{len(results[corpus_name]['mismatches'])} mismatches; time vs. reference: {ratios}"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"python": sys.version, "params": vars(args), "results": results}, file, indent=4)
+    return 1 if any(result["mismatches"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+r"""
+Measure how long importing the package and each extension takes, using `python -X importtime`.
+
+Run from the project's root directory with::
+
+    python benchmarks/import_time.py [--runs 20] [--output import_time.json] [--compare old_import_time.json]
+
+Each statement is timed in a fresh interpreter `--runs` times, and the median cumulative import time of the
+statement's own modules (i.e. excluding Python's startup imports) is reported in microseconds. Results are written as
+JSON so they can be tracked across releases; `--compare` prints the change relative to a previous results file.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+STATEMENTS = [
+    "import markdown_environments",
+    "from markdown_environments import CaptionedFigureExtension",
+    "from markdown_environments import CitedBlockquoteExtension",
+    "from markdown_environments import DivExtension",
+    "from markdown_environments import DropdownExtension",
+    "from markdown_environments import ThmsExtension",
+    "from markdown_environments.render import Renderer",
+    "import markdown"
+]
+
+
+def measure_once(statement: str) -> dict:
+    env = dict(os.environ)
+    src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    env["PYTHONPATH"] = src_path + os.pathsep + env.get("PYTHONPATH", "")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], env=env, capture_output=True, text=True, check=True
+    )
+    # lines look like "import time:       278 |      27244 |       markdown"; top-level imports have the least indent
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() != "" and len(name) - len(name.lstrip()) == 1:
+            cumulative_us[name.strip()] = int(cumulative)
+    return cumulative_us
+
+
+def measure(statement: str, runs: int, baseline_modules: set) -> dict:
+    totals = []
+    modules = {}
+    for _ in range(runs):
+        cumulative_us = {name: us for name, us in measure_once(statement).items() if name not in baseline_modules}
+        totals.append(sum(cumulative_us.values()))
+        for name, us in cumulative_us.items():
+            modules.setdefault(name, []).append(us)
+    return {
+        "median_us": statistics.median(totals),
+        "modules": {name: statistics.median(us) for name, us in sorted(modules.items())}
+    }
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="file to write JSON results to")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    # modules the interpreter imports at startup anyway
+    baseline_modules = set(measure_once("pass"))
+    results = {
+        "python": sys.version,
+        "statements": {statement: measure(statement, args.runs, baseline_modules) for statement in STATEMENTS}
+    }
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            previous = json.load(file)["statements"]
+    for statement, result in results["statements"].items():
+        line = f"{result['median_us'] / 1000:8.2f} ms  {statement}"
+        if previous is not None and statement in previous and previous[statement]["median_us"] > 0:
+            change = result["median_us"] / previous[statement]["median_us"] - 1
+            line += f"  ({change:+.0%})"
+        print(line)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
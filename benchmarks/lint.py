@@ -0,0 +1,82 @@
+r"""
+Compare linting a corpus with `markdown_environments.lint` against rendering every file of it.
+
+Run from the project's root directory with::
+
+    python benchmarks/lint.py [--files 200] [--envs 200] [--processes 4] [--output lint.json]
+
+A corpus of `--files` documents with `--envs` top-level environments each (generated with `corpus.py`, with some
+unclosed environments and unresolved `\ref{}`\ s) is written to a temporary directory, then timed with `lint_paths()`
+(serially and with `--processes` workers) and with `Renderer.convert()` on every file.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from corpus import CorpusParams, generate_document, make_extension_configs
+from markdown_environments.lint import lint_paths
+from markdown_environments.render import Renderer
+
+
+def time_it(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--envs", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args(argv)
+
+    # the occasional mistake, so the linter has something to report
+    params = CorpusParams(envs=args.envs, unclosed_rate=0.01, bad_ref_rate=0.01)
+    extension_configs = make_extension_configs(params)
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(corpus_dir, f"doc-{i}.md")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(generate_document(params, seed=args.seed + i))
+            paths.append(path)
+
+        def render_all():
+            renderer = Renderer(extension_configs)
+            for path in paths:
+                with open(path, "r", encoding="utf-8") as file:
+                    renderer.convert(file.read())
+
+        diagnostics = []
+        results = {
+            "python": sys.version,
+            "files": args.files,
+            "envs_per_file": args.envs,
+            "lint_serial_s": time_it(lambda: diagnostics.extend(lint_paths(extension_configs, paths, processes=1))),
+            "lint_parallel_s": time_it(lambda: lint_paths(extension_configs, paths, processes=args.processes)),
+            "processes": args.processes,
+            "render_serial_s": time_it(render_all)
+        }
+        results["diagnostics"] = len(diagnostics)
+
+    for name in ("lint_serial_s", "lint_parallel_s", "render_serial_s"):
+        speedup = results["render_serial_s"] / results[name]
+        print(f"{name:16} {results[name]:8.3f} s  ({speedup:.1f}x faster than rendering)")
+    print(f"{results['diagnostics']} diagnostics")
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+r"""
+Drive renders concurrently, like a render service would, and report latency percentiles, throughput, and memory growth.
+
+Run from the project's root directory with::
+
+    python benchmarks/load.py [--mode threads|processes|asyncio] [--concurrency 8] [--workers 4]
+        [--mix 20:0.6,200:0.3,1000:0.1] [--requests 1000 | --duration 60] [--output load.json]
+
+`--concurrency` clients each send a request as soon as their last one is answered, to a pool of `--workers` threads
+or processes, each with its own warmed-up `Renderer`. In `asyncio` mode, the clients are coroutines on one event loop
+that hand their renders to the pool (of `--asyncio-executor` kind), like an asyncio web front end would. Documents are
+generated with `corpus.py` and drawn from `--mix`, a comma-separated list of `<top-level environments>:<weight>`.
+
+Latency is measured by the clients, so it includes time spent queueing for a worker. Memory growth is each process's
+resident set size after its warm-up renders versus at the end of the run, along with the fitted growth per request
+(worker threads share one process, so they're reported together); steady growth over a long run (`--duration`) means
+some state, like theorem maps, is piling up across conversions.
+Everything runs locally.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from corpus import CorpusParams, generate_document, make_extension_configs
+from markdown_environments.render import Renderer
+
+
+MODES = ("threads", "processes", "asyncio")
+
+# set in every worker process by `init_worker()`, and directly in this process for threads
+extension_configs = None
+worker_state = threading.local()
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # not Linux; peak instead of current, which still shows growth
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def init_worker(configs: dict) -> None:
+    global extension_configs
+    extension_configs = configs
+
+
+def render(text: str) -> tuple[int, int]:
+    r"""
+    Render `text` with this worker's `Renderer`, returning the worker's process id and its resident set size
+    afterwards.
+    """
+
+    renderer = getattr(worker_state, "renderer", None)
+    if renderer is None:
+        renderer = worker_state.renderer = Renderer(extension_configs)
+    renderer.convert(text)
+    return os.getpid(), current_rss()
+
+
+class LoadRun:
+    r"""
+    Hands out requests to clients until the run is over, and collects their results.
+    """
+
+    def __init__(self, docs: list, weights: list, requests: int, duration: float, warmup: int, seed: int):
+        self.docs = docs
+        self.weights = weights
+        self.requests = requests
+        self.duration = duration
+        self.warmup = warmup
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.start = None
+        self.end = None
+        self.latencies = []
+        self.chars = 0
+        # per process id: its resident set size after every measured request it answered
+        self.memory = {}
+
+    def next_request(self) -> tuple[str, bool] | None:
+        r"""
+        Return the next document to render and whether it's measured (instead of warm-up), or `None` if the run is
+        over.
+        """
+
+        with self.lock:
+            if self.sent == self.warmup and self.start is None:
+                self.start = time.perf_counter()
+            if self.start is not None and (
+                (self.duration > 0 and time.perf_counter() - self.start >= self.duration)
+                or (self.duration <= 0 and self.sent >= self.warmup + self.requests)
+            ):
+                return None
+            self.sent += 1
+            return self.rng.choices(self.docs, self.weights)[0], self.start is not None
+
+    def record(self, text: str, measured: bool, latency: float, pid: int, rss: int) -> None:
+        with self.lock:
+            # warm-up renders allocate caches etc. in every worker, so growth is only counted after them
+            if not measured:
+                return
+            self.memory.setdefault(pid, []).append(rss)
+            self.latencies.append(latency)
+            self.chars += len(text)
+            self.end = time.perf_counter()
+
+    def results(self) -> dict:
+        latencies = sorted(self.latencies)
+        elapsed = self.end - self.start if self.latencies else 0.0
+        memory = {}
+        for pid, samples in self.memory.items():
+            memory[pid] = {
+                "requests": len(samples),
+                "rss_start_bytes": samples[0],
+                "rss_end_bytes": samples[-1],
+                "rss_growth_bytes": samples[-1] - samples[0],
+                "rss_growth_bytes_per_request": fit_slope(samples)
+            }
+        return {
+            "requests": len(latencies),
+            "elapsed_s": elapsed,
+            "throughput_requests_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            "throughput_chars_per_s": self.chars / elapsed if elapsed > 0 else 0.0,
+            "latency_s": {
+                "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0
+            },
+            "processes": memory
+        }
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))]
+
+
+def fit_slope(values: list) -> float:
+    # least-squares slope of `values` against their indices
+    n = len(values)
+    if n < 2:
+        return 0.0
+    x_mean = (n - 1) / 2
+    y_mean = sum(values) / n
+    return (
+        sum((x - x_mean) * (y - y_mean) for x, y in enumerate(values))
+        / sum((x - x_mean) ** 2 for x in range(n))
+    )
+
+
+def make_executor(kind: str, workers: int, configs: dict) -> concurrent.futures.Executor:
+    if kind == "threads":
+        init_worker(configs)
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(configs,))
+
+
+def run_pool(load_run: LoadRun, executor: concurrent.futures.Executor, concurrency: int) -> None:
+    # each pending future stands for one client waiting on its request
+    pending = {}
+
+    def send() -> None:
+        request = load_run.next_request()
+        if request is not None:
+            pending[executor.submit(render, request[0])] = (*request, time.perf_counter())
+
+    for _ in range(concurrency):
+        send()
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            text, measured, sent_at = pending.pop(future)
+            load_run.record(text, measured, time.perf_counter() - sent_at, *future.result())
+            send()
+
+
+async def run_asyncio(load_run: LoadRun, executor: concurrent.futures.Executor, concurrency: int) -> None:
+    loop = asyncio.get_running_loop()
+
+    async def client() -> None:
+        while (request := load_run.next_request()) is not None:
+            text, measured = request
+            sent_at = time.perf_counter()
+            pid, rss = await loop.run_in_executor(executor, render, text)
+            load_run.record(text, measured, time.perf_counter() - sent_at, pid, rss)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+def parse_mix(mix: str) -> list[tuple[int, float]]:
+    entries = []
+    for entry in mix.split(","):
+        envs, _, weight = entry.partition(":")
+        entries.append((int(envs), float(weight or 1)))
+    return entries
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mode", choices=MODES, default="threads")
+    parser.add_argument("--asyncio-executor", choices=("threads", "processes"), default="processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending requests at once")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="threads or processes rendering")
+    parser.add_argument("--mix", default="20:0.6,200:0.3,1000:0.1", help="<top-level environments>:<weight>,...")
+    parser.add_argument("--docs-per-size", type=int, default=4, help="distinct documents generated per size")
+    parser.add_argument("--requests", type=int, default=1000, help="requests to measure, after warm-up")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run for instead of `--requests`")
+    parser.add_argument("--warmup", type=int, help="requests before measuring (default: 2 per worker)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON results to")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    params = CorpusParams()
+    docs = []
+    weights = []
+    for envs, weight in mix:
+        for i in range(args.docs_per_size):
+            docs.append(generate_document(CorpusParams(envs=envs), seed=args.seed + i))
+            weights.append(weight / args.docs_per_size)
+    warmup = args.warmup if args.warmup is not None else 2 * args.workers
+    load_run = LoadRun(docs, weights, args.requests, args.duration, warmup, args.seed)
+
+    executor_kind = args.asyncio_executor if args.mode == "asyncio" else args.mode
+    with make_executor(executor_kind, args.workers, make_extension_configs(params)) as executor:
+        if args.mode == "asyncio":
+            asyncio.run(run_asyncio(load_run, executor, args.concurrency))
+        else:
+            run_pool(load_run, executor, args.concurrency)
+
+    results = {
+        "python": sys.version,
+        "params": {
+            "mode": args.mode, "executor": executor_kind, "concurrency": args.concurrency, "workers": args.workers,
+            "mix": mix, "requests": args.requests, "duration": args.duration, "warmup": warmup, "seed": args.seed
+        },
+        **load_run.results()
+    }
+
+    latency = results["latency_s"]
+    print(
+        f"{results['requests']} requests in {results['elapsed_s']:.2f} s: "
+        f"{results['throughput_requests_per_s']:.1f} requests/s, "
+        f"{results['throughput_chars_per_s'] / 1e6:.2f} M chars/s"
+    )
+    print(
+        f"latency: p50 {latency['p50'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms, "
+        f"p99 {latency['p99'] * 1000:.1f} ms, max {latency['max'] * 1000:.1f} ms"
+    )
+    for pid, memory in results["processes"].items():
+        print(
+            f"process {pid}: {memory['requests']} requests, rss {memory['rss_start_bytes'] / 2**20:.1f} -> "
+            f"{memory['rss_end_bytes'] / 2**20:.1f} MiB ({memory['rss_growth_bytes_per_request'] / 1024:+.2f} "
+            "KiB/request)"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+r"""
+Measure rendering throughput, per-stage timing, and peak memory on generated documents.
+
+Run from the project's root directory with::
+
+    python benchmarks/run.py [--envs 500] [--runs 5] [--output results.json] [--compare old_results.json]
+
+A document is generated with `corpus.py` for each scenario (each extension on its own, plus all of them together) and
+rendered `--runs` times with a warmed-up `Renderer`. For every scenario, the median time, throughput (characters and
+environments per second), the median time spent in each Python-Markdown stage (each preprocessor, the block parser,
+each treeprocessor, the serializer, and each postprocessor), peak memory from `tracemalloc`, and the overhead relative
+to rendering the same document with a plain, equally reused `markdown.Markdown` object are reported. Results are
+written as JSON so they can be compared between commits with `--compare`.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import markdown
+
+from corpus import EXTENSIONS, CorpusParams, generate_document, make_extension_configs
+from markdown_environments.metrics import iter_processors
+from markdown_environments.render import Renderer
+
+
+SCENARIOS = {extension: (extension,) for extension in EXTENSIONS}
+SCENARIOS["all"] = EXTENSIONS
+
+
+class StageTimer:
+    r"""
+    Accumulates the time spent in each stage of a `markdown.Markdown` object's pipeline, by wrapping every stage.
+    """
+
+    def __init__(self, md: markdown.Markdown):
+        self.totals = defaultdict(float)
+        for stage, name, processor in iter_processors(md):
+            # block processors nest, so the block parser is timed as a whole instead
+            if stage != "blockprocessor":
+                processor.run = self.wrap(f"{stage}:{name}", processor.run)
+        md.parser.parseDocument = self.wrap("block_parser", md.parser.parseDocument)
+        md.serializer = self.wrap("serializer", md.serializer)
+
+    def wrap(self, name: str, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.totals[name] += time.perf_counter() - start
+        return timed
+
+    def pop(self) -> dict:
+        totals = dict(self.totals)
+        self.totals.clear()
+        return totals
+
+
+def measure(text: str, extension_configs: dict, runs: int) -> dict:
+    renderer = Renderer(extension_configs)
+    renderer.convert(text) # warm up
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        renderer.convert(text)
+        times.append(time.perf_counter() - start)
+
+    # separate runs for stage timings, since wrapping every stage adds a little overhead of its own
+    stage_timer = StageTimer(renderer.md)
+    stage_times = defaultdict(list)
+    for _ in range(runs):
+        renderer.convert(text)
+        for name, seconds in stage_timer.pop().items():
+            stage_times[name].append(seconds)
+
+    tracemalloc.start()
+    renderer.convert(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # reused like `renderer`, so the overhead doesn't count building a `markdown.Markdown` object every time
+    vanilla_md = markdown.Markdown()
+    vanilla_md.convert(text) # warm up
+    vanilla_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        vanilla_md.reset()
+        vanilla_md.convert(text)
+        vanilla_times.append(time.perf_counter() - start)
+
+    median_s = statistics.median(times)
+    # including summaries, captions, and citations
+    envs = text.count("\\begin{")
+    vanilla_median_s = statistics.median(vanilla_times)
+    return {
+        "chars": len(text),
+        "envs": envs,
+        "median_s": median_s,
+        "throughput_chars_per_s": len(text) / median_s,
+        "throughput_envs_per_s": envs / median_s,
+        "stages_s": {name: statistics.median(seconds) for name, seconds in stage_times.items()},
+        "peak_memory_bytes": peak,
+        "vanilla_median_s": vanilla_median_s,
+        "overhead": median_s / vanilla_median_s
+    }
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--envs", type=int, default=500, help="top-level environments per document")
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--types", type=int, default=3)
+    parser.add_argument("--counter-depth", type=int, default=2)
+    parser.add_argument("--ref-rate", type=float, default=0.3)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="scenario to run (repeatable)")
+    parser.add_argument("--output", help="file to write JSON results to")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--stages", action="store_true", help="print per-stage timings")
+    args = parser.parse_args(argv)
+
+    results = {
+        "python": sys.version,
+        "markdown": markdown.__version__,
+        "params": {
+            "envs": args.envs, "max_depth": args.max_depth, "types": args.types, "counter_depth": args.counter_depth,
+            "ref_rate": args.ref_rate, "runs": args.runs, "seed": args.seed
+        },
+        "scenarios": {}
+    }
+    for name in args.scenario or SCENARIOS:
+        params = CorpusParams(
+            extensions=SCENARIOS[name], envs=args.envs, max_depth=args.max_depth, types=args.types,
+            counter_depth=args.counter_depth, ref_rate=args.ref_rate
+        )
+        text = generate_document(params, seed=args.seed)
+        results["scenarios"][name] = measure(text, make_extension_configs(params), args.runs)
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            previous = json.load(file)["scenarios"]
+    for name, result in results["scenarios"].items():
+        line = (
+            f"{name:18} {result['median_s'] * 1000:9.1f} ms  "
+            f"{result['throughput_chars_per_s'] / 1e6:6.2f} M chars/s  {result['throughput_envs_per_s']:8.0f} envs/s  "
+            f"peak {result['peak_memory_bytes'] / 2**20:7.1f} MiB  {result['overhead']:5.2f}x vanilla"
+        )
+        if previous is not None and name in previous:
+            time_change = result["median_s"] / previous[name]["median_s"] - 1
+            memory_change = result["peak_memory_bytes"] / previous[name]["peak_memory_bytes"] - 1
+            line += f"  (time {time_change:+.0%}, memory {memory_change:+.0%})"
+        print(line)
+        if args.stages:
+            for stage, seconds in sorted(result["stages_s"].items(), key=lambda item: -item[1]):
+                print(f"    {stage:40} {seconds * 1000:9.2f} ms")
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
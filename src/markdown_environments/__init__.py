@@ -10,11 +10,44 @@ Important:
     - Only nesting different types of environments works; nesting the same environment within itself does not.
 """
 
-from .captioned_figure import CaptionedFigureExtension
-from .cited_blockquote import CitedBlockquoteExtension
-from .div import DivExtension
-from .dropdown import DropdownExtension
-from .thms import ThmsExtension
+import importlib
+
+# not `typing.TYPE_CHECKING`, since importing `typing` alone would take longer than importing this package
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .captioned_figure import CaptionedFigureExtension
+    from .cited_blockquote import CitedBlockquoteExtension
+    from .div import DivExtension
+    from .dropdown import DropdownExtension
+    from .limits import LimitsExtension
+    from .metrics import MetricsExtension
+    from .thms import ThmsExtension
 
 
 __version__ = "1.11.7"
+
+# extensions are imported on first access, so e.g. a program only using `DivExtension` doesn't also pay for importing
+# every other extension (and their dependencies)
+_LAZY_ATTRS = {
+    "CaptionedFigureExtension": ".captioned_figure",
+    "CitedBlockquoteExtension": ".cited_blockquote",
+    "DivExtension": ".div",
+    "DropdownExtension": ".dropdown",
+    "LimitsExtension": ".limits",
+    "MetricsExtension": ".metrics",
+    "ThmsExtension": ".thms"
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value # cache so that `__getattr__()` isn't called again for this name
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
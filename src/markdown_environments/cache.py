@@ -0,0 +1,284 @@
+import copy
+import hashlib
+import json
+import os
+import weakref
+import xml.etree.ElementTree as etree
+
+import markdown_environments
+from . import utils
+
+
+class FragmentCache:
+    r"""
+    An in-memory cache of block-parsed environments, so re-rendering a long document after a small edit only has to
+    block-parse the environments that actually changed.
+
+    Pass the same `FragmentCache` to `DivExtension`/`DropdownExtension` (or `ThmsExtension`'s `div_config` and
+    `dropdown_config`) via their `fragment_cache` config. Environments are keyed by a hash of their source blocks
+    (including their `\begin{}` and `\end{}`), the block parser's state, and the configs of all block processors, and
+    hits are spliced into the document as copies of the cached element tree.
+
+    Note:
+        Theorem counters aren't part of the key since they are only filled in after block parsing (by the theorem
+        counter processor, which still runs over the whole document), so cached theorems are renumbered correctly.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.cache import FragmentCache
+
+            fragment_cache = FragmentCache(max_entries=4096)
+            md = markdown.Markdown(extensions=[
+                ThmsExtension(
+                    div_config={"types": ..., "fragment_cache": fragment_cache},
+                    dropdown_config={"types": ..., "fragment_cache": fragment_cache}
+                )
+            ])
+    """
+
+    # attributes of this package's processors that affect their output
+    PROCESSOR_CONFIG_ATTRS = (
+        "types", "is_thm", "html_class", "summary_html_class", "content_html_class", "caption_html_class",
+        "citation_html_class", "deferred_content", "literal_types", "compact"
+    )
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: Number of environments to keep before evicting the least recently used one.
+        """
+
+        self.entries = utils.LRUCache(max_entries)
+        self.parser_fingerprints = weakref.WeakKeyDictionary()
+
+    def __deepcopy__(self, memo):
+        # a cache is shared state rather than config, so e.g. `Renderer` copying its configs must keep sharing it
+        return self
+
+    def __repr__(self):
+        # stable across processes (unlike the default `repr()`), since it ends up in config fingerprints
+        return f"{self.__class__.__name__}(max_entries={self.entries.max_size})"
+
+    def key(self, processor, blocks: list) -> str:
+        parser = processor.parser
+        # blocks nested in an environment are parsed by every block processor, so all of their configs matter
+        parser_fingerprint = self.parser_fingerprints.get(parser)
+        if parser_fingerprint is None:
+            description = [parser.md.tab_length]
+            for other_processor in parser.blockprocessors:
+                description.append([
+                    f"{other_processor.__class__.__module__}.{other_processor.__class__.__qualname__}",
+                    {attr: getattr(other_processor, attr) for attr in self.PROCESSOR_CONFIG_ATTRS
+                     if hasattr(other_processor, attr)}
+                ])
+            parser_fingerprint = utils.fingerprint_config(description)
+            self.parser_fingerprints[parser] = parser_fingerprint
+
+        key = hashlib.sha256()
+        key.update(parser_fingerprint.encode("utf-8"))
+        key.update(processor.__class__.__qualname__.encode("utf-8"))
+        key.update(repr(parser.state).encode("utf-8"))
+        for block in blocks:
+            key.update(b"\0")
+            key.update(block.encode("utf-8"))
+        return key.hexdigest()
+
+    def get(self, key: str) -> tuple[etree.Element, dict] | None:
+        """
+        Return a copy of the cached element and the link references defined inside it, or `None` on a miss.
+        """
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        elem, references = entry
+        return copy.deepcopy(elem), references
+
+    def put(self, key: str, elem: etree.Element, references: dict) -> None:
+        # copy, since later treeprocessors modify the document's element tree in place
+        self.entries.put(key, (copy.deepcopy(elem), dict(references)))
+
+    def run(self, processor, parent: etree.Element, blocks: list, min_blocks: int = 1) -> bool:
+        """
+        Run an environment processor's `run_uncached()` through the cache.
+
+        Args:
+            processor: Processor whose `test()` just matched `blocks[0]`, with its `end_pattern` and `block_search` set.
+            parent: Element to add the environment's element to, as its last child.
+            blocks: Remaining blocks, starting with the environment's `\\begin{}` block.
+            min_blocks: Minimum number of blocks the processor reads, even if it ends before that; environments
+                shorter than this aren't cached, since the processor could also modify the blocks after them.
+        """
+
+        work_budget = utils.get_work_budget(processor.parser.md)
+        end_i = processor.block_search.find(blocks, processor.end_pattern, work_budget=work_budget)
+        if end_i is None or end_i + 1 < min_blocks:
+            return processor.run_uncached(parent, blocks)
+
+        md = processor.parser.md
+        key = self.key(processor, blocks[:end_i + 1])
+        cached = self.get(key)
+        if cached is not None:
+            if work_budget is not None:
+                work_budget.enter_env()
+                work_budget.exit_env()
+            elem, references = cached
+            parent.append(elem)
+            del blocks[:end_i + 1]
+            md.references.update(references)
+            return True
+
+        # collect the link references defined inside the environment separately, so they can be replayed on hits
+        org_references = md.references
+        md.references = {}
+        try:
+            success = processor.run_uncached(parent, blocks)
+        finally:
+            references = md.references
+            md.references = org_references
+            md.references.update(references)
+        if success:
+            self.put(key, parent[-1], references)
+        return success
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "hits": self.entries.hits,
+            "misses": self.entries.misses,
+            "evictions": self.entries.evictions
+        }
+
+
+class RenderCache:
+    r"""
+    A disk-backed cache of whole rendered documents, shared by every process that uses the same directory.
+
+    Entries are keyed by a hash of the source, a fingerprint of the `Renderer`'s extension configs, and the package's
+    `__version__`, and hold both the HTML and the theorem `\ref{}` map. Entries of documents with captioned figures
+    whose images were probed or hashed (see `CaptionedFigureExtension`) also record those images' mtimes and sizes,
+    and are rendered again once any of them changes. Entries are written atomically, and once the
+    cache's files exceed `max_bytes`, the least recently used entries are evicted.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.cache import RenderCache
+            from markdown_environments.render import Renderer
+
+            render_cache = RenderCache(".render-cache", max_bytes=1024 ** 3)
+            html, thm_ref_map = render_cache.convert(Renderer(extension_configs), input_text)
+            print(render_cache.stats())
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 ** 2):
+        """
+        Args:
+            directory: Directory to keep the cache in; created if it doesn't exist.
+            max_bytes: Total size of cache entries to keep before evicting the least recently used ones.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path in self.entry_paths())
+
+    def entry_paths(self) -> list:
+        paths = []
+        for subdir in os.scandir(self.directory):
+            if subdir.is_dir():
+                paths.extend(entry.path for entry in os.scandir(subdir.path) if entry.name.endswith(".json"))
+        return paths
+
+    def key(self, renderer, text: str) -> str:
+        key = hashlib.sha256()
+        key.update(markdown_environments.__version__.encode("utf-8"))
+        key.update(b"\0")
+        key.update(utils.fingerprint_config([renderer.extension_configs, renderer.defer_refs]).encode("utf-8"))
+        key.update(b"\0")
+        key.update(text.encode("utf-8"))
+        return key.hexdigest()
+
+    def path(self, key: str) -> str:
+        # spread entries over subdirectories so no single directory gets huge
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def convert(self, renderer, text: str) -> tuple[str, dict]:
+        r"""
+        Return the HTML and theorem `\ref{}` map for `text` as rendered by `renderer`, rendering it only on a miss.
+        """
+
+        path = self.path(self.key(renderer, text))
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            # the HTML holds hashes and dimensions of images, which can change without the source changing
+            if entry.get("images", []) == self.image_stats(image_path for image_path, _, _ in entry.get("images", [])):
+                os.utime(path) # mark as recently used for eviction
+                self.hits += 1
+                return entry["html"], entry["thm_ref_map"]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+
+        self.misses += 1
+        html = renderer.convert(text)
+        thm_ref_map = renderer.get_thm_ref_map()
+        entry = {"html": html, "thm_ref_map": thm_ref_map}
+        image_paths = renderer.get_image_paths()
+        if image_paths:
+            entry["images"] = self.image_stats(sorted(set(image_paths)))
+        self.write(path, json.dumps(entry, ensure_ascii=False))
+        return html, thm_ref_map
+
+    @staticmethod
+    def image_stats(image_paths) -> list:
+        # `None`s for images that don't exist, since rendering again once they do changes the HTML too
+        stats = []
+        for image_path in image_paths:
+            try:
+                st = os.stat(image_path)
+                stats.append([image_path, st.st_mtime_ns, st.st_size])
+            except OSError:
+                stats.append([image_path, None, None])
+        return stats
+
+    def write(self, path: str, contents: str) -> None:
+        utils.atomic_write(path, contents)
+        self.total_bytes += os.path.getsize(path)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        # other processes may have added or evicted entries too, so recount from disk instead of trusting our total
+        entries = []
+        for path in self.entry_paths():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        entries.sort()
+        self.total_bytes = sum(size for _, size, _ in entries)
+        # evict a bit below the budget so that the next few writes don't each trigger a full directory scan
+        target_bytes = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes
+        }
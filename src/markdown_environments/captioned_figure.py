@@ -3,6 +3,7 @@ import xml.etree.ElementTree as etree
 
 from markdown.blockprocessors import BlockProcessor
 from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
 
 from . import utils
 
@@ -18,84 +19,137 @@ class CaptionedFigureProcessor(BlockProcessor):
         super().__init__(*args, **kwargs)
         self.html_class = html_class
         self.caption_html_class = caption_html_class
+        self.block_search = utils.BlockSearch(self.parser.md)
 
     def test(self, parent, block):
         return self.START_PATTERN.match(block)
 
     def run(self, parent, blocks):
-        org_blocks = list(blocks)
-
-        # remove figure starting delim
-        blocks[0] = self.START_PATTERN.sub("", blocks[0])
-
-        # find and remove caption starting delim
-        caption_start_i = None
-        for i, block in enumerate(blocks):
-            if self.CAPTION_START_PATTERN.match(block):
-                # remove ending delim and note which block captions started on
-                # (as caption content itself is an unknown number of blocks)
-                caption_start_i = i
-                blocks[i] = self.CAPTION_START_PATTERN.sub("", block)
-                break
-
-        # if no starting delim for caption, restore and do nothing
+        work_budget = utils.get_work_budget(self.parser.md)
+        # find every delim before modifying `blocks`, so nothing needs restoring if one is missing (restoring from a
+        # copy of `blocks` made every figure cost time proportional to the rest of the document)
+        # first block with figure starting delim removed
+        first_block = self.START_PATTERN.sub("", blocks[0])
+
+        # find caption starting delim
+        # (caption content itself is an unknown number of blocks, so note which block it starts on)
+        caption_start_i = self.block_search.find(
+            blocks, self.CAPTION_START_PATTERN, start_block=first_block, match=True, work_budget=work_budget
+        )
+        # if no starting delim for caption, do nothing
         if caption_start_i is None:
-            # `blocks = org_blocks` doesn't work since lists are passed by pointer in Python (value of reference)
-            # so changing the address of `blocks` only updates the local copy of it (the pointer)
-            # we need to change the values pointed to by `blocks` (its list elements)
-            blocks.clear()
-            blocks.extend(org_blocks)
             return False
+        caption_start_block = self.CAPTION_START_PATTERN.sub(
+            "", first_block if caption_start_i == 0 else blocks[caption_start_i]
+        )
 
-        # find and remove caption ending delim, and extract element
+        # find caption ending delim
         # start search at caption starting delim; caption is at end so this is a good optimization
-        delim_found = False
-        for i, block in enumerate(blocks[caption_start_i:], start=caption_start_i):
-            if self.CAPTION_END_PATTERN.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.CAPTION_END_PATTERN.sub("", block)
-                # build HTML for caption
-                caption_elem = etree.Element("figcaption")
-                if self.caption_html_class != "":
-                    caption_elem.set("class", self.caption_html_class)
-                blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
-                self.parser.parseBlocks(caption_elem, blocks[caption_start_i:i + 1])
-                # remove used blocks
-                for _ in range(caption_start_i, i + 1):
-                    blocks.pop(caption_start_i)
-                break
-        # if no ending delim for caption, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        caption_end_i = self.block_search.find(
+            blocks, self.CAPTION_END_PATTERN, start=caption_start_i, start_block=caption_start_block,
+            work_budget=work_budget
+        )
+        # if no ending delim for caption, do nothing
+        if caption_end_i is None:
             return False
 
-        # find and remove figure ending delim, and extract element
-        delim_found = False
-        for i, block in enumerate(blocks):
-            if self.END_PATTERN.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.END_PATTERN.sub("", block)
-                # build HTML for figure
-                figure_elem = etree.SubElement(parent, "figure")
-                if self.html_class != "":
-                    figure_elem.set("class", self.html_class)
-                self.parser.parseBlocks(figure_elem, blocks[:i + 1])
-                figure_elem.append(caption_elem) # make sure caption comes at the end, and inside `figure_elem`
-                # remove used blocks
-                for _ in range(i + 1):
-                    blocks.pop(0)
+        # find figure ending delim, skipping over the caption
+        end_i = None
+        for i in range(caption_start_i):
+            if work_budget is not None:
+                work_budget.scan(1)
+            if self.END_PATTERN.search(first_block if i == 0 else blocks[i]):
+                end_i = i
                 break
-        # if no ending delim for figure, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        if end_i is None:
+            end_i = self.block_search.find(blocks, self.END_PATTERN, start=caption_end_i + 1, work_budget=work_budget)
+        # if no ending delim for figure, do nothing
+        if end_i is None:
             return False
+
+        # remove figure and caption starting delims
+        blocks[0] = first_block
+        blocks[caption_start_i] = caption_start_block
+        # remove caption ending delim, and extract element
+        blocks[caption_end_i] = self.CAPTION_END_PATTERN.sub("", blocks[caption_end_i])
+        # build HTML for caption
+        caption_elem = etree.Element("figcaption")
+        if self.caption_html_class != "":
+            caption_elem.set("class", self.caption_html_class)
+        # remove trailing whitespace from the newline into `\end{}`
+        blocks[caption_end_i] = blocks[caption_end_i].rstrip()
+        self.parser.parseBlocks(caption_elem, blocks[caption_start_i:caption_end_i + 1])
+        # remove used blocks
+        del blocks[caption_start_i:caption_end_i + 1]
+        self.block_search.forget(blocks)
+        if end_i > caption_end_i:
+            end_i -= caption_end_i + 1 - caption_start_i
+
+        # remove figure ending delim, and extract element
+        blocks[end_i] = self.END_PATTERN.sub("", blocks[end_i])
+        # build HTML for figure
+        figure_elem = etree.SubElement(parent, "figure")
+        if self.html_class != "":
+            figure_elem.set("class", self.html_class)
+        if work_budget is not None:
+            work_budget.enter_env()
+        self.parser.parseBlocks(figure_elem, blocks[:end_i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        figure_elem.append(caption_elem) # make sure caption comes at the end, and inside `figure_elem`
+        # remove used blocks
+        del blocks[:end_i + 1]
         return True
 
 
+class FigureImageProcessor(Treeprocessor):
+
+    def __init__(self, *args, image_base_dir: str, image_sizes=None, image_hashes=None, image_out_dir: str = "",
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_base_dir = image_base_dir
+        self.image_sizes = image_sizes
+        self.image_hashes = image_hashes
+        self.image_out_dir = image_out_dir
+        # local image files read by the last run, so caches of whole documents can tell when they change
+        self.image_paths = []
+
+    def run(self, root):
+        # imported here since only documents using these options need it
+        from .images import copy_if_missing, hashed_src, resolve_local_src
+
+        self.image_paths = []
+        for figure_elem in root.iter("figure"):
+            for img_elem in figure_elem.iter("img"):
+                src = img_elem.get("src", "")
+                path = resolve_local_src(src, self.image_base_dir)
+                if path is not None:
+                    self.image_paths.append(path)
+                if self.image_sizes is not None:
+                    if path is not None and "width" not in img_elem.attrib and "height" not in img_elem.attrib:
+                        size = self.image_sizes.get(path)
+                        if size is not None:
+                            img_elem.set("width", str(size[0]))
+                            img_elem.set("height", str(size[1]))
+                    if "loading" not in img_elem.attrib:
+                        img_elem.set("loading", "lazy")
+                    if "decoding" not in img_elem.attrib:
+                        img_elem.set("decoding", "async")
+                if self.image_hashes is not None and path is not None:
+                    digest = self.image_hashes.get(path)
+                    if digest is not None:
+                        new_src = hashed_src(src, digest)
+                        if self.image_out_dir != "":
+                            out_path = resolve_local_src(new_src, self.image_out_dir)
+                            if out_path is None:
+                                continue
+                            copy_if_missing(path, out_path)
+                        img_elem.set("src", new_src)
+        for cache in (self.image_sizes, self.image_hashes):
+            if cache is not None:
+                cache.save()
+
+
 class CaptionedFigureExtension(Extension):
     r"""
     Any chunk of content, such as an image, with a caption underneath.
@@ -137,6 +191,22 @@ class CaptionedFigureExtension(Extension):
     Note:
         The `caption` block can be placed anywhere within the `captioned_figure` block, as long as, of course, there are
         blank lines before and after the `caption` block.
+
+    With `image_attrs` enabled, every `<img>` inside a figure also gets `loading="lazy"` and `decoding="async"`, plus
+    `width` and `height` if its `src` is a local PNG, JPEG, GIF, or WebP file (so browsers can lay out the page before
+    images load). Dimensions are read from file headers only, and cached by each file's mtime and size, optionally in
+    `image_cache_path` so later builds only probe new or changed files. Images that already have a `width` or `height`
+    keep theirs.
+
+    With `hash_images` enabled, every local `<img>` `src` inside a figure is also rewritten to include a hash of the
+    file's contents (e.g. `img/plot.png` becomes `img/plot.1a2b3c4d5e6f.png`), so images can be served with long-lived
+    cache headers. Hashes are cached like dimensions, in `image_hash_cache_path`, and only recomputed for files whose
+    mtime or size changed. If `image_out_dir` is set, each hashed file is also copied there (at its new `src`, relative
+    to `image_out_dir`) unless it already exists; otherwise copying them is up to the build.
+
+    Both only apply to images written in Markdown (`![alt](src)`). Raw HTML `<img>` tags are passed through as-is,
+    without dimensions, lazy loading attributes, or hashed `src`s, and since their files are never read, `RenderCache`
+    doesn't track them either.
     """
 
     def __init__(self, **kwargs):
@@ -145,6 +215,18 @@ class CaptionedFigureExtension(Extension):
 
             - **html_class** (*str*) -- HTML `class` attribute to add to figures (default: `""`).
             - **caption_html_class** (*str*) -- HTML `class` attribute to add to captions (default: `""`).
+            - **image_attrs** (*bool*) -- Whether to add dimensions and lazy loading attributes to figures' images
+              (default: `False`).
+            - **image_base_dir** (*str*) -- Directory that images' relative and root-relative `src` attributes are
+              resolved against when reading their dimensions (default: `"."`).
+            - **image_cache_path** (*str*) -- JSON file to persist image dimensions in across builds, or `""` to only
+              cache them in memory (default: `""`).
+            - **hash_images** (*bool*) -- Whether to rewrite figures' local image `src` attributes to content-hashed
+              file names (default: `False`).
+            - **image_hash_cache_path** (*str*) -- JSON file to persist image hashes in across builds, or `""` to only
+              cache them in memory (default: `""`).
+            - **image_out_dir** (*str*) -- Directory to copy images to under their content-hashed names, or `""` to not
+              copy them (default: `""`).
         """
 
         self.config = {
@@ -155,14 +237,60 @@ class CaptionedFigureExtension(Extension):
             "caption_html_class": [
                 "",
                 "HTML `class` attribute to add to captioned figure's caption (default: `\"\"`)."
+            ],
+            "image_attrs": [
+                False,
+                "Whether to add dimensions and lazy loading attributes to captioned figures' images (default: `False`)."
+            ],
+            "image_base_dir": [
+                ".",
+                "Directory that images' `src`s are resolved against when reading their dimensions (default: `\".\"`)."
+            ],
+            "image_cache_path": [
+                "",
+                "JSON file to persist image dimensions in, or `\"\"` to only cache them in memory (default: `\"\"`)."
+            ],
+            "hash_images": [
+                False,
+                "Whether to rewrite captioned figures' local image `src`s to content-hashed names (default: `False`)."
+            ],
+            "image_hash_cache_path": [
+                "",
+                "JSON file to persist image hashes in, or `\"\"` to only cache them in memory (default: `\"\"`)."
+            ],
+            "image_out_dir": [
+                "",
+                "Directory to copy images to under content-hashed names, or `\"\"` to not copy them (default: `\"\"`)."
             ]
         }
         utils.init_extension_with_configs(self, **kwargs)
+        self.image_sizes = None
+        self.image_hashes = None
 
     def extendMarkdown(self, md):
+        configs = self.getConfigs()
         md.parser.blockprocessors.register(
-            CaptionedFigureProcessor(md.parser, **self.getConfigs()), "captioned_figure", 105
+            CaptionedFigureProcessor(
+                md.parser, html_class=configs["html_class"], caption_html_class=configs["caption_html_class"]
+            ),
+            "captioned_figure", 105
         )
+        if configs["image_attrs"] or configs["hash_images"]:
+            # imported here since only documents using these options need it
+            from .images import StatCache, hash_file, probe_image_size
+
+            if configs["image_attrs"] and self.image_sizes is None:
+                self.image_sizes = StatCache(probe_image_size, path=configs["image_cache_path"] or None)
+            if configs["hash_images"] and self.image_hashes is None:
+                self.image_hashes = StatCache(hash_file, path=configs["image_hash_cache_path"] or None)
+            # after `inline`, which creates the `<img>`s
+            md.treeprocessors.register(
+                FigureImageProcessor(
+                    md, image_base_dir=configs["image_base_dir"], image_sizes=self.image_sizes,
+                    image_hashes=self.image_hashes, image_out_dir=configs["image_out_dir"]
+                ),
+                "captioned_figure_images", 15
+            )
 
 
 def makeExtension(**kwargs):
@@ -18,79 +18,86 @@ class CitedBlockquoteProcessor(BlockProcessor):
         super().__init__(*args, **kwargs)
         self.html_class = html_class
         self.citation_html_class = citation_html_class
+        self.block_search = utils.BlockSearch(self.parser.md)
 
     def test(self, parent, block):
         return self.START_PATTERN.match(block)
 
     def run(self, parent, blocks):
-        org_blocks = list(blocks)
-
-        # remove blockquote starting delim
-        blocks[0] = self.START_PATTERN.sub("", blocks[0])
-
-        # find and remove citation starting delim
-        delim_found = False
-        citation_start_i = None
-        for i, block in enumerate(blocks):
-            if self.CITATION_START_PATTERN.match(block):
-                delim_found = True
-                # remove ending delim and note which block citation started on
-                # (as citation content itself is an unknown number of blocks)
-                citation_start_i = i
-                blocks[i] = self.CITATION_START_PATTERN.sub("", block)
-                break
-        # if no starting delim for citation, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        work_budget = utils.get_work_budget(self.parser.md)
+        # find every delim before modifying `blocks`, so nothing needs restoring if one is missing (restoring from a
+        # copy of `blocks` made every blockquote cost time proportional to the rest of the document)
+        # first block with blockquote starting delim removed
+        first_block = self.START_PATTERN.sub("", blocks[0])
+
+        # find citation starting delim
+        # (citation content itself is an unknown number of blocks, so note which block it starts on)
+        citation_start_i = self.block_search.find(
+            blocks, self.CITATION_START_PATTERN, start_block=first_block, match=True, work_budget=work_budget
+        )
+        # if no starting delim for citation, do nothing
+        if citation_start_i is None:
             return False
+        citation_start_block = self.CITATION_START_PATTERN.sub(
+            "", first_block if citation_start_i == 0 else blocks[citation_start_i]
+        )
 
-        # find and remove citation ending delim, and extract element
+        # find citation ending delim
         # start search at citation starting delim; citation is at end so this is a good optimization
-        delim_found = False
-        for i, block in enumerate(blocks[citation_start_i:], start=citation_start_i):
-            if self.CITATION_END_PATTERN.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.CITATION_END_PATTERN.sub("", block)
-                # build HTML for citation
-                citation_elem = etree.Element("cite")
-                if self.citation_html_class != "":
-                    citation_elem.set("class", self.citation_html_class)
-                blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
-                self.parser.parseBlocks(citation_elem, blocks[citation_start_i:i + 1])
-                # remove used blocks
-                for _ in range(citation_start_i, i + 1):
-                    blocks.pop(citation_start_i)
-                break
-        # if no ending delim for citation, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        citation_end_i = self.block_search.find(
+            blocks, self.CITATION_END_PATTERN, start=citation_start_i, start_block=citation_start_block,
+            work_budget=work_budget
+        )
+        # if no ending delim for citation, do nothing
+        if citation_end_i is None:
             return False
 
-        # find and remove blockquote ending delim, and extract element
-        delim_found = False
-        for i, block in enumerate(blocks):
-            if self.END_PATTERN.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.END_PATTERN.sub("", block)
-                # build HTML for blockquote
-                blockquote_elem = etree.SubElement(parent, "blockquote")
-                if self.html_class != "":
-                    blockquote_elem.set("class", self.html_class)
-                self.parser.parseBlocks(blockquote_elem, blocks[:i + 1])
-                parent.append(citation_elem) # make sure citation comes at the end
-                # remove used blocks
-                for _ in range(i + 1):
-                    blocks.pop(0)
+        # find blockquote ending delim, skipping over the citation
+        end_i = None
+        for i in range(citation_start_i):
+            if work_budget is not None:
+                work_budget.scan(1)
+            if self.END_PATTERN.search(first_block if i == 0 else blocks[i]):
+                end_i = i
                 break
-        # if no ending delim for blockquote, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        if end_i is None:
+            end_i = self.block_search.find(blocks, self.END_PATTERN, start=citation_end_i + 1, work_budget=work_budget)
+        # if no ending delim for blockquote, do nothing
+        if end_i is None:
             return False
+
+        # remove blockquote and citation starting delims
+        blocks[0] = first_block
+        blocks[citation_start_i] = citation_start_block
+        # remove citation ending delim, and extract element
+        blocks[citation_end_i] = self.CITATION_END_PATTERN.sub("", blocks[citation_end_i])
+        # build HTML for citation
+        citation_elem = etree.Element("cite")
+        if self.citation_html_class != "":
+            citation_elem.set("class", self.citation_html_class)
+        # remove trailing whitespace from the newline into `\end{}`
+        blocks[citation_end_i] = blocks[citation_end_i].rstrip()
+        self.parser.parseBlocks(citation_elem, blocks[citation_start_i:citation_end_i + 1])
+        # remove used blocks
+        del blocks[citation_start_i:citation_end_i + 1]
+        self.block_search.forget(blocks)
+        if end_i > citation_end_i:
+            end_i -= citation_end_i + 1 - citation_start_i
+
+        # remove blockquote ending delim, and extract element
+        blocks[end_i] = self.END_PATTERN.sub("", blocks[end_i])
+        # build HTML for blockquote
+        blockquote_elem = etree.SubElement(parent, "blockquote")
+        if self.html_class != "":
+            blockquote_elem.set("class", self.html_class)
+        if work_budget is not None:
+            work_budget.enter_env()
+        self.parser.parseBlocks(blockquote_elem, blocks[:end_i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        parent.append(citation_elem) # make sure citation comes at the end
+        # remove used blocks
+        del blocks[:end_i + 1]
         return True
 
 
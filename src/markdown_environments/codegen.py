@@ -0,0 +1,407 @@
+r"""
+Code generation of environment processors specialized to one config.
+
+`DivProcessor` and `DropdownProcessor` interpret their `types` config on every block: matching a block means trying
+every type's regex in turn, and running a processor looks up the type's options and branches on configs like `is_thm`.
+With `codegen_dir` set (see `DivExtension`, `DropdownExtension`, and `ThmsExtension`), the config is instead compiled
+into the Python source of a subclass with the configs folded in:
+
+- a block is matched to its type with one dict lookup on the name in its `\\begin{}` (and a single regex match to
+  confirm), instead of one regex match per type, whenever every type is matched literally;
+- every type gets its own functions building its element, with its HTML `class` attribute precomputed, and (for
+  theorems) its theorem heading, with its type and counter already filled in;
+- branches on configs are resolved ahead of time.
+
+The generated source is written to `codegen_dir`, named after a fingerprint of the config (and of this package's
+version), and reused by every later process with the same config. Its output is identical to the generic processors'.
+"""
+
+import copy
+import importlib.util
+import os
+import re
+import threading
+
+from . import __version__, utils
+
+
+# bump whenever generated code changes, so stale modules on disk aren't reused
+CODEGEN_VERSION = 1
+
+KINDS = ("div", "dropdown")
+
+# configs that don't affect the generated code
+UNSPECIALIZED_CONFIGS = ("fragment_cache",)
+
+# loaded classes per `(directory, file name)`, since loading a module from disk is much slower than using it
+_loaded_classes = {}
+_loaded_classes_lock = threading.Lock()
+
+# a line ending in `#[flag]` is only kept if `flag` is set, and one ending in `#[!flag]` only if it isn't
+FLAG_MARKER_PATTERN = re.compile(r"\s*#\[(!?)(\w+)\]$")
+
+HEADER_TEMPLATE = '''\
+# generated by `markdown_environments.codegen` from a `{kind}` config; do not edit
+import re
+import xml.etree.ElementTree as etree
+
+from markdown_environments import utils
+from markdown_environments.{kind} import {base}
+
+
+FINGERPRINT = {fingerprint!r}
+
+TYPES = {types!r}
+START_PATTERNS = {start_patterns}
+END_PATTERNS = {end_patterns}
+# index of each type by its name in `\\begin{{}}`, if every type is matched literally
+TYPE_INDICES = {type_indices!r}
+'''
+
+TEST_TEMPLATE = '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_patterns = START_PATTERNS
+        self.end_patterns = END_PATTERNS
+        self.type_index = None
+
+    def test(self, parent, block):
+        if not block.startswith("\\\\begin{"):  #[indexed]
+            return False  #[indexed]
+        i = TYPE_INDICES.get(block[7:block.find("}", 7)])  #[indexed]
+        if i is None or not self.start_patterns[i].match(block):  #[indexed]
+            return False  #[indexed]
+        # first type that matches, like `utils.test_for_env_types()`  #[!indexed]
+        for i, pattern in enumerate(self.start_patterns):  #[!indexed]
+            if pattern.match(block):  #[!indexed]
+                break  #[!indexed]
+        else:  #[!indexed]
+            return False  #[!indexed]
+        if TYPES[i] == "":  #[!indexed]
+            return False  #[!indexed]
+        self.type_index = i
+        self.type_opts = self.types[TYPES[i]]
+        self.start_pattern = self.start_patterns[i]
+        self.end_pattern = self.end_patterns[i]
+        return True'''
+
+DIV_RUN_TEMPLATE = '''
+    def run_uncached(self, parent, blocks):
+        org_block_start = blocks[0]
+        work_budget = utils.get_work_budget(self.parser.md)
+        start_pattern = self.start_pattern
+        end_pattern = self.end_pattern
+        type_index = self.type_index
+        thm_heading_md = HEADINGS[type_index](start_pattern.match(blocks[0]))  #[is_thm]
+        blocks[0] = start_pattern.sub("", blocks[0])
+
+        i = self.block_search.find(blocks, end_pattern, work_budget=work_budget)
+        if i is None:
+            blocks[0] = org_block_start
+            return False
+        if work_budget is not None:
+            work_budget.enter_env()
+        blocks[i] = end_pattern.sub("", blocks[i])
+        elem = BUILDERS[type_index](parent)
+        blocks[i] = blocks[i].rstrip()
+        self.parser.parseBlocks(elem, blocks[0:i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        del blocks[:i + 1]
+        utils.prepend_thm_heading_md(self.type_opts, elem, thm_heading_md)  #[is_thm]
+        return True
+'''
+
+DROPDOWN_RUN_TEMPLATE = '''
+    def run_uncached(self, parent, blocks):
+        if len(blocks) < 2:
+            return False
+        work_budget = utils.get_work_budget(self.parser.md)
+        start_pattern = self.start_pattern
+        end_pattern = self.end_pattern
+        type_opts = self.type_opts
+        type_index = self.type_index
+        has_summary = True
+        if not self.SUMMARY_START_REGEX.match(blocks[1]):
+            has_summary = False  #[is_thm]
+            return False  #[!is_thm]
+        thm_heading_md = HEADINGS[type_index](start_pattern.match(blocks[0]))  #[is_thm]
+        first_blocks = [start_pattern.sub("", blocks[0]), self.SUMMARY_START_REGEX.sub("", blocks[1])]
+
+        summary_end_i = None
+        if has_summary:
+            for i in range(len(blocks)):
+                block = first_blocks[i] if i < 2 else blocks[i]
+                if work_budget is not None:
+                    work_budget.scan(1)
+                if end_pattern.search(block):
+                    break
+                if self.SUMMARY_END_REGEX.search(block):
+                    summary_end_i = i
+                    break
+        if summary_end_i is None:  #[!is_thm]
+            return False  #[!is_thm]
+
+        end_i = None
+        content_start_i = summary_end_i + 1 if summary_end_i is not None else 0
+        for i in range(content_start_i, 2):
+            if work_budget is not None:
+                work_budget.scan(1)
+            if end_pattern.search(first_blocks[i]):
+                end_i = i
+                break
+        if end_i is None:
+            end_i = self.block_search.find(
+                blocks, end_pattern, start=max(content_start_i, 2), work_budget=work_budget
+            )
+        if end_i is None:
+            return False
+        blocks[:2] = first_blocks
+
+        summary_elem = etree.Element("summary")
+        summary_elem.set("class", SUMMARY_HTML_CLASS)  #[summary_html_class]
+        if summary_end_i is not None:
+            blocks[summary_end_i] = self.SUMMARY_END_REGEX.sub("", blocks[summary_end_i])
+            blocks[summary_end_i] = blocks[summary_end_i].rstrip()
+            self.parser.parseBlocks(summary_elem, blocks[:summary_end_i + 1])
+        utils.prepend_thm_heading_md(type_opts, summary_elem, thm_heading_md)  #[is_thm]
+
+        if work_budget is not None:
+            work_budget.enter_env()
+        blocks[end_i] = end_pattern.sub("", blocks[end_i])
+        details_elem = BUILDERS[type_index](parent)
+        details_elem.append(summary_elem)
+        content_parent_elem = etree.SubElement(details_elem, "template")  #[deferred_content]
+        content_parent_elem.set("data-md-deferred", "")  #[deferred_content]
+        content_elem = etree.SubElement(content_parent_elem, "div")  #[deferred_content]
+        content_elem = etree.SubElement(details_elem, "div")  #[!deferred_content]
+        content_elem.set("class", CONTENT_HTML_CLASS)  #[content_html_class]
+        blocks[end_i] = blocks[end_i].rstrip()
+        self.parser.parseBlocks(content_elem, blocks[content_start_i:end_i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        del blocks[:end_i + 1]
+        return True
+'''
+
+
+def apply_flags(template: str, flags: dict) -> str:
+    lines = []
+    for line in template.split("\n"):
+        m = FLAG_MARKER_PATTERN.search(line)
+        if m is not None:
+            if bool(flags[m.group(2)]) == (m.group(1) == "!"):
+                continue
+            line = line[:m.start()]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def normalize_config(kind: str, config: dict) -> dict | None:
+    r"""
+    Return the processor config (the keyword arguments of `DivProcessor` or `DropdownProcessor`) with every default
+    filled in and without unspecialized configs, or `None` if it can't be specialized.
+    """
+
+    if kind not in KINDS:
+        raise ValueError(f"`kind` must be one of {KINDS}")
+    config = {name: value for name, value in config.items() if name not in UNSPECIALIZED_CONFIGS}
+    config.setdefault("literal_types", False)
+    config["is_thm"] = bool(config.get("is_thm"))
+    config["compact"] = bool(config.get("compact"))
+    if kind == "dropdown":
+        config.setdefault("deferred_content", "")
+    types = copy.deepcopy(config.get("types"))
+    if not isinstance(types, dict):
+        return None
+    utils.init_env_types(types, config["is_thm"], literal_types=config["literal_types"])
+    config["types"] = types
+    # anything that the generic processors would format at runtime has to format the same way ahead of time
+    class_configs = ["html_class"] + (["summary_html_class", "content_html_class"] if kind == "dropdown" else [])
+    if not all(isinstance(config.get(name), str) for name in class_configs):
+        return None
+    for opts in types.values():
+        if not all(isinstance(opts.get(name), str) for name in ("html_class", "thm_type", "thm_counter_incr")):
+            return None
+    return config
+
+
+def fingerprint(kind: str, config: dict) -> str:
+    return utils.fingerprint_config([CODEGEN_VERSION, __version__, kind, config])
+
+
+def gen_builder(kind: str, i: int, html_class: str) -> str:
+    tag = "div" if kind == "div" else "details"
+    lines = [f"def build_{i}(parent):", f'    elem = etree.SubElement(parent, "{tag}")']
+    if html_class is not None:
+        lines.append(f'    elem.set("class", {html_class!r})')
+    lines.append("    return elem")
+    return "\n".join(lines)
+
+
+def gen_heading(i: int, opts: dict) -> str:
+    # `utils.gen_thm_heading_md()`, with the type's options filled in
+    thm_type = opts["thm_type"]
+    if opts["thm_counter_incr"] != "":
+        thm_type += " {{" + opts["thm_counter_incr"] + "}}"
+    lines = [
+        f"def heading_{i}(m):",
+        "    thm_name = m.group(1)",
+        "    thm_hidden_name = m.group(2)"
+    ]
+    if opts["thm_name_overrides_thm_heading"]:
+        lines += [
+            "    if thm_name is not None:",
+            '        return "{[" + thm_name + "]}{" + thm_name + "}\\n"',
+            f"    thm_heading_md = {'{[' + thm_type + ']}'!r}"
+        ]
+    else:
+        lines += [
+            f"    thm_heading_md = {'{[' + thm_type + ']}'!r}",
+            "    if thm_name is not None:",
+            '        thm_heading_md += "[" + thm_name + "]"'
+        ]
+    lines += [
+        "    if thm_hidden_name is not None:",
+        '        thm_heading_md += "{" + thm_hidden_name + "}"',
+        '    return thm_heading_md + "\\n"'
+    ]
+    return "\n".join(lines)
+
+
+def gen_source(kind: str, config: dict, config_fingerprint: str) -> str:
+    r"""
+    Return the source of a module defining `processor_class`, a subclass of `DivProcessor` or `DropdownProcessor`
+    specialized to `config` (as returned by `normalize_config()`).
+    """
+
+    types = config["types"]
+    is_thm = config["is_thm"]
+    literal_types = config["literal_types"]
+    # the same patterns as the generic processors', which are cached
+    _, start_pattern_choices, end_pattern_choices = utils.init_env_types(
+        copy.deepcopy(types), is_thm, literal_types=literal_types
+    )
+    # a type's name can only be looked up if its regex matches nothing but the name itself (and the name can't contain
+    # the `}` that ends it)
+    indexed = all(
+        "}" not in typ and (literal_types or re.escape(typ) == typ) for typ in types
+    )
+    type_indices = {typ: i for i, typ in enumerate(types) if typ != ""} if indexed else {}
+
+    def tuple_source(items: list) -> str:
+        return f"({', '.join(items)},)" if len(items) == 1 else f"({', '.join(items)})"
+
+    def pattern_source(pattern: re.Pattern) -> str:
+        return f"re.compile({pattern.pattern!r}, {pattern.flags})"
+
+    base = "DivProcessor" if kind == "div" else "DropdownProcessor"
+    parts = [HEADER_TEMPLATE.format(
+        kind=kind, base=base, fingerprint=config_fingerprint, types=tuple(types),
+        start_patterns=tuple_source([pattern_source(start_pattern_choices[typ]) for typ in types]),
+        end_patterns=tuple_source([pattern_source(end_pattern_choices[typ]) for typ in types]),
+        type_indices=type_indices
+    )]
+    summary_html_class = config.get("summary_html_class", "")
+    content_html_class = config.get("content_html_class", "")
+    if config["compact"]:
+        summary_html_class = utils.join_html_classes(summary_html_class)
+        content_html_class = utils.join_html_classes(content_html_class)
+    if kind == "dropdown":
+        parts.append(f"SUMMARY_HTML_CLASS = {summary_html_class!r}")
+        parts.append(f"CONTENT_HTML_CLASS = {content_html_class!r}\n")
+
+    for i, opts in enumerate(types.values()):
+        html_class = None
+        if config["compact"]:
+            html_class = utils.join_html_classes(config["html_class"], opts["html_class"]) or None
+        elif config["html_class"] != "" or opts["html_class"] != "":
+            html_class = f"{config['html_class']} {opts['html_class']}"
+        parts.append("\n" + gen_builder(kind, i, html_class) + "\n")
+        if is_thm:
+            parts.append("\n" + gen_heading(i, opts) + "\n")
+    parts.append("")
+    parts.append(f"BUILDERS = {tuple_source([f'build_{i}' for i in range(len(types))])}")
+    if is_thm:
+        parts.append(f"HEADINGS = {tuple_source([f'heading_{i}' for i in range(len(types))])}")
+
+    flags = {
+        "indexed": indexed,
+        "is_thm": is_thm,
+        "summary_html_class": summary_html_class != "",
+        "content_html_class": content_html_class != "",
+        "deferred_content": config.get("deferred_content", "") != ""
+    }
+    parts.append(f"\n\nclass Specialized{base}({base}):")
+    parts.append(apply_flags(TEST_TEMPLATE, flags))
+    parts.append(apply_flags(DIV_RUN_TEMPLATE if kind == "div" else DROPDOWN_RUN_TEMPLATE, flags))
+    parts.append(f"\nprocessor_class = Specialized{base}\n")
+    return "\n".join(parts)
+
+
+def load_module(path: str, module_name: str, config_fingerprint: str):
+    # `None` if the file is missing or isn't a whole module generated for this fingerprint (e.g. it was truncated, or
+    # generated for another config or version), which is checked from its text before anything in it is run
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            source = file.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    lines = source.splitlines()
+    if (
+        f"FINGERPRINT = {config_fingerprint!r}" not in lines
+        or not lines[-1].startswith("processor_class = ") or not source.endswith("\n")
+    ):
+        return None
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        return None
+    if getattr(module, "FINGERPRINT", None) != config_fingerprint or not hasattr(module, "processor_class"):
+        return None
+    return module
+
+
+def load_processor_class(kind: str, config: dict, codegen_dir: str) -> type:
+    r"""
+    Return a processor class specialized to a config, generating its module in `codegen_dir` if it isn't there yet.
+
+    Args:
+        kind: `"div"` or `"dropdown"`.
+        config: Keyword arguments the processor will be initialized with (besides the parser).
+        codegen_dir: Directory to keep generated modules in.
+
+    Returns:
+        A subclass of `DivProcessor` or `DropdownProcessor`, initialized with the same arguments as them, or the
+        generic class itself if `config` has options it can't be specialized to.
+    """
+
+    if kind == "div":
+        from .div import DivProcessor as generic_class
+    else:
+        from .dropdown import DropdownProcessor as generic_class
+    normalized_config = normalize_config(kind, config)
+    if normalized_config is None:
+        return generic_class
+
+    config_fingerprint = fingerprint(kind, normalized_config)
+    file_name = f"{kind}_{config_fingerprint[:32]}.py"
+    key = (os.path.abspath(codegen_dir), file_name)
+    with _loaded_classes_lock:
+        cls = _loaded_classes.get(key)
+        if cls is not None:
+            return cls
+        path = os.path.join(codegen_dir, file_name)
+        # under this package, so anything that only instruments this package's processors (e.g. `MetricsExtension`)
+        # still instruments it
+        module_name = f"{__package__}._codegen_{kind}_{config_fingerprint[:32]}"
+        module = load_module(path, module_name, config_fingerprint)
+        if module is None:
+            utils.atomic_write(path, gen_source(kind, normalized_config, config_fingerprint))
+            module = load_module(path, module_name, config_fingerprint)
+            if module is None:
+                raise RuntimeError(f"generated module {path} failed to load")
+        cls = _loaded_classes[key] = module.processor_class
+        return cls
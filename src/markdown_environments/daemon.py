@@ -0,0 +1,117 @@
+r"""
+A long-running render server, so that callers not written in Python don't pay for interpreter startup, imports, and
+extension setup on every document.
+
+Run with::
+
+    python -m markdown_environments.daemon --config configs.json [--socket /path/to/socket]
+
+where `configs.json` maps config names to `Renderer` extension configs, e.g.::
+
+    {"default": {"ThmsExtension": {"div_config": {"types": {"thm": {"thm_type": "Theorem"}}}}}}
+
+Every config is built into a `Renderer` once at startup. Requests and responses are newline-delimited JSON objects,
+read from stdin and written to stdout (or read from and written to each connection on the Unix socket if `--socket` is
+given). A request looks like::
+
+    {"id": 1, "text": "...", "config": "default", "metadata": true}
+
+where `config` may be omitted if only one config is defined, and `metadata` defaults to `false`. The response echoes
+back `id` and contains `html`, plus `thm_ref_map` if `metadata` was requested, or `error` if rendering failed.
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+from typing import TextIO
+
+from .render import Renderer
+
+
+class RenderServer:
+    """
+    Holds one warmed `Renderer` per named config and answers JSON render requests with them.
+    """
+
+    def __init__(self, configs: dict):
+        self.renderers = {name: Renderer(extension_configs) for name, extension_configs in configs.items()}
+        # `Renderer`s aren't thread-safe, and the socket server handles each connection in its own thread
+        self.locks = {name: threading.Lock() for name in self.renderers}
+
+    def handle_request(self, request: dict) -> dict:
+        response = {"id": request.get("id")}
+        try:
+            name = request.get("config")
+            if name is None:
+                if len(self.renderers) != 1:
+                    raise KeyError("'config' must be given when more than one config is defined")
+                name = next(iter(self.renderers))
+            if name not in self.renderers:
+                raise KeyError(f"unknown config {name!r}")
+            text = request["text"]
+            with self.locks[name]:
+                renderer = self.renderers[name]
+                response["html"] = renderer.convert(text)
+                if request.get("metadata", False):
+                    response["thm_ref_map"] = renderer.get_thm_ref_map()
+        except Exception as e:
+            response["error"] = f"{e.__class__.__name__}: {e}"
+        return response
+
+    def handle_line(self, line: str) -> str:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            return json.dumps({"id": None, "error": f"{e.__class__.__name__}: {e}"})
+        return json.dumps(self.handle_request(request))
+
+    def serve_stream(self, instream: TextIO, outstream: TextIO) -> None:
+        for line in instream:
+            if line.strip() == "":
+                continue
+            outstream.write(self.handle_line(line) + "\n")
+            outstream.flush()
+
+    def serve_unix_socket(self, path: str) -> None:
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode("utf-8")
+                    if line.strip() == "":
+                        continue
+                    self.wfile.write((server.handle_line(line) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        if os.path.exists(path):
+            os.remove(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as socket_server:
+            try:
+                socket_server.serve_forever()
+            finally:
+                os.remove(path)
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m markdown_environments.daemon", description=__doc__.split("\n")[1])
+    parser.add_argument("--config", required=True, help="JSON file mapping config names to extension configs")
+    parser.add_argument("--socket", help="serve on this Unix socket instead of stdin/stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as file:
+        configs = json.load(file)
+    server = RenderServer(configs)
+    if args.socket is not None:
+        server.serve_unix_socket(args.socket)
+    else:
+        server.serve_stream(sys.stdin, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
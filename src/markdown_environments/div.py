@@ -9,13 +9,22 @@ from . import utils
 
 class DivProcessor(BlockProcessor):
 
-    def __init__(self, *args, types: dict, html_class: str, is_thm: bool, **kwargs):
+    def __init__(
+        self, *args, types: dict, html_class: str, is_thm: bool, literal_types: bool = False, compact: bool = False,
+        fragment_cache=None, **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.html_class = html_class
         self.is_thm = is_thm
-        self.types, self.start_pattern_choices, self.end_pattern_choices = utils.init_env_types(types, self.is_thm)
+        self.literal_types = literal_types
+        self.compact = compact
+        self.fragment_cache = fragment_cache
+        self.types, self.start_pattern_choices, self.end_pattern_choices = utils.init_env_types(
+            types, self.is_thm, literal_types=literal_types
+        )
         self.start_pattern = None
         self.end_pattern = None
+        self.block_search = utils.BlockSearch(self.parser.md)
 
     def test(self, parent, block):
         typ = utils.test_for_env_types(self.start_pattern_choices, parent, block)
@@ -27,7 +36,13 @@ class DivProcessor(BlockProcessor):
         return True
 
     def run(self, parent, blocks):
+        if self.fragment_cache is not None:
+            return self.fragment_cache.run(self, parent, blocks)
+        return self.run_uncached(parent, blocks)
+
+    def run_uncached(self, parent, blocks):
         org_block_start = blocks[0]
+        work_budget = utils.get_work_budget(self.parser.md)
         # generate default thm heading if applicable
         thm_heading_md = ""
         if self.is_thm:
@@ -36,28 +51,31 @@ class DivProcessor(BlockProcessor):
         blocks[0] = self.start_pattern.sub("", blocks[0])
 
         # find and remove ending delim, and extract element
-        delim_found = False
-        for i, block in enumerate(blocks):
-            if self.end_pattern.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.end_pattern.sub("", block)
-                # build HTML
-                elem = etree.SubElement(parent, "div")
-                if self.html_class != "" or self.type_opts.get("html_class") != "":
-                    elem.set("class", f"{self.html_class} {self.type_opts.get('html_class')}")
-                blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
-                self.parser.parseBlocks(elem, blocks[0:i + 1])
-                # remove used blocks
-                for _ in range(0, i + 1):
-                    blocks.pop(0)
-                # add thm heading if applicable
-                utils.prepend_thm_heading_md(self.type_opts, elem, thm_heading_md)
-                break
+        i = self.block_search.find(blocks, self.end_pattern, work_budget=work_budget)
         # if no ending delim, restore and do nothing
-        if not delim_found:
+        if i is None:
             blocks[0] = org_block_start
             return False
+        if work_budget is not None:
+            work_budget.enter_env()
+        # remove ending delim
+        blocks[i] = self.end_pattern.sub("", blocks[i])
+        # build HTML
+        elem = etree.SubElement(parent, "div")
+        if self.compact:
+            html_class = utils.join_html_classes(self.html_class, self.type_opts.get("html_class"))
+            if html_class != "":
+                elem.set("class", html_class)
+        elif self.html_class != "" or self.type_opts.get("html_class") != "":
+            elem.set("class", f"{self.html_class} {self.type_opts.get('html_class')}")
+        blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
+        self.parser.parseBlocks(elem, blocks[0:i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        # remove used blocks
+        del blocks[:i + 1]
+        # add thm heading if applicable
+        utils.prepend_thm_heading_md(self.type_opts, elem, thm_heading_md)
         return True
 
 
@@ -101,10 +119,20 @@ class DivExtension(Extension):
 
             - **types** (*dict*) -- Types of div environments to define. Defaults to `{}`.
             - **html_class** (*str*) -- HTML `class` attribute to add to divs. Defaults to `""`.
-
-        The key for each type defined in `types` is inserted directly into the regex patterns that search for
-        `\\begin{<type>}` and `\\end{<type>}`, so anything you specify will be interpreted as regex. However,
-        if the key is an empty string, its regex will never be matched against, so it is effectively useless.
+            - **literal_types** (*bool*) -- Whether to match the keys of `types` literally instead of as regex.
+              Defaults to `False`.
+            - **compact** (*bool*) -- Whether to normalize HTML `class` attributes, leaving out empty classes and the
+              spaces around them (e.g. `class=" md-thm"` becomes `class="md-thm"`). Defaults to `False`.
+            - **fragment_cache** (*FragmentCache*) -- Cache of already-parsed divs to reuse across conversions (see
+              `markdown_environments.cache.FragmentCache`). Defaults to `None`.
+            - **codegen_dir** (*str*) -- Directory to keep a processor generated specifically for this config in, to
+              use instead of the generic one (see `markdown_environments.codegen`); `""` to not generate one.
+              Defaults to `""`.
+
+        Unless `literal_types` is set, the key for each type defined in `types` is inserted directly into the regex
+        patterns that search for `\\begin{<type>}` and `\\end{<type>}`, so anything you specify will be interpreted as
+        regex (and keys that risk catastrophic backtracking raise a `ValueError`). However, if the key is an empty
+        string, its regex will never be matched against, so it is effectively useless.
         In addition, each type's value is itself a dictionary with the following possible options:
 
             - **html_class** (*str*) -- HTML `class` attribute to add to divs of that type. Defaults to `""`.
@@ -119,6 +147,14 @@ class DivExtension(Extension):
                 "",
                 "HTML `class` attribute to add to div. Defaults to `\"\"`."
             ],
+            "literal_types": [
+                False,
+                "Whether to match the keys of `types` literally instead of as regex. Defaults to `False`."
+            ],
+            "compact": [
+                False,
+                "Whether to normalize HTML `class` attributes. Defaults to `False`."
+            ],
             "is_thm": [
                 False,
                 (
@@ -127,6 +163,10 @@ class DivExtension(Extension):
                 )
             ]
         }
+        # not a regular config, since `markdown.extensions.Extension` would convert a `None` default to a `bool`
+        self.fragment_cache = kwargs.pop("fragment_cache", None)
+        # not a regular config either, since it only chooses which class the processor is
+        self.codegen_dir = kwargs.pop("codegen_dir", "")
         utils.init_extension_with_configs(self, **kwargs)
 
         # set default options for individual types
@@ -134,7 +174,14 @@ class DivExtension(Extension):
             opts.setdefault("html_class", "")
 
     def extendMarkdown(self, md):
-        md.parser.blockprocessors.register(DivProcessor(md.parser, **self.getConfigs()), "div", 105)
+        processor_class = DivProcessor
+        if self.codegen_dir != "":
+            # imported here since most configs never need it
+            from .codegen import load_processor_class
+            processor_class = load_processor_class("div", self.getConfigs(), self.codegen_dir)
+        md.parser.blockprocessors.register(
+            processor_class(md.parser, fragment_cache=self.fragment_cache, **self.getConfigs()), "div", 105
+        )
 
 
 def makeExtension(**kwargs):
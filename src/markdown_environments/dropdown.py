@@ -1,12 +1,48 @@
+import hashlib
 import re
 import xml.etree.ElementTree as etree
 
 from markdown.blockprocessors import BlockProcessor
 from markdown.extensions import Extension
+from markdown.postprocessors import Postprocessor
 
 from . import utils
 
 
+DEFERRED_CONTENT_MODES = ("", "template", "side_file")
+
+# fills in a deferred dropdown's content the first time it's opened, from its `<template>` or from the side file
+DEFERRED_CONTENT_SCRIPT = """<script>
+(() => {
+  const src = document.currentScript.dataset.src;
+  let sideFile = null;
+  document.addEventListener("toggle", async (event) => {
+    const details = event.target;
+    if (!(details instanceof HTMLDetailsElement) || !details.open) return;
+    const template = details.querySelector(":scope > template[data-md-deferred]");
+    if (template === null) return;
+    if (template.content.childNodes.length === 0) {
+      sideFile ??= fetch(src).then((response) => response.json());
+      template.innerHTML = (await sideFile)[template.dataset.mdDeferred];
+    }
+    template.replaceWith(template.content);
+  }, true);
+})();
+</script>"""
+
+
+def deferred_content_script(side_file_url: str = "") -> str:
+    r"""
+    Return a `<script>` element that loads deferred dropdown content (see `DropdownExtension`'s `deferred_content`
+    config) when each dropdown is first opened.
+
+    Args:
+        side_file_url: URL of the page's side file, if `deferred_content` is `"side_file"`.
+    """
+
+    return DEFERRED_CONTENT_SCRIPT.replace("<script>", f'<script data-src="{side_file_url}">', 1)
+
+
 class DropdownProcessor(BlockProcessor):
 
     SUMMARY_START_REGEX = re.compile(r"^\\begin{summary}", flags=re.MULTILINE)
@@ -14,16 +50,24 @@ class DropdownProcessor(BlockProcessor):
 
     def __init__(
         self, *args, types: dict, html_class: str, summary_html_class: str, content_html_class: str,
-        is_thm: bool, **kwargs
+        is_thm: bool, deferred_content: str = "", literal_types: bool = False, compact: bool = False,
+        fragment_cache=None, **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.html_class = html_class
         self.summary_html_class = summary_html_class
         self.content_html_class = content_html_class
+        self.compact = compact
         self.is_thm = is_thm
-        self.types, self.start_pattern_choices, self.end_pattern_choices = utils.init_env_types(types, self.is_thm)
+        self.deferred_content = deferred_content
+        self.literal_types = literal_types
+        self.fragment_cache = fragment_cache
+        self.types, self.start_pattern_choices, self.end_pattern_choices = utils.init_env_types(
+            types, self.is_thm, literal_types=literal_types
+        )
         self.start_pattern = None
         self.end_pattern = None
+        self.block_search = utils.BlockSearch(self.parser.md)
 
     def test(self, parent, block):
         typ = utils.test_for_env_types(self.start_pattern_choices, parent, block)
@@ -35,89 +79,196 @@ class DropdownProcessor(BlockProcessor):
         return True
 
     def run(self, parent, blocks):
+        if self.fragment_cache is not None:
+            # `run_uncached()` always modifies the block after the starting delim
+            return self.fragment_cache.run(self, parent, blocks, min_blocks=2)
+        return self.run_uncached(parent, blocks)
+
+    def run_uncached(self, parent, blocks):
         # guard against index out of bounds on matching `self.SUMMARY_START_REGEX` for recursive `run()` parsing
         if len(blocks) < 2:
             return False
-        org_blocks = list(blocks)
-        # remove summary starting delim that must immediately follow dropdown's starting delim
-        # if no starting delim for summary and not a thm dropdown which should provide a default, restore and do nothing
+        work_budget = utils.get_work_budget(self.parser.md)
+        # parsing the summary can run `test()` again on a nested environment, so keep what it matched for this one
+        start_pattern = self.start_pattern
+        end_pattern = self.end_pattern
+        type_opts = self.type_opts
+        # find every delim before modifying `blocks`, so nothing needs restoring if one is missing (restoring from a
+        # copy of `blocks` made every dropdown cost time proportional to the rest of the document)
+        # if no starting delim for summary and not a thm dropdown which should provide a default, do nothing
         has_summary = True
         if not self.SUMMARY_START_REGEX.match(blocks[1]):
             if self.is_thm:
                 has_summary = False
             else:
-                blocks.clear() # `blocks = org_blocks` doesn't work; must mutate `blocks` instead of reassigning it
-                blocks.extend(org_blocks)
                 return False
-        blocks[1] = self.SUMMARY_START_REGEX.sub("", blocks[1])
-
-        # remove dropdown starting delim
-        # also first generate theorem heading from it to use as default summary if applicable
+        # generate theorem heading from dropdown starting delim to use as default summary if applicable
         thm_heading_md = ""
         if self.is_thm:
-            thm_heading_md = utils.gen_thm_heading_md(self.type_opts, self.start_pattern, blocks[0])
-        blocks[0] = self.start_pattern.sub("", blocks[0])
+            thm_heading_md = utils.gen_thm_heading_md(type_opts, start_pattern, blocks[0])
+        # first two blocks with dropdown starting delim and summary starting delim removed
+        first_blocks = [start_pattern.sub("", blocks[0]), self.SUMMARY_START_REGEX.sub("", blocks[1])]
 
-        # find and remove summary ending delim if summary starting delim was present, and extract element
-        # `summary_elem` initialized outside loop since the loop isn't guaranteed here to find & initialize it
-        summary_elem = etree.Element("summary")
-        if self.summary_html_class != "":
-            summary_elem.set("class", self.summary_html_class)
-        has_valid_summary = self.is_thm
+        # find summary ending delim if summary starting delim was present
+        summary_end_i = None
         if has_summary:
-            for i, block in enumerate(blocks):
+            for i in range(len(blocks)):
+                block = first_blocks[i] if i < 2 else blocks[i]
+                if work_budget is not None:
+                    work_budget.scan(1)
                 # if we haven't found summary ending delim but have found the overall dropdown ending delim,
                 # then don't keep going; maybe the summary was omitted as it was optional for theorems
-                if self.end_pattern.search(block):
+                if end_pattern.search(block):
                     break
                 if self.SUMMARY_END_REGEX.search(block):
-                    has_valid_summary = True
-                    # remove ending delim
-                    blocks[i] = self.SUMMARY_END_REGEX.sub("", block)
-                    # build HTML for summary
-                    blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
-                    self.parser.parseBlocks(summary_elem, blocks[:i + 1])
-                    # remove used blocks
-                    for _ in range(i + 1):
-                        blocks.pop(0)
+                    summary_end_i = i
                     break
-        # if no valid summary (e.g. no ending delim with no default), restore and do nothing
-        if not has_valid_summary:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        # if no valid summary (e.g. no ending delim with no default), do nothing
+        if summary_end_i is None and not self.is_thm:
             return False
-        # prepend thm heading (including default summary) to summary if applicable, again outside loop
-        utils.prepend_thm_heading_md(self.type_opts, summary_elem, thm_heading_md)
-
-        # find and remove dropdown ending delim, and extract element
-        delim_found = False
-        for i, block in enumerate(blocks):
-            if self.end_pattern.search(block):
-                delim_found = True
-                # remove ending delim
-                blocks[i] = self.end_pattern.sub("", block)
-                # build HTML for dropdown
-                details_elem = etree.SubElement(parent, "details")
-                if self.html_class != "" or self.type_opts.get("html_class") != "":
-                    details_elem.set("class", f"{self.html_class} {self.type_opts.get('html_class')}")
-                details_elem.append(summary_elem)
-                content_elem = etree.SubElement(details_elem, "div")
-                if self.content_html_class != "":
-                    content_elem.set("class", self.content_html_class)
-                blocks[i] = blocks[i].rstrip() # remove trailing whitespace from the newline into `\end{}`
-                self.parser.parseBlocks(content_elem, blocks[0:i + 1])
-                # remove used blocks
-                for _ in range(0, i + 1):
-                    blocks.pop(0)
+
+        # find dropdown ending delim after the summary
+        end_i = None
+        content_start_i = summary_end_i + 1 if summary_end_i is not None else 0
+        for i in range(content_start_i, 2):
+            if work_budget is not None:
+                work_budget.scan(1)
+            if end_pattern.search(first_blocks[i]):
+                end_i = i
                 break
-        # if no ending delim for dropdown, restore and do nothing
-        if not delim_found:
-            blocks.clear()
-            blocks.extend(org_blocks)
+        if end_i is None:
+            end_i = self.block_search.find(
+                blocks, end_pattern, start=max(content_start_i, 2), work_budget=work_budget
+            )
+        # if no ending delim for dropdown, do nothing
+        if end_i is None:
             return False
+        blocks[:2] = first_blocks
+
+        # remove summary ending delim, and extract element
+        summary_elem = etree.Element("summary")
+        summary_html_class = self.summary_html_class
+        if self.compact:
+            summary_html_class = utils.join_html_classes(summary_html_class)
+        if summary_html_class != "":
+            summary_elem.set("class", summary_html_class)
+        if summary_end_i is not None:
+            blocks[summary_end_i] = self.SUMMARY_END_REGEX.sub("", blocks[summary_end_i])
+            # build HTML for summary
+            blocks[summary_end_i] = blocks[summary_end_i].rstrip() # remove trailing whitespace from the newline
+            self.parser.parseBlocks(summary_elem, blocks[:summary_end_i + 1])
+        # prepend thm heading (including default summary) to summary if applicable
+        utils.prepend_thm_heading_md(type_opts, summary_elem, thm_heading_md)
+
+        # remove dropdown ending delim, and extract element
+        if work_budget is not None:
+            work_budget.enter_env()
+        blocks[end_i] = end_pattern.sub("", blocks[end_i])
+        # build HTML for dropdown
+        details_elem = etree.SubElement(parent, "details")
+        if self.compact:
+            html_class = utils.join_html_classes(self.html_class, type_opts.get("html_class"))
+            if html_class != "":
+                details_elem.set("class", html_class)
+        elif self.html_class != "" or type_opts.get("html_class") != "":
+            details_elem.set("class", f"{self.html_class} {type_opts.get('html_class')}")
+        details_elem.append(summary_elem)
+        content_parent_elem = details_elem
+        if self.deferred_content != "":
+            # still part of the tree, so later processors handle the content as usual
+            content_parent_elem = etree.SubElement(details_elem, "template")
+            content_parent_elem.set("data-md-deferred", "")
+        content_elem = etree.SubElement(content_parent_elem, "div")
+        content_html_class = self.content_html_class
+        if self.compact:
+            content_html_class = utils.join_html_classes(content_html_class)
+        if content_html_class != "":
+            content_elem.set("class", content_html_class)
+        blocks[end_i] = blocks[end_i].rstrip() # remove trailing whitespace from the newline into `\end{}`
+        self.parser.parseBlocks(content_elem, blocks[content_start_i:end_i + 1])
+        if work_budget is not None:
+            work_budget.exit_env()
+        # remove used blocks (summary too), all at once since removing blocks from the start of `blocks` moves every
+        # block after them
+        del blocks[:end_i + 1]
         return True
 
 
+class DeferredContentProcessor(Postprocessor):
+
+    START = '<template data-md-deferred="">'
+    TEMPLATE_TAG_PATTERN = re.compile(r"<(/?)template\b")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deferred_content = {}
+
+    def reset(self):
+        self.deferred_content = {}
+
+    def defer(self, html: str) -> str:
+        # keyed by a hash of the content, so keys are stable across builds and identical contents are stored once
+        key = hashlib.sha256(html.encode("utf-8")).hexdigest()[:16]
+        self.deferred_content[key] = html
+        return key
+
+    def run(self, text):
+        new_text = []
+        prev_match_end = 0
+        start = text.find(self.START)
+        while start != -1:
+            # find the matching end tag, skipping over nested `<template>`s
+            depth = 1
+            m = None
+            for m in self.TEMPLATE_TAG_PATTERN.finditer(text, start + len(self.START)):
+                depth += -1 if m.group(1) else 1
+                if depth == 0:
+                    break
+            if depth != 0:
+                break
+            end = text.index(">", m.end()) + 1
+            # nested dropdowns are deferred into entries of their own
+            key = self.defer(self.run(text[start + len(self.START):m.start()]).strip())
+            new_text.append(text[prev_match_end:start])
+            new_text.append(f'<template data-md-deferred="{key}"></template>')
+            prev_match_end = end
+            start = text.find(self.START, end)
+        new_text.append(text[prev_match_end:])
+        return "".join(new_text)
+
+    def run_tree(self, root: etree.Element) -> None:
+        from . import tree
+
+        # innermost first, like `run()`
+        for template_elem in reversed(list(root.iter("template"))):
+            if template_elem.get("data-md-deferred") != "":
+                continue
+            html = tree.serialize_content(self.md, tree.get_content(template_elem)).strip()
+            template_elem.set("data-md-deferred", self.defer(html))
+            tree.set_content(template_elem, [])
+
+    def get_deferred_content(self) -> dict:
+        return self.deferred_content
+
+
+def register_deferred_content(md, deferred_content: str) -> DeferredContentProcessor | None:
+    r"""
+    Set up `md` for a `deferred_content` mode, returning the (shared) `DeferredContentProcessor` in `"side_file"` mode.
+    """
+
+    if deferred_content == "":
+        return None
+    # so that `<template>`s are prettified like the `<div>`s they replace
+    if "template" not in md.block_level_elements:
+        md.block_level_elements.append("template")
+    if deferred_content != "side_file":
+        return None
+    if "deferred_content" not in md.postprocessors:
+        # after Python-Markdown restores raw HTML, so the side file holds final HTML
+        md.postprocessors.register(DeferredContentProcessor(md), "deferred_content", 10)
+    return md.postprocessors["deferred_content"]
+
+
 class DropdownExtension(Extension):
     r"""
     A dropdown that can be toggled open or closed, with only a preview portion (`<summary>`) shown when closed.
@@ -165,6 +316,27 @@ class DropdownExtension(Extension):
               </div>
             </details>
 
+        or, with `deferred_content` set to `"template"`:
+
+        .. code-block:: html
+
+            <details class="[html_class] [type's html_class]">
+              <summary class="[summary_html_class]">
+                [summary]
+              </summary>
+
+              <template data-md-deferred="">
+                <div class="[content_html_class]">
+                  [collapsible content]
+                </div>
+              </template>
+            </details>
+
+        or, with `deferred_content` set to `"side_file"`, `<template data-md-deferred="[key]"></template>`, where the
+        content is instead stored under `[key]` in the dict returned by `get_deferred_content()`. Write that dict to a
+        JSON side file next to the page, and add `deferred_content_script(side_file_url)` to the page to load the
+        content when a dropdown is first opened.
+
     Important:
         The `summary` block must be placed at the *start* of the `dropdown` block, of course with blank lines before and
         after the `summary` block.
@@ -178,10 +350,23 @@ class DropdownExtension(Extension):
             - **html_class** (*str*) -- HTML `class` attribute to add to dropdowns. Defaults to `""`.
             - **summary_html_class** (*str*) -- HTML `class` attribute to add to dropdown summaries. Defaults to `""`.
             - **content_html_class** (*str*) -- HTML `class` attribute to add to dropdown contents. Defaults to `""`.
-
-        The key for each type defined in `types` is inserted directly into the regex patterns that search for
-        `\\begin{<type>}` and `\\end{<type>}`, so anything you specify will be interpreted as regex. However,
-        if the key is an empty string, its regex will never be matched against, so it is effectively useless.
+            - **deferred_content** (*str*) -- Where to put dropdown contents so browsers don't have to load them until
+              opened: `""` (inline, as usual), `"template"` (in an inert `<template>`), or `"side_file"` (in a
+              separate file). Defaults to `""`.
+            - **literal_types** (*bool*) -- Whether to match the keys of `types` literally instead of as regex.
+              Defaults to `False`.
+            - **compact** (*bool*) -- Whether to normalize HTML `class` attributes, leaving out empty classes and the
+              spaces around them (e.g. `class=" md-exer"` becomes `class="md-exer"`). Defaults to `False`.
+            - **fragment_cache** (*FragmentCache*) -- Cache of already-parsed dropdowns to reuse across conversions (see
+              `markdown_environments.cache.FragmentCache`). Defaults to `None`.
+            - **codegen_dir** (*str*) -- Directory to keep a processor generated specifically for this config in, to
+              use instead of the generic one (see `markdown_environments.codegen`); `""` to not generate one.
+              Defaults to `""`.
+
+        Unless `literal_types` is set, the key for each type defined in `types` is inserted directly into the regex
+        patterns that search for `\\begin{<type>}` and `\\end{<type>}`, so anything you specify will be interpreted as
+        regex (and keys that risk catastrophic backtracking raise a `ValueError`). However, if the key is an empty
+        string, its regex will never be matched against, so it is effectively useless.
         In addition, each type's value is itself a dictionary with the following possible options:
 
             - **html_class** (*str*) -- HTML `class` attribute to add to dropdowns of that type. Defaults to `""`.
@@ -207,16 +392,58 @@ class DropdownExtension(Extension):
             "is_thm": [
                 False,
                 "Whether to use theorem logic (e.g. heading); used only by `ThmExtension`. Defaults to `False`."
+            ],
+            "deferred_content": [
+                "",
+                "Where to put dropdown contents: `\"\"`, `\"template\"`, or `\"side_file\"`. Defaults to `\"\"`."
+            ],
+            "literal_types": [
+                False,
+                "Whether to match the keys of `types` literally instead of as regex. Defaults to `False`."
+            ],
+            "compact": [
+                False,
+                "Whether to normalize HTML `class` attributes. Defaults to `False`."
             ]
         }
+        # not a regular config, since `markdown.extensions.Extension` would convert a `None` default to a `bool`
+        self.fragment_cache = kwargs.pop("fragment_cache", None)
+        # not a regular config either, since it only chooses which class the processor is
+        self.codegen_dir = kwargs.pop("codegen_dir", "")
         utils.init_extension_with_configs(self, **kwargs)
+        if self.getConfig("deferred_content") not in DEFERRED_CONTENT_MODES:
+            raise ValueError(f"`deferred_content` must be one of {DEFERRED_CONTENT_MODES}")
 
         # set default options for individual types
         for type, opts in self.getConfig("types").items():
             opts.setdefault("html_class", "")
 
     def extendMarkdown(self, md):
-        md.parser.blockprocessors.register(DropdownProcessor(md.parser, **self.getConfigs()), "dropdown", 105)
+        processor_class = DropdownProcessor
+        if self.codegen_dir != "":
+            # imported here since most configs never need it
+            from .codegen import load_processor_class
+            processor_class = load_processor_class("dropdown", self.getConfigs(), self.codegen_dir)
+        md.parser.blockprocessors.register(
+            processor_class(md.parser, fragment_cache=self.fragment_cache, **self.getConfigs()), "dropdown", 105
+        )
+        self.deferred_content_processor = register_deferred_content(md, self.getConfig("deferred_content"))
+        if self.deferred_content_processor is not None:
+            md.registerExtension(self)
+
+    def reset(self):
+        if getattr(self, "deferred_content_processor", None) is not None:
+            self.deferred_content_processor.reset()
+
+    def get_deferred_content(self) -> dict:
+        r"""
+        Return the dropdown contents deferred to a side file by the last conversion, keyed by the `data-md-deferred`
+        attribute of the `<template>` each one was taken out of.
+        """
+
+        if getattr(self, "deferred_content_processor", None) is None:
+            return {}
+        return dict(self.deferred_content_processor.get_deferred_content())
 
 
 def makeExtension(**kwargs):
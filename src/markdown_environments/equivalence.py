@@ -0,0 +1,443 @@
+r"""
+Differential testing of this package's alternative rendering paths against `Renderer.convert()`.
+
+Run with::
+
+    python -m markdown_environments.equivalence --config config.json [--fuzz 100] [--engines parallel,stream]
+        [--output report.json] docs/*.md
+
+where `config.json` holds `Renderer` extension configs. Every file (and `--fuzz` mutated variants of each) is rendered
+by the reference path and by every engine, and each engine's HTML must be byte-identical to the reference's, with an
+identical theorem `\ref{}` map. Every mismatch is shrunk to a small document that still reproduces it, and printed
+along with each engine's total time relative to the reference's. The exit status is `1` if there were any mismatches.
+
+The engines are:
+
+- `parallel`: `ParallelRenderer`, with every document going through its process pool.
+- `fragment_cache`: `Renderer` with one `FragmentCache` shared by every environment type and every document checked,
+  so later documents mostly hit entries cached by earlier ones.
+- `stream`: `Renderer.convert_stream()`, one top-level chunk at a time. Documents in which more than one theorem uses
+  the same name are skipped, since their `\ref{}`s can resolve differently when streamed. Extensions that need the
+  whole element tree at once (e.g. `toc`) aren't supported by it, so don't check it with them.
+- `codegen`: `Renderer` with processors generated for the config (see `markdown_environments.codegen`), in a temporary
+  `codegen_dir`.
+"""
+
+import argparse
+import contextlib
+import json
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+
+from .render import Renderer
+from . import utils
+
+
+def reference_engine(extension_configs: dict, exit_stack: contextlib.ExitStack):
+    renderer = Renderer(extension_configs)
+
+    def convert(text: str) -> tuple[str, dict]:
+        return renderer.convert(text), renderer.get_thm_ref_map()
+    return convert
+
+
+def parallel_engine(extension_configs: dict, exit_stack: contextlib.ExitStack):
+    # imported here since it's the only engine that needs a process pool
+    from .parallel import ParallelRenderer
+
+    # `min_chunks=1` so that even tiny documents go through the process pool
+    parallel_renderer = exit_stack.enter_context(ParallelRenderer(extension_configs, processes=2, min_chunks=1))
+
+    def convert(text: str) -> tuple[str, dict]:
+        return parallel_renderer.convert(text), parallel_renderer.get_thm_ref_map()
+    return convert
+
+
+def with_env_configs(extension_configs: dict, **configs) -> dict:
+    # `configs` added to the config of every div and dropdown environment, including theorems'
+    extension_configs = dict(extension_configs)
+    for name in ("DivExtension", "DropdownExtension"):
+        if name in extension_configs:
+            extension_configs[name] = {**extension_configs[name], **configs}
+    if "ThmsExtension" in extension_configs:
+        thms_config = dict(extension_configs["ThmsExtension"])
+        for name in ("div_config", "dropdown_config"):
+            if name in thms_config:
+                thms_config[name] = {**thms_config[name], **configs}
+        extension_configs["ThmsExtension"] = thms_config
+    return extension_configs
+
+
+def fragment_cache_engine(extension_configs: dict, exit_stack: contextlib.ExitStack):
+    from .cache import FragmentCache
+
+    fragment_cache = FragmentCache(max_entries=4096)
+    return reference_engine(with_env_configs(extension_configs, fragment_cache=fragment_cache), exit_stack)
+
+
+def codegen_engine(extension_configs: dict, exit_stack: contextlib.ExitStack):
+    import tempfile
+
+    codegen_dir = exit_stack.enter_context(tempfile.TemporaryDirectory())
+    return reference_engine(with_env_configs(extension_configs, codegen_dir=codegen_dir), exit_stack)
+
+
+def stream_engine(extension_configs: dict, exit_stack: contextlib.ExitStack):
+    from .lint import Linter
+
+    renderer = Renderer(extension_configs)
+    linter = Linter(extension_configs)
+
+    def convert(text: str) -> tuple[str, dict] | None:
+        # `\ref{}`s to names that more than one theorem uses can resolve differently (see `convert_stream()`)
+        if any(diagnostic.code in ("duplicate-name", "duplicate-hidden-name") for diagnostic in linter.lint(text)):
+            return None
+        # and so can `\ref{}`s to theorem counters' hidden names used more than once, which the linter allows
+        counter_names = [m.group(1) for m in Linter.COUNTER_PATTERN.finditer(text)]
+        if len(set(counter_names)) < len(counter_names):
+            return None
+        # one chunk per batch, so every chunk boundary is exercised
+        return "".join(renderer.convert_stream(text, batch_blocks=1)), renderer.get_thm_ref_map()
+    return convert
+
+
+# functions building each engine's `convert()` (returning HTML and the theorem `\ref{}` map, or `None` for documents the
+# engine doesn't support) from extension configs, entering anything that has to be closed afterwards into the exit stack
+ENGINES = {
+    "parallel": parallel_engine,
+    "fragment_cache": fragment_cache_engine,
+    "stream": stream_engine,
+    "codegen": codegen_engine
+}
+
+
+@dataclass
+class Mismatch:
+    r"""
+    One document on which an engine's output differs from the reference's.
+
+    Attributes:
+        engine: Name of the engine.
+        kind: `"html"`, `"thm_ref_map"`, or `"error"` (only one of them raised, or they raised different errors).
+        source: Name of the document (e.g. its path, with `#fuzz-<n>` appended for fuzzed variants).
+        text: The document.
+        expected: The reference's output (HTML, `\ref{}` map, or error).
+        actual: The engine's output.
+        minimized: A (usually much) smaller document that still reproduces the mismatch, if it was minimized.
+    """
+
+    engine: str
+    kind: str
+    source: str
+    text: str
+    expected: object
+    actual: object
+    minimized: str | None = None
+
+    def __str__(self) -> str:
+        return (
+            f"{self.source}: {self.engine}: {self.kind} differs from reference\n"
+            f"--- minimized document ---\n{self.minimized if self.minimized is not None else self.text}\n"
+            f"--- expected ---\n{self.expected}\n--- actual ---\n{self.actual}"
+        )
+
+
+@dataclass
+class Outcome:
+    html: str | None = None
+    thm_ref_map: dict = field(default_factory=dict)
+    error: str | None = None
+    skipped: bool = False
+    seconds: float = 0.0
+
+
+def run_engine(convert, text: str) -> Outcome:
+    start = time.perf_counter()
+    try:
+        result = convert(text)
+        outcome = Outcome(skipped=True) if result is None else Outcome(html=result[0], thm_ref_map=result[1])
+    except Exception as e:
+        outcome = Outcome(error=f"{e.__class__.__name__}: {e}")
+    outcome.seconds = time.perf_counter() - start
+    return outcome
+
+
+def compare(expected: Outcome, actual: Outcome) -> tuple[str, object, object] | None:
+    # returns the kind of mismatch and both sides of it, if any
+    if actual.skipped:
+        return None
+    if expected.error is not None or actual.error is not None:
+        if expected.error != actual.error:
+            return "error", expected.error, actual.error
+        return None
+    if expected.html != actual.html:
+        return "html", expected.html, actual.html
+    if expected.thm_ref_map != actual.thm_ref_map:
+        return "thm_ref_map", expected.thm_ref_map, actual.thm_ref_map
+    return None
+
+
+def ddmin(units: list, predicate, max_tests: int) -> list:
+    r"""
+    Return a subsequence of `units` that `predicate` still holds for, using delta debugging: repeatedly try dropping
+    chunks of the sequence, halving the chunk size whenever no chunk can be dropped.
+
+    Stops early once `predicate` has been called `max_tests` times.
+    """
+
+    tests = 0
+    n = 2
+    while len(units) >= 2:
+        size = -(-len(units) // n) # ceiling division
+        starts = range(0, len(units), size)
+        reduced = False
+        # try keeping just one chunk, and then dropping just one chunk
+        for candidates in (
+            [units[start:start + size] for start in starts],
+            [units[:start] + units[start + size:] for start in starts] if n > 2 else []
+        ):
+            for candidate in candidates:
+                if tests >= max_tests:
+                    return units
+                tests += 1
+                if predicate(candidate):
+                    units = candidate
+                    n = 2 if len(candidate) <= size else max(n - 1, 2)
+                    reduced = True
+                    break
+            if reduced:
+                break
+        if not reduced:
+            if n >= len(units):
+                break
+            n = min(2 * n, len(units))
+    return units
+
+
+def minimize(text: str, predicate, max_tests: int = 2000) -> str:
+    r"""
+    Return a small document that `predicate` still holds for, shrinking `text` block by block, then line by line, and
+    then character by character.
+    """
+
+    for separator in ("\n\n", "\n", ""):
+        units = text.split(separator) if separator != "" else list(text)
+        text = separator.join(ddmin(units, lambda units: predicate(separator.join(units)), max_tests))
+    return text
+
+
+class Fuzzer:
+    r"""
+    Mutates documents in the ways most likely to trip up environment parsing: moving, duplicating, and dropping blocks
+    and environment delimiters, splitting and joining blocks, and inserting Markdown and HTML special characters.
+    """
+
+    DELIM_PATTERN = re.compile(r"^\\(?:begin|end){.*$|\\ref{[^}]*}", flags=re.MULTILINE)
+    SNIPPETS = (
+        "&", "<", ">", "*", "_", "`", "{", "}", "[", "]", "\\", "\n", "\n\n", "    ", "<b>raw</b>", "&amp;",
+        "[link](https://example.com/?a=1&b=2)", "\\ref{missing}"
+    )
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+
+    def mutate(self, text: str, mutations: int = 3) -> str:
+        for _ in range(mutations):
+            text = self.mutate_once(text)
+        return text
+
+    def mutate_once(self, text: str) -> str:
+        rng = self.rng
+        blocks = text.split("\n\n")
+        i = rng.randrange(len(blocks))
+        j = rng.randrange(len(blocks) + 1)
+        delims = self.DELIM_PATTERN.findall(text)
+        mutation = rng.randrange(6)
+        if mutation == 0 and len(blocks) > 1:
+            del blocks[i]
+        elif mutation == 1:
+            blocks.insert(j, blocks[i])
+        elif mutation == 2 and len(blocks) > 1:
+            blocks.insert(j, blocks.pop(i))
+        elif mutation == 3 and delims:
+            # a delimiter or `\ref{}` from elsewhere in the document, as its own block or inside another one
+            delim = rng.choice(delims)
+            if rng.random() < 0.5:
+                blocks.insert(j, delim)
+            else:
+                blocks[i] = f"{blocks[i]}\n{delim}"
+        elif mutation == 4 and len(blocks) > 1 and j < len(blocks) and i != j:
+            # join two blocks into one
+            blocks[i] = f"{blocks[i]}\n{blocks[j]}"
+            del blocks[j]
+        else:
+            k = rng.randrange(len(blocks[i]) + 1)
+            blocks[i] = blocks[i][:k] + rng.choice(self.SNIPPETS) + blocks[i][k:]
+        return "\n\n".join(blocks)
+
+
+class EquivalenceChecker:
+    r"""
+    Renders documents with `Renderer.convert()` and with each alternative engine, recording every mismatch and each
+    engine's time.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.equivalence import EquivalenceChecker, Fuzzer
+
+            with EquivalenceChecker(extension_configs, engines=["parallel", "stream"]) as checker:
+                fuzzer = Fuzzer(seed=0)
+                for path, text in sources.items():
+                    checker.check(text, source=path)
+                    for i in range(100):
+                        checker.check(fuzzer.mutate(text), source=f"{path}#fuzz-{i}")
+                for mismatch in checker.mismatches:
+                    print(mismatch)
+                print(checker.timing_ratios())
+    """
+
+    def __init__(
+        self, extension_configs: dict, engines: list | None = None, minimize: bool = True,
+        max_minimize_tests: int = 2000
+    ):
+        r"""
+        Args:
+            extension_configs: `Renderer` extension configs.
+            engines: Names of the engines to check (see `ENGINES`). Defaults to all of them.
+            minimize: Whether to minimize each mismatch's document.
+            max_minimize_tests: Maximum number of renders while minimizing each mismatch.
+        """
+
+        self.exit_stack = contextlib.ExitStack()
+        self.reference = reference_engine(extension_configs, self.exit_stack)
+        self.engines = {
+            name: ENGINES[name](extension_configs, self.exit_stack)
+            for name in (engines if engines is not None else ENGINES)
+        }
+        self.minimize = minimize
+        self.max_minimize_tests = max_minimize_tests
+        self.mismatches = []
+        self.documents = 0
+        # per engine, only counting documents it didn't skip, along with the reference's time on those
+        self.seconds = {name: 0.0 for name in self.engines}
+        self.reference_seconds = {name: 0.0 for name in self.engines}
+        self.skipped = {name: 0 for name in self.engines}
+
+    def check(self, text: str, source: str = "<string>") -> list:
+        r"""
+        Render one document with every engine.
+
+        Returns:
+            The document's `Mismatch`\ es, which are also added to `mismatches`.
+        """
+
+        expected = run_engine(self.reference, text)
+        self.documents += 1
+        mismatches = []
+        for name, convert in self.engines.items():
+            actual = run_engine(convert, text)
+            if actual.skipped:
+                self.skipped[name] += 1
+                continue
+            self.seconds[name] += actual.seconds
+            self.reference_seconds[name] += expected.seconds
+            difference = compare(expected, actual)
+            if difference is None:
+                continue
+            mismatch = Mismatch(name, difference[0], source, text, difference[1], difference[2])
+            if self.minimize:
+                mismatch.minimized = minimize(
+                    text, lambda text: self.reproduces(mismatch, text), max_tests=self.max_minimize_tests
+                )
+            mismatches.append(mismatch)
+        self.mismatches += mismatches
+        return mismatches
+
+    def reproduces(self, mismatch: Mismatch, text: str) -> bool:
+        r"""
+        Return whether `mismatch`'s engine still differs from the reference in the same way on `text`.
+        """
+
+        difference = compare(run_engine(self.reference, text), run_engine(self.engines[mismatch.engine], text))
+        return difference is not None and difference[0] == mismatch.kind
+
+    def timing_ratios(self) -> dict:
+        r"""
+        Return each engine's total time divided by the reference's, over every document checked so far that the
+        engine didn't skip.
+        """
+
+        return {
+            name: seconds / self.reference_seconds[name] if self.reference_seconds[name] > 0 else 0.0
+            for name, seconds in self.seconds.items()
+        }
+
+    def report(self) -> dict:
+        return {
+            "documents": self.documents,
+            "skipped": dict(self.skipped),
+            "seconds": dict(self.seconds),
+            "reference_seconds": dict(self.reference_seconds),
+            "timing_ratios": self.timing_ratios(),
+            "mismatches": [
+                {
+                    "engine": mismatch.engine, "kind": mismatch.kind, "source": mismatch.source,
+                    "minimized": mismatch.minimized if mismatch.minimized is not None else mismatch.text
+                }
+                for mismatch in self.mismatches
+            ]
+        }
+
+    def close(self) -> None:
+        self.exit_stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m markdown_environments.equivalence", description=__doc__.split("\n")[1]
+    )
+    parser.add_argument("--config", required=True, help="JSON file containing extension configs")
+    parser.add_argument("--engines", help=f"comma-separated engines to check (default: {','.join(ENGINES)})")
+    parser.add_argument("--fuzz", type=int, default=0, help="fuzzed variants to check per file")
+    parser.add_argument("--mutations", type=int, default=3, help="mutations per fuzzed variant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-minimize", action="store_true", help="don't minimize mismatching documents")
+    parser.add_argument("--output", help="file to write a JSON report to")
+    parser.add_argument("paths", nargs="+", help="Markdown files to check")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as file:
+        extension_configs = json.load(file)
+    engines = args.engines.split(",") if args.engines is not None else None
+    fuzzer = Fuzzer(args.seed)
+    with EquivalenceChecker(extension_configs, engines=engines, minimize=not args.no_minimize) as checker:
+        for path in args.paths:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+            checker.check(text, source=path)
+            for i in range(args.fuzz):
+                checker.check(fuzzer.mutate(text, args.mutations), source=f"{path}#fuzz-{i}")
+        report = checker.report()
+        for mismatch in checker.mismatches:
+            print(mismatch, end="\n\n")
+
+    print(f"{report['documents']} documents, {len(report['mismatches'])} mismatches")
+    for name, ratio in report["timing_ratios"].items():
+        print(f"{name}: {ratio:.2f}x reference time")
+    if args.output is not None:
+        utils.atomic_write(args.output, json.dumps(report, indent=4))
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+r"""
+Helpers for local image files referenced by documents, e.g. by `CaptionedFigureExtension`'s image options.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import struct
+import threading
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+from . import utils
+
+
+class StatCache:
+    r"""
+    A map from file paths to values computed from their contents, optionally persisted to a JSON file, that only
+    recomputes a file's value when its mtime or size changes.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.images import StatCache, probe_image_size
+
+            image_sizes = StatCache(probe_image_size, path=".image-sizes.json")
+            width_height = image_sizes.get("img/diagram.png")
+            image_sizes.save()
+    """
+
+    def __init__(self, compute, path: str | None = None):
+        r"""
+        Args:
+            compute: Computes a file's value (which must be JSON-serializable) from its path, or returns `None` if it
+                has none.
+            path: JSON file to load entries from and save them to, or `None` to only keep them in memory.
+        """
+
+        self.compute = compute
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        if path is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def get(self, file_path: str):
+        r"""
+        Return a file's value, or `None` if it doesn't exist or has no value.
+        """
+
+        file_path = os.path.abspath(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        entry = self.entries.get(file_path)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        value = self.compute(file_path)
+        with self.lock:
+            self.entries[file_path] = [st.st_mtime_ns, st.st_size, value]
+            self.dirty = True
+        return value
+
+    def save(self) -> None:
+        r"""
+        Write the entries to `path` if any changed since they were loaded or last saved.
+        """
+
+        if self.path is None or not self.dirty:
+            return
+        with self.lock:
+            contents = json.dumps(self.entries, separators=(",", ":"))
+            self.dirty = False
+        utils.atomic_write(self.path, contents)
+
+
+def probe_image_size(path: str) -> list | None:
+    r"""
+    Return the `[width, height]` of a PNG, JPEG, GIF, or WebP image by reading only its header, or `None` if the file
+    isn't one of those (or is malformed).
+    """
+
+    try:
+        with open(path, "rb") as file:
+            head = file.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return list(struct.unpack(">II", head[16:24]))
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return list(struct.unpack("<HH", head[6:10]))
+            if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+                return probe_webp_size(head)
+            if head.startswith(b"\xff\xd8"):
+                file.seek(2)
+                return probe_jpeg_size(file)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def probe_webp_size(head: bytes) -> list | None:
+    chunk_type = head[12:16]
+    if chunk_type == b"VP8 " and len(head) >= 30:
+        width, height = struct.unpack("<HH", head[26:30])
+        return [width & 0x3fff, height & 0x3fff]
+    if chunk_type == b"VP8L" and len(head) >= 25:
+        b0, b1, b2, b3 = head[21:25]
+        return [1 + (((b1 & 0x3f) << 8) | b0), 1 + (((b3 & 0xf) << 10) | (b2 << 2) | ((b1 & 0xc0) >> 6))]
+    if chunk_type == b"VP8X" and len(head) >= 30:
+        return [1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")]
+    return None
+
+
+def probe_jpeg_size(file) -> list | None:
+    # walk the segment headers (seeking over their contents) until a start-of-frame segment
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        code = marker[1]
+        if code == 0xff: # fill byte
+            file.seek(-1, os.SEEK_CUR)
+            continue
+        if code == 0xd8 or 0xd0 <= code <= 0xd7 or code == 0x01: # segments without lengths
+            continue
+        if code == 0xd9 or code == 0xda: # end of image, or start of scan before any frame
+            return None
+        (length,) = struct.unpack(">H", file.read(2))
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">xHH", file.read(5))
+            return [width, height]
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def hash_file(path: str, length: int = 12) -> str | None:
+    r"""
+    Return the first `length` hex digits of a file's SHA-256 hash, or `None` if it can't be read.
+    """
+
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 16), b""):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()[:length]
+
+
+def hashed_src(src: str, digest: str) -> str:
+    r"""
+    Return `src` with `digest` inserted before its file extension (e.g. `img/a.png?v=1` becomes
+    `img/a.<digest>.png?v=1`).
+    """
+
+    parts = urlsplit(src)
+    root, ext = posixpath.splitext(parts.path)
+    return urlunsplit(parts._replace(path=f"{root}.{digest}{ext}"))
+
+
+def copy_if_missing(src_path: str, dst_path: str) -> None:
+    r"""
+    Copy a file to `dst_path` unless something is already there (which, for content-hashed paths, must be the same
+    file).
+    """
+
+    if os.path.exists(dst_path):
+        return
+    utils.atomic_write(dst_path, copy_from=src_path)
+
+
+def resolve_local_src(src: str, base_dir: str) -> str | None:
+    r"""
+    Return the path of the local file an `<img>`'s `src` points to, or `None` if it's remote (or a `data:` URL) or
+    outside `base_dir`. Relative and root-relative sources are both resolved against `base_dir`.
+    """
+
+    parts = urlsplit(src)
+    if parts.scheme != "" or parts.netloc != "" or parts.path == "":
+        return None
+    # documents may be untrusted, so `..` segments (percent-encoded or not) and symlinks mustn't lead outside
+    # `base_dir`, where images are read from or written to
+    base_dir = os.path.realpath(base_dir)
+    path = os.path.realpath(os.path.join(base_dir, unquote(parts.path).lstrip("/")))
+    if os.path.commonpath([base_dir, path]) != base_dir:
+        return None
+    return path
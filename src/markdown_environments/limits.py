@@ -0,0 +1,222 @@
+r"""
+Limits on the work a conversion may do, for rendering untrusted input.
+"""
+
+import re
+
+from markdown.extensions import Extension
+from markdown.preprocessors import Preprocessor
+
+from . import utils
+
+
+class BudgetExceededError(RuntimeError):
+    r"""
+    Raised when a conversion exceeds one of `LimitsExtension`'s limits.
+
+    Attributes:
+        limit_name: Name of the exceeded limit's config (e.g. `"max_blocks_scanned"`).
+        limit: The limit's value.
+    """
+
+    def __init__(self, limit_name: str, limit: int, message: str):
+        super().__init__(f"{message} (exceeds `{limit_name}` of {limit})")
+        self.limit_name = limit_name
+        self.limit = limit
+
+
+class WorkBudget:
+    r"""
+    Counts the work done by one conversion at a time, raising `BudgetExceededError` as soon as it exceeds a limit. A
+    limit of `0` means no limit.
+    """
+
+    def __init__(
+        self, max_document_size: int = 0, max_nesting_depth: int = 0, max_envs: int = 0, max_blocks_scanned: int = 0
+    ):
+        self.max_document_size = max_document_size
+        self.max_nesting_depth = max_nesting_depth
+        self.max_envs = max_envs
+        self.max_blocks_scanned = max_blocks_scanned
+        self.reset()
+
+    def reset(self) -> None:
+        self.depth = 0
+        self.envs = 0
+        self.blocks_scanned = 0
+
+    def check_document_size(self, size: int) -> None:
+        if self.max_document_size and size > self.max_document_size:
+            raise BudgetExceededError(
+                "max_document_size", self.max_document_size, f"document is {size} characters long"
+            )
+
+    def scan(self, blocks: int) -> None:
+        r"""
+        Count blocks scanned, e.g. while searching for an `\end{}`.
+        """
+
+        self.blocks_scanned += blocks
+        if self.max_blocks_scanned and self.blocks_scanned > self.max_blocks_scanned:
+            raise BudgetExceededError(
+                "max_blocks_scanned", self.max_blocks_scanned, f"{self.blocks_scanned} blocks scanned"
+            )
+
+    def enter_env(self) -> None:
+        r"""
+        Count an environment, before parsing its content.
+        """
+
+        self.envs += 1
+        self.depth += 1
+        if self.max_envs and self.envs > self.max_envs:
+            raise BudgetExceededError("max_envs", self.max_envs, f"{self.envs} environments")
+        if self.max_nesting_depth and self.depth > self.max_nesting_depth:
+            raise BudgetExceededError(
+                "max_nesting_depth", self.max_nesting_depth, f"environments nested {self.depth} deep"
+            )
+
+    def exit_env(self) -> None:
+        r"""
+        Count the end of an environment, after parsing its content.
+        """
+
+        self.depth -= 1
+
+
+class WorkBudgetPreprocessor(Preprocessor):
+
+    def __init__(self, *args, work_budget: WorkBudget, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.work_budget = work_budget
+
+    def run(self, lines):
+        self.work_budget.reset()
+        self.work_budget.check_document_size(sum(map(len, lines)) + len(lines) - 1)
+        return lines
+
+
+class LimitsExtension(Extension):
+    r"""
+    Limits on the work a conversion may do, so that rendering untrusted input fails fast with a `BudgetExceededError`
+    instead of running for a very long time.
+
+    Usage:
+        .. code-block:: py
+
+            import markdown
+            from markdown_environments import DivExtension, LimitsExtension
+            from markdown_environments.limits import BudgetExceededError
+
+            md = markdown.Markdown(extensions=[
+                DivExtension(types={"textbox": {}}, literal_types=True),
+                LimitsExtension(max_document_size=1_000_000, max_nesting_depth=16, max_blocks_scanned=100_000)
+            ])
+            try:
+                output_text = md.reset().convert(input_text)
+            except BudgetExceededError as e:
+                ...
+
+    The work budget counts blocks that this package's environments scan while searching for their delimiters.
+    Well-formed documents scan each block about once per environment they're nested in, and the blocks after unclosed
+    `\\begin{}`\ s are scanned about once in total per environment type.
+
+    Note:
+        The type keys of `DivExtension`, `DropdownExtension`, and `ThmsExtension` are regex. If they come from
+        untrusted configs as well, set `literal_types` on those extensions so the keys are matched literally.
+        Keys that aren't literal are rejected when the extension is set up if their patterns risk catastrophic
+        backtracking (see `check_type_pattern()`).
+    """
+
+    def __init__(self, **kwargs):
+        r"""
+        Initialize limits extension, with configuration options passed as the following keyword arguments (where `0`
+        means no limit):
+
+            - **max_document_size** (*int*) -- Maximum length of a document in characters. Defaults to `0`.
+            - **max_nesting_depth** (*int*) -- Maximum depth of environments nested in each other. Defaults to `0`.
+            - **max_envs** (*int*) -- Maximum number of environments in a document. Defaults to `0`.
+            - **max_blocks_scanned** (*int*) -- Maximum total number of blocks scanned by environments. Defaults to
+              `0`.
+        """
+
+        self.config = {
+            "max_document_size": [0, "Maximum length of a document in characters. Defaults to `0` (no limit)."],
+            "max_nesting_depth": [0, "Maximum depth of nested environments. Defaults to `0` (no limit)."],
+            "max_envs": [0, "Maximum number of environments in a document. Defaults to `0` (no limit)."],
+            "max_blocks_scanned": [0, "Maximum number of blocks scanned by environments. Defaults to `0` (no limit)."]
+        }
+        utils.init_extension_with_configs(self, **kwargs)
+        for name, value in self.getConfigs().items():
+            if not isinstance(value, int) or value < 0:
+                raise ValueError(f"`{name}` must be a non-negative integer")
+
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        self.work_budget = WorkBudget(**self.getConfigs())
+        # environment processors find the budget here, no matter which order the extensions were added in
+        md.work_budget = self.work_budget
+        # before every other preprocessor, so oversized documents aren't even preprocessed
+        md.preprocessors.register(WorkBudgetPreprocessor(md, work_budget=self.work_budget), "work_budget", 1000)
+
+    def reset(self):
+        if hasattr(self, "work_budget"):
+            self.work_budget.reset()
+
+
+def check_type_pattern(typ: str) -> None:
+    r"""
+    Raise a `ValueError` if an environment type key is invalid regex, or regex that risks catastrophic backtracking:
+    a repeat that's unbounded and contains another repeat or an alternation (e.g. `(a+)+` or `(a|aa)*`).
+    """
+
+    try:
+        # `sre_parse` was made private in Python 3.11
+        from re import _parser as sre_parse
+    except ImportError:
+        import sre_parse
+
+    try:
+        parsed = sre_parse.parse(typ)
+    except re.error as e:
+        raise ValueError(f"type {typ!r} is not valid regex ({e}); set `literal_types` to match it literally") from e
+
+    repeat_ops = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None))
+
+    def contains_ambiguity(items) -> bool:
+        for op, av in items:
+            if op in repeat_ops:
+                _, max_repeat, sub_items = av
+                if max_repeat > 1:
+                    return True
+                if contains_ambiguity(sub_items):
+                    return True
+            elif op is sre_parse.BRANCH:
+                return True
+            elif op is sre_parse.SUBPATTERN:
+                if contains_ambiguity(av[-1]):
+                    return True
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                if contains_ambiguity(av[1]):
+                    return True
+        return False
+
+    def check(items) -> None:
+        for op, av in items:
+            if op in repeat_ops:
+                _, max_repeat, sub_items = av
+                if max_repeat == sre_parse.MAXREPEAT and contains_ambiguity(sub_items):
+                    raise ValueError(
+                        f"type {typ!r} risks catastrophic backtracking (an unbounded repeat of a repeat or "
+                        "alternation); simplify it or set `literal_types` to match it literally"
+                    )
+                check(sub_items)
+            elif op is sre_parse.BRANCH:
+                for branch in av[1]:
+                    check(branch)
+            elif op is sre_parse.SUBPATTERN:
+                check(av[-1])
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                check(av[1])
+
+    check(parsed)
@@ -0,0 +1,385 @@
+r"""
+Check Markdown sources for environment mistakes without rendering them.
+
+Run with::
+
+    python -m markdown_environments.lint --config config.json docs/*.md
+
+where `config.json` holds `Renderer` extension configs. Only the environment types of `DivExtension`,
+`DropdownExtension`, `ThmsExtension`, `CaptionedFigureExtension`, and `CitedBlockquoteExtension` are used, so sources
+are checked against exactly the environments they'd be rendered with. Every problem is printed as
+`path:line: code: message`, and the exit status is `1` if there were any.
+
+The checks are:
+
+- `unclosed-env`: a `\begin{}` with no matching `\end{}`.
+- `unmatched-end`: an `\end{}` with no matching `\begin{}`.
+- `nested-env`: a `\begin{}` inside an environment of the same type, which the block parser would close at the inner
+  environment's `\end{}`.
+- `missing-summary`: a (non-theorem) dropdown whose `\begin{}` isn't followed by a `\begin{summary}` block.
+- `missing-caption`: a captioned figure with no `caption` block.
+- `missing-citation`: a cited blockquote with no `citation` block.
+- `duplicate-name`: a theorem name (`[...]`) already used by another theorem.
+- `duplicate-hidden-name`: a theorem hidden name (`{...}`) already used by another theorem (hidden names are only
+  used by theorems without names).
+- `unresolved-ref`: a `\ref{}` that isn't any theorem's name, the hidden name of a theorem without a name, or the
+  hidden name of a theorem counter (`{{...}}{...}`).
+
+Like in the block parser, environments (other than the `summary`, `caption`, and `citation` blocks inside them) only
+start at the start of a block, or on the line right after another environment's `\begin{}`. Lines inside fenced code
+blocks are skipped.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from . import utils
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    r"""
+    One problem found by `Linter`.
+    """
+
+    path: str
+    line: int
+    code: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line}: {self.code}: {self.message}"
+
+
+@dataclass
+class OpenEnv:
+    typ: str
+    line: int
+    end_pattern: re.Pattern
+    # sub-environment that must appear directly inside, e.g. `"caption"` for captioned figures
+    required_child: str | None = None
+    has_required_child: bool = False
+
+
+class Linter:
+    r"""
+    Checks sources against the environments defined by a set of extension configs.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.lint import Linter, lint_paths
+
+            linter = Linter(extension_configs)
+            for diagnostic in linter.lint(input_text, path="notes.md"):
+                print(diagnostic)
+
+            # or, for a whole corpus in a process pool
+            diagnostics = lint_paths(extension_configs, paths)
+    """
+
+    FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+    REF_PATTERN = re.compile(r"\\ref{(.+?)}")
+    COUNTER_PATTERN = re.compile(r"{{[0-9,]+}}{(.+?)}")
+    SUB_ENV_TYPES = ("summary", "caption", "citation")
+
+    def __init__(self, extension_configs: dict):
+        r"""
+        Args:
+            extension_configs: `Renderer` extension configs.
+        """
+
+        # `(type, start pattern, end pattern, kind)`, in the order the block parser tries them
+        self.env_patterns = []
+        div_config = extension_configs.get("DivExtension")
+        dropdown_config = extension_configs.get("DropdownExtension")
+        thms_config = extension_configs.get("ThmsExtension")
+        if thms_config is not None:
+            self.add_types(thms_config.get("dropdown_config", {}), "thm_dropdown", is_thm=True)
+        fixed_kinds = {"CaptionedFigureExtension": "captioned_figure", "CitedBlockquoteExtension": "cited_blockquote"}
+        for name, kind in fixed_kinds.items():
+            if name in extension_configs:
+                self.env_patterns.append(
+                    (kind, re.compile(rf"^\\begin{{{kind}}}"), re.compile(rf"^\\end{{{kind}}}"), kind)
+                )
+        if div_config is not None:
+            self.add_types(div_config, "div", is_thm=False)
+        if dropdown_config is not None:
+            self.add_types(dropdown_config, "dropdown", is_thm=False)
+        if thms_config is not None:
+            self.add_types(thms_config.get("div_config", {}), "thm_div", is_thm=True)
+        self.sub_env_patterns = {
+            typ: (re.compile(rf"^\\begin{{{typ}}}"), re.compile(rf"^\\end{{{typ}}}")) for typ in self.SUB_ENV_TYPES
+        }
+        self.check_refs = thms_config is not None
+
+    def add_types(self, config: dict, kind: str, is_thm: bool) -> None:
+        types = {typ: dict(opts) for typ, opts in config.get("types", {}).items()}
+        _, start_patterns, end_patterns = utils.init_env_types(
+            types, is_thm, literal_types=config.get("literal_types", False)
+        )
+        for typ in types:
+            self.env_patterns.append((typ, start_patterns[typ], end_patterns[typ], kind))
+
+    def lint(self, text: str, path: str = "<string>") -> list:
+        r"""
+        Check one source.
+
+        Returns:
+            Its `Diagnostic`\ s, sorted by line.
+        """
+
+        diagnostics, ref_targets, refs = self.scan(text, path)
+        if self.check_refs:
+            diagnostics += self.check_ref_targets(ref_targets, refs)
+        return sorted(diagnostics, key=lambda diagnostic: diagnostic.line)
+
+    def scan(self, text: str, path: str) -> tuple[list, dict, list]:
+        r"""
+        Check one source for everything except `\ref{}`\ s.
+
+        Returns:
+            Its `Diagnostic`\ s, a map from the names its `\ref{}`\ s can resolve to (see the module docs) to where
+            they're defined, and its `\ref{}`\ s as `(name, path, line)` tuples.
+        """
+
+        diagnostics = []
+        names = {}
+        hidden_names = {}
+        ref_targets = {}
+        refs = []
+        stack = []
+        # dropdown whose summary must start the next block
+        pending_summary = None
+        fence = None
+        prev_blank = True
+        # the block parser removes an environment's `\begin{}` line and parses the rest of its block as a new block
+        prev_env_start = False
+        for line_no, line in enumerate(text.replace("\r\n", "\n").replace("\r", "\n").split("\n"), start=1):
+            if fence is not None:
+                if line.strip().startswith(fence):
+                    fence = None
+                continue
+            m = self.FENCE_PATTERN.match(line)
+            if m is not None:
+                fence = m.group(1)
+                continue
+            if line.strip() == "":
+                prev_blank = True
+                continue
+            block_start = prev_blank or prev_env_start
+            prev_blank = False
+            prev_env_start = False
+
+            if pending_summary is not None and block_start:
+                if not self.sub_env_patterns["summary"][0].match(line):
+                    diagnostics.append(Diagnostic(
+                        path, pending_summary.line, "missing-summary",
+                        f"dropdown `{pending_summary.typ}` must be followed by a `\\begin{{summary}}` block"
+                    ))
+                pending_summary = None
+
+            if "\\ref{" in line:
+                for m in self.REF_PATTERN.finditer(line):
+                    refs.append((m.group(1), path, line_no))
+            if "{{" in line:
+                for m in self.COUNTER_PATTERN.finditer(line):
+                    # counters' hidden names have their backslashes unescaped once by `ThmCounterProcessor`
+                    ref_targets.setdefault(m.group(1).replace("\\\\", "\\"), (path, line_no))
+            if not line.startswith("\\"):
+                continue
+
+            if line.startswith("\\end{"):
+                self.close_env(line, line_no, path, stack, diagnostics)
+                continue
+            if not line.startswith("\\begin{"):
+                continue
+            for typ, (start_pattern, end_pattern) in self.sub_env_patterns.items():
+                if start_pattern.match(line):
+                    if stack and stack[-1].required_child == typ:
+                        stack[-1].has_required_child = True
+                    self.open_env(OpenEnv(typ, line_no, end_pattern), path, stack, diagnostics)
+                    break
+            else:
+                for typ, start_pattern, end_pattern, kind in self.env_patterns:
+                    if not block_start:
+                        break
+                    m = start_pattern.match(line)
+                    if m is None:
+                        continue
+                    env = OpenEnv(typ, line_no, end_pattern)
+                    prev_env_start = True
+                    if kind == "captioned_figure":
+                        env.required_child = "caption"
+                    elif kind == "cited_blockquote":
+                        env.required_child = "citation"
+                    elif kind == "dropdown":
+                        pending_summary = env
+                    if kind in ("thm_div", "thm_dropdown"):
+                        # like `ThmHeadingProcessor`, a theorem's hidden name is only used if it has no name
+                        if m.group(1) is not None:
+                            self.add_target(
+                                m.group(1), names, "duplicate-name", "theorem name", path, line_no, diagnostics
+                            )
+                        elif m.group(2) is not None:
+                            self.add_target(
+                                m.group(2), hidden_names, "duplicate-hidden-name", "theorem hidden name", path,
+                                line_no, diagnostics
+                            )
+                        target = m.group(1) if m.group(1) is not None else m.group(2)
+                        if target is not None:
+                            ref_targets.setdefault(target, (path, line_no))
+                    self.open_env(env, path, stack, diagnostics)
+                    break
+
+        if pending_summary is not None:
+            diagnostics.append(Diagnostic(
+                path, pending_summary.line, "missing-summary",
+                f"dropdown `{pending_summary.typ}` must be followed by a `\\begin{{summary}}` block"
+            ))
+        for env in stack:
+            diagnostics.append(self.unclosed(env, path))
+        return diagnostics, ref_targets, refs
+
+    def open_env(self, env: OpenEnv, path: str, stack: list, diagnostics: list) -> None:
+        for outer_env in reversed(stack):
+            if outer_env.typ == env.typ:
+                diagnostics.append(Diagnostic(
+                    path, env.line, "nested-env",
+                    f"`\\begin{{{env.typ}}}` is inside the `{env.typ}` from line {outer_env.line}, which its "
+                    "`\\end{}` would close"
+                ))
+                break
+        stack.append(env)
+
+    def close_env(self, line: str, line_no: int, path: str, stack: list, diagnostics: list) -> None:
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i].end_pattern.match(line):
+                # everything opened inside the environment being closed was never closed itself
+                for env in stack[i + 1:]:
+                    diagnostics.append(self.unclosed(env, path))
+                env = stack[i]
+                if env.required_child is not None and not env.has_required_child:
+                    diagnostics.append(Diagnostic(
+                        path, env.line, f"missing-{env.required_child}",
+                        f"`{env.typ}` has no `\\begin{{{env.required_child}}}` block"
+                    ))
+                del stack[i:]
+                return
+        diagnostics.append(
+            Diagnostic(path, line_no, "unmatched-end", f"`{line.strip()}` has no matching `\\begin{{}}`")
+        )
+
+    def unclosed(self, env: OpenEnv, path: str) -> Diagnostic:
+        return Diagnostic(path, env.line, "unclosed-env", f"`\\begin{{{env.typ}}}` is never closed")
+
+    def add_target(
+        self, name: str, targets: dict, code: str, description: str, path: str, line_no: int, diagnostics: list
+    ) -> None:
+        if name in targets:
+            first_path, first_line = targets[name]
+            where = f"line {first_line}" if first_path == path else f"{first_path}:{first_line}"
+            diagnostics.append(Diagnostic(path, line_no, code, f"{description} `{name}` already used on {where}"))
+        else:
+            targets[name] = (path, line_no)
+
+    def check_ref_targets(self, ref_targets: dict, refs: list) -> list:
+        return [
+            Diagnostic(path, line_no, "unresolved-ref", f"`\\ref{{{name}}}` doesn't match any theorem")
+            for name, path, line_no in refs if name not in ref_targets
+        ]
+
+
+_worker_linter = None
+
+
+def _init_worker(extension_configs: dict) -> None:
+    global _worker_linter
+    _worker_linter = Linter(extension_configs)
+
+
+def _scan_path(path: str, linter: Linter | None = None) -> tuple[list, dict, list]:
+    with open(path, "r", encoding="utf-8") as file:
+        return (linter or _worker_linter).scan(file.read(), path)
+
+
+def lint_paths(
+    extension_configs: dict, paths: list, processes: int | None = None, shared_refs: bool = False,
+    min_paths: int = 16
+) -> list:
+    r"""
+    Check many sources, spread over a pool of worker processes.
+
+    Args:
+        extension_configs: `Renderer` extension configs.
+        paths: Paths of the sources to check.
+        processes: Number of worker processes. Defaults to the number of CPUs.
+        shared_refs: Whether `\ref{}`\ s may point to theorems in any of the sources (e.g. the chapters of one book
+            rendered with `Watcher`), instead of only their own. Duplicate names and hidden names are then also
+            checked across sources.
+        min_paths: Fewer sources than this are checked in the calling process, since the pool's overhead wouldn't pay
+            off.
+
+    Returns:
+        Every source's `Diagnostic`\ s, sorted by path and line.
+    """
+
+    linter = Linter(extension_configs)
+    processes = processes if processes is not None else os.cpu_count() or 1
+    if len(paths) < min_paths or processes == 1:
+        results = [_scan_path(path, linter) for path in paths]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(extension_configs,)) as executor:
+            results = list(executor.map(_scan_path, paths, chunksize=max(1, len(paths) // (processes * 4))))
+
+    diagnostics = []
+    if shared_refs:
+        ref_targets = {}
+        refs = []
+        for path_diagnostics, path_ref_targets, path_refs in results:
+            diagnostics += path_diagnostics
+            refs += path_refs
+            for name, (path, line_no) in path_ref_targets.items():
+                if name in ref_targets and ref_targets[name][0] != path:
+                    first_path, first_line = ref_targets[name]
+                    diagnostics.append(Diagnostic(
+                        path, line_no, "duplicate-name",
+                        f"theorem name or hidden name `{name}` already used on {first_path}:{first_line}"
+                    ))
+                else:
+                    ref_targets.setdefault(name, (path, line_no))
+        if linter.check_refs:
+            diagnostics += linter.check_ref_targets(ref_targets, refs)
+    else:
+        for path_diagnostics, path_ref_targets, path_refs in results:
+            diagnostics += path_diagnostics
+            if linter.check_refs:
+                diagnostics += linter.check_ref_targets(path_ref_targets, path_refs)
+    return sorted(diagnostics, key=lambda diagnostic: (diagnostic.path, diagnostic.line))
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m markdown_environments.lint", description=__doc__.split("\n")[1])
+    parser.add_argument("--config", required=True, help="JSON file containing extension configs")
+    parser.add_argument("--processes", type=int, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument(
+        "--shared-refs", action="store_true", help="resolve \\ref{}s against theorems in all files, not just their own"
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files to check")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as file:
+        extension_configs = json.load(file)
+    diagnostics = lint_paths(extension_configs, args.paths, processes=args.processes, shared_refs=args.shared_refs)
+    for diagnostic in diagnostics:
+        print(diagnostic)
+    return 1 if diagnostics else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+r"""
+Opt-in instrumentation of this package's processors, for finding out where a slow conversion spends its time.
+"""
+
+import contextlib
+import contextvars
+import inspect
+import re
+import time
+import types
+from dataclasses import dataclass, field, fields
+
+from markdown.extensions import Extension
+
+from . import utils
+
+
+@dataclass
+class StageStats:
+    r"""
+    Counts for one stage (one of this package's processors, by the name it's registered under).
+
+    Block processors run inside each other when environments are nested, so their `seconds` include the time spent
+    in the environments nested in them.
+    """
+
+    # block processors only: times `test()` was called, and times it matched
+    tests: int = 0
+    matches: int = 0
+    runs: int = 0
+    # block processors only: times `run()` gave up (e.g. no `\end{}`) and left the blocks as they were
+    rollbacks: int = 0
+    blocks_scanned: int = 0
+    regex_calls: int = 0
+    seconds: float = 0.0
+
+    def merge(self, other: "StageStats") -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+
+STAGE_METRIC_HELP = {
+    "tests": "Calls of each block processor's test().",
+    "matches": "Calls of each block processor's test() that matched.",
+    "runs": "Runs of each stage.",
+    "rollbacks": "Runs of each block processor that left the blocks unchanged.",
+    "blocks_scanned": "Blocks scanned by each stage while searching for delimiters.",
+    "regex_calls": "Regex calls made by each stage.",
+    "seconds": "Time spent in each stage, including nested environments."
+}
+
+
+@dataclass
+class ConversionStats:
+    r"""
+    Counts for the conversions run while this object was collecting (see `collect()`).
+    """
+
+    conversions: int = 0
+    seconds: float = 0.0
+    stages: dict = field(default_factory=dict)
+    # stages currently running, innermost last, which blocks scanned are charged to
+    stack: list = field(default_factory=list, repr=False, compare=False)
+
+    def stage(self, name: str) -> StageStats:
+        stage_stats = self.stages.get(name)
+        if stage_stats is None:
+            stage_stats = self.stages[name] = StageStats()
+        return stage_stats
+
+    def merge(self, other: "ConversionStats") -> None:
+        self.conversions += other.conversions
+        self.seconds += other.seconds
+        for name, stage_stats in other.stages.items():
+            self.stage(name).merge(stage_stats)
+
+    def as_dict(self) -> dict:
+        return {
+            "conversions": self.conversions,
+            "seconds": self.seconds,
+            "stages": {
+                name: {f.name: getattr(stage_stats, f.name) for f in fields(stage_stats)}
+                for name, stage_stats in sorted(self.stages.items())
+            }
+        }
+
+    def to_prometheus(self, prefix: str = "markdown_environments") -> str:
+        r"""
+        Return the counts in Prometheus' text exposition format, as counters.
+        """
+
+        lines = [
+            f"# HELP {prefix}_conversions_total Conversions.",
+            f"# TYPE {prefix}_conversions_total counter",
+            f"{prefix}_conversions_total {self.conversions}",
+            f"# HELP {prefix}_conversion_seconds_total Time spent converting.",
+            f"# TYPE {prefix}_conversion_seconds_total counter",
+            f"{prefix}_conversion_seconds_total {self.seconds!r}"
+        ]
+        for metric, help_text in STAGE_METRIC_HELP.items():
+            name = f"{prefix}_stage_{metric}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for stage, stage_stats in sorted(self.stages.items()):
+                label = stage.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                lines.append(f'{name}{{stage="{label}"}} {getattr(stage_stats, metric)!r}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str = "markdown_environments") -> None:
+        r"""
+        Write `to_prometheus()` to a file (e.g. for node_exporter's textfile collector), replacing it atomically.
+        """
+
+        utils.atomic_write(path, self.to_prometheus(prefix))
+
+
+# the stats that instrumented processors count into, per thread and per asyncio task
+current_stats = contextvars.ContextVar("markdown_environments_current_stats", default=None)
+
+
+@contextlib.contextmanager
+def collect():
+    r"""
+    Count everything that instrumented processors do inside the `with` block (in this thread or asyncio task) into a
+    new `ConversionStats`. When nested, the inner block's counts are added to the outer block's at its end.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.metrics import collect
+
+            with collect() as stats:
+                renderer.convert(text)
+            print(stats.stages["div"].seconds)
+    """
+
+    parent = current_stats.get()
+    stats = ConversionStats()
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+
+class CountingPattern:
+    r"""
+    Wraps a compiled regex pattern to count its calls towards a stage.
+    """
+
+    def __init__(self, pattern: re.Pattern, stage: str):
+        self.wrapped = pattern
+        self.stage = stage
+
+    def count(self) -> None:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.stage(self.stage).regex_calls += 1
+
+    def match(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.match(*args, **kwargs)
+
+    def fullmatch(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.fullmatch(*args, **kwargs)
+
+    def search(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.search(*args, **kwargs)
+
+    def sub(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.sub(*args, **kwargs)
+
+    def subn(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.subn(*args, **kwargs)
+
+    def finditer(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.finditer(*args, **kwargs)
+
+    def findall(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.findall(*args, **kwargs)
+
+    def split(self, *args, **kwargs):
+        self.count()
+        return self.wrapped.split(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        # `pattern`, `flags`, `groups`, ...
+        return getattr(self.wrapped, name)
+
+
+def iter_processors(md, own_only: bool = False):
+    r"""
+    Yield `(stage, name, processor)` for every preprocessor, block processor, treeprocessor, and postprocessor of a
+    `markdown.Markdown` object, with `stage` one of `"preprocessor"`, `"blockprocessor"`, `"treeprocessor"`, and
+    `"postprocessor"`.
+
+    Args:
+        md: The `markdown.Markdown` object.
+        own_only: Whether to only yield this package's processors.
+    """
+
+    for stage, registry in (
+        ("preprocessor", md.preprocessors), ("blockprocessor", md.parser.blockprocessors),
+        ("treeprocessor", md.treeprocessors), ("postprocessor", md.postprocessors)
+    ):
+        # not `registry._priority`, which indexing `registry` sorts in place
+        for name, processor in list(registry._data.items()):
+            if own_only and not type(processor).__module__.startswith(f"{__package__}."):
+                continue
+            yield stage, name, processor
+
+
+def count_regex_calls(processor, stage: str) -> None:
+    for attr, value in list(vars(processor).items()):
+        if isinstance(value, re.Pattern):
+            setattr(processor, attr, CountingPattern(value, stage))
+        elif isinstance(value, dict) and value and all(isinstance(v, re.Pattern) for v in value.values()):
+            # e.g. per-type patterns, which are shared with other processors and so can't be changed in place
+            setattr(processor, attr, {key: CountingPattern(v, stage) for key, v in value.items()})
+        elif isinstance(value, tuple) and value and all(isinstance(v, re.Pattern) for v in value):
+            # e.g. per-type patterns of generated processors (see `markdown_environments.codegen`)
+            setattr(processor, attr, tuple(CountingPattern(v, stage) for v in value))
+
+    # patterns on the class are shadowed on the instance, leaving the class and its other instances as they are
+    cls = type(processor)
+    class_patterns = {
+        attr: getattr(cls, attr) for attr in dir(cls) if isinstance(getattr(cls, attr, None), re.Pattern)
+    }
+    if not class_patterns:
+        return
+    for attr, pattern in class_patterns.items():
+        setattr(processor, attr, CountingPattern(pattern, stage))
+    for attr in dir(cls):
+        if isinstance(inspect.getattr_static(cls, attr), classmethod):
+            # bound to the instance instead of the class, so they see its patterns too
+            setattr(processor, attr, types.MethodType(getattr(cls, attr).__func__, processor))
+
+
+def instrument_block_processor(processor, stage: str) -> None:
+    test = processor.test
+    run = processor.run
+
+    def instrumented_test(parent, block):
+        result = test(parent, block)
+        stats = current_stats.get()
+        if stats is not None:
+            stage_stats = stats.stage(stage)
+            stage_stats.tests += 1
+            if result:
+                stage_stats.matches += 1
+        return result
+
+    def instrumented_run(parent, blocks):
+        stats = current_stats.get()
+        if stats is None:
+            return run(parent, blocks)
+        stage_stats = stats.stage(stage)
+        stats.stack.append(stage_stats)
+        start = time.perf_counter()
+        try:
+            result = run(parent, blocks)
+        finally:
+            stage_stats.seconds += time.perf_counter() - start
+            stats.stack.pop()
+        stage_stats.runs += 1
+        if result is False:
+            stage_stats.rollbacks += 1
+        return result
+
+    processor.test = instrumented_test
+    processor.run = instrumented_run
+
+
+def instrument_method(processor, method_name: str, stage: str) -> None:
+    method = getattr(processor, method_name)
+
+    def instrumented(*args, **kwargs):
+        stats = current_stats.get()
+        if stats is None:
+            return method(*args, **kwargs)
+        stage_stats = stats.stage(stage)
+        stats.stack.append(stage_stats)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stage_stats.seconds += time.perf_counter() - start
+            stats.stack.pop()
+            stage_stats.runs += 1
+
+    setattr(processor, method_name, instrumented)
+
+
+class MetricsExtension(Extension):
+    r"""
+    Instrumentation of every processor in this package: test calls, matches, rollbacks, blocks scanned, regex calls,
+    and time, per stage and per conversion.
+
+    Usage:
+        .. code-block:: py
+
+            import markdown
+            from markdown_environments import DivExtension, MetricsExtension
+
+            metrics_extension = MetricsExtension(prometheus_path="metrics/markdown_environments.prom")
+            md = markdown.Markdown(extensions=[DivExtension(types={"textbox": {}}), metrics_extension])
+            output_text = md.reset().convert(input_text)
+            stats = metrics_extension.last_stats # a `ConversionStats`
+            totals = metrics_extension.totals # every conversion so far
+
+    Each `convert()` counts into its own `ConversionStats`, held in a context variable while it runs, so concurrent
+    conversions in other threads or asyncio tasks are never mixed up. Its counts are also added to any enclosing
+    `markdown_environments.metrics.collect()` block, which is how conversions that don't go through `convert()` (e.g.
+    `Renderer.convert_tree()`) are counted.
+
+    Processors are only instrumented once this extension is added (when `markdown.Markdown.reset()` or `convert()` is
+    first called), so without it, there's no overhead at all.
+    """
+
+    def __init__(self, **kwargs):
+        r"""
+        Initialize metrics extension, with configuration options passed as the following keyword arguments:
+
+            - **prometheus_path** (*str*) -- File to write the totals of every conversion so far to after each
+              conversion, in Prometheus' text format. Defaults to `""` (none).
+            - **prometheus_prefix** (*str*) -- Prefix of every metric's name. Defaults to `"markdown_environments"`.
+        """
+
+        self.config = {
+            "prometheus_path": [
+                "",
+                "File to write the totals of every conversion to after each conversion. Defaults to `\"\"` (none)."
+            ],
+            "prometheus_prefix": [
+                "markdown_environments",
+                "Prefix of every metric's name. Defaults to `\"markdown_environments\"`."
+            ]
+        }
+        utils.init_extension_with_configs(self, **kwargs)
+        self.totals = ConversionStats()
+        self.last_stats = None
+        self.md = None
+        self.is_instrumented = False
+
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        self.md = md
+        convert = md.convert
+
+        def instrumented_convert(source):
+            self.instrument()
+            with collect() as stats:
+                start = time.perf_counter()
+                try:
+                    return convert(source)
+                finally:
+                    stats.conversions += 1
+                    stats.seconds += time.perf_counter() - start
+                    self.last_stats = stats
+                    self.totals.merge(stats)
+                    if self.getConfig("prometheus_path") != "":
+                        self.totals.write_prometheus(
+                            self.getConfig("prometheus_path"), self.getConfig("prometheus_prefix")
+                        )
+
+        md.convert = instrumented_convert
+
+    def reset(self):
+        self.instrument()
+
+    def instrument(self) -> None:
+        # only once every other extension has registered its processors
+        if self.is_instrumented or self.md is None:
+            return
+        self.is_instrumented = True
+        md = self.md
+
+        # blocks scanned are reported to the work budget, so count them there, charged to the innermost stage
+        work_budget = utils.get_work_budget(md)
+        if work_budget is None:
+            from .limits import WorkBudget
+            # no limits, so it never raises
+            work_budget = md.work_budget = WorkBudget()
+        scan = work_budget.scan
+
+        def instrumented_scan(blocks):
+            stats = current_stats.get()
+            if stats is not None and stats.stack:
+                stats.stack[-1].blocks_scanned += blocks
+            scan(blocks)
+
+        work_budget.scan = instrumented_scan
+
+        for stage, name, processor in iter_processors(md, own_only=True):
+            count_regex_calls(processor, name)
+            if stage == "blockprocessor":
+                instrument_block_processor(processor, name)
+            else:
+                instrument_method(processor, "run", name)
+                if hasattr(processor, "run_tree"):
+                    instrument_method(processor, "run_tree", name)
@@ -0,0 +1,270 @@
+r"""
+Split one long document into multiple HTML pages.
+
+Run with::
+
+    python -m markdown_environments.paginate --config config.json --out-dir build/ --split-heading-level 1 book.md
+
+where `config.json` holds `Renderer` extension configs. The document is split before every top-level environment of
+one of the `--split-env` types and every top-level heading of at most `--split-heading-level`, and each part is written
+to its own page. Theorem numbering stays global across pages. Theorem `\ref{}`s to a theorem on another page become
+links to it, and links to `#id`\ s on other pages (e.g. `[see below](#some-heading)`) are rewritten to point to that
+page.
+
+A `manifest.json` is also written to the output directory, listing each page's file and title, and which page every
+HTML `id` is on::
+
+    {"pages": [{"file": "page-1.html", "title": "Introduction"}, ...], "ids": {"thm-fermat": 3, ...}}
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import xml.etree.ElementTree as etree
+
+from markdown.blockprocessors import HashHeaderProcessor, SetextHeaderProcessor
+
+from .render import Renderer
+from .thms import ThmRefProcessor
+from . import utils
+
+
+class Paginator:
+    r"""
+    Renders a document into pages split at top-level boundaries.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.paginate import Paginator
+
+            paginator = Paginator(extension_configs, split_env_types=["chapter"], split_heading_level=1)
+            pages, manifest = paginator.paginate(input_text)
+            paginator.write(input_text, "build/")
+
+    Important:
+        Like `Watcher`, pages are rendered independently, so Python-Markdown link references and other block-level
+        state (e.g. from `footnotes` or `abbr`) don't carry over between pages.
+    """
+
+    HTML_ID_PATTERN = re.compile(r'\bid="([^"]*)"')
+    HTML_HREF_PATTERN = re.compile(r'\bhref="#([^"]*)"')
+    HTML_HEADING_PATTERN = re.compile(r"<h[1-6][^>]*>(.*?)</h[1-6]>", flags=re.DOTALL)
+    HTML_TAG_PATTERN = re.compile(r"<[^>]*>")
+
+    def __init__(
+        self, extension_configs: dict, split_env_types: list | tuple = (), split_heading_level: int | None = None,
+        page_file_name: str = "page-{}.html"
+    ):
+        r"""
+        Args:
+            extension_configs: `Renderer` extension configs.
+            split_env_types: Environment types (e.g. `"chapter"` for `\begin{chapter}`) to start a new page at.
+            split_heading_level: Start a new page at every heading of this level or higher (e.g. `2` for `#` and `##`
+                headings, including their setext forms).
+            page_file_name: File name of each page, with `{}` standing in for the page's 1-based number.
+        """
+
+        self.renderer = Renderer(extension_configs, resolve_refs=False)
+        self.split_env_types = set(split_env_types)
+        self.page_file_name = page_file_name
+        self.split_start_patterns = [
+            start_pattern for typ, start_pattern, _, _ in self.renderer.get_env_patterns()
+            if typ in self.split_env_types
+        ]
+        self.split_heading_level = split_heading_level
+
+    def split(self, text: str) -> list:
+        r"""
+        Split a document into its pages' preprocessed top-level blocks (see `Renderer.preprocess()`), so e.g. a heading
+        inside a fenced code block never starts a page. `self.renderer`'s raw HTML stash holds what the blocks'
+        placeholders stand for until it's next reset.
+        """
+
+        self.renderer.md.reset()
+        blocks = self.renderer.preprocess(text)
+        env_patterns = [start_pattern for _, start_pattern, _, _ in self.renderer.get_env_patterns()]
+        pages = [[]]
+        for start, end in self.renderer.split_top_level(blocks):
+            block = blocks[start][1:] if blocks[start].startswith("\n") else blocks[start]
+            if any(pattern.match(block) for pattern in env_patterns):
+                if any(pattern.match(block) for pattern in self.split_start_patterns):
+                    pages.append([])
+                pages[-1].extend(blocks[start:end])
+                continue
+            for block in blocks[start:end]:
+                block_start = 0
+                for heading_start in self.get_heading_starts(block):
+                    if heading_start > 0:
+                        # the block parser parses the lines before a heading as a block of their own
+                        pages[-1].append(block[block_start:heading_start - 1])
+                    pages.append([])
+                    block_start = heading_start
+                pages[-1].append(block[block_start:])
+        return [page_blocks for page_blocks in pages if page_blocks]
+
+    def get_heading_starts(self, block: str) -> list:
+        r"""
+        Return where every heading of at most `split_heading_level` that the block parser finds in a top-level block
+        starts, including ones in the middle of it.
+        """
+
+        if self.split_heading_level is None:
+            return []
+        root = etree.Element(self.renderer.md.doc_tag)
+        heading_starts = []
+        offset = 0
+        # like `BlockParser.parseBlocks()`, whichever block processor comes first handles the block, and headings
+        # leave the lines after them for the next block processor
+        while True:
+            rest = block[offset:]
+            processor = next(
+                (processor for processor in self.renderer.md.parser.blockprocessors if processor.test(root, rest)),
+                None
+            )
+            if isinstance(processor, HashHeaderProcessor):
+                m = processor.RE.search(rest)
+                heading_start = offset + m.start("level")
+                level = len(m.group("level"))
+            elif isinstance(processor, SetextHeaderProcessor):
+                m = processor.RE.match(rest)
+                heading_start = offset
+                level = 1 if rest.split("\n", 2)[1].startswith("=") else 2
+            else:
+                return heading_starts
+            if level <= self.split_heading_level:
+                heading_starts.append(heading_start)
+            offset += m.end()
+
+    def render_page(self, blocks: list, html_stash: list, thm_counter: list) -> str:
+        r"""
+        Render one page's blocks from `split()` on their own, like `Renderer.convert()`.
+        """
+
+        md = self.renderer.md
+        md.reset()
+        md.htmlStash.rawHtmlBlocks.extend(html_stash)
+        md.htmlStash.html_counter = len(html_stash)
+        if self.renderer.thms_extension is not None:
+            self.renderer.thms_extension.thm_counter_processor.counter = list(thm_counter)
+        if not "".join(blocks).strip():
+            return ""
+        root, references = self.renderer.parse_blocks(blocks)
+        md.references.update(references)
+        return self.renderer.finish(root)
+
+    def paginate(self, text: str) -> tuple[list, dict]:
+        r"""
+        Render a document into pages.
+
+        Returns:
+            Each page's HTML, in order, and the page manifest.
+        """
+
+        page_files = []
+        unresolved_pages = []
+        ref_pages = {}
+        thm_ref_map = {}
+        thm_id_map = {}
+        thm_counter = []
+        pages_blocks = self.split(text)
+        html_stash = list(self.renderer.md.htmlStash.rawHtmlBlocks)
+        for i, page_blocks in enumerate(pages_blocks):
+            page_files.append(self.page_file_name.format(i + 1))
+            unresolved_pages.append(self.render_page(page_blocks, html_stash, thm_counter))
+            thm_counter = self.renderer.get_thm_counter()
+            page_thm_ref_map = self.renderer.get_thm_ref_map()
+            thm_ref_map.update(page_thm_ref_map)
+            thm_id_map.update(self.renderer.get_thm_id_map())
+            for name in page_thm_ref_map:
+                ref_pages[name] = i
+
+        pages = []
+        for i, unresolved_page in enumerate(unresolved_pages):
+            # link `\ref{}`s to theorems on other pages, but leave ones on the same page as they are in `convert()`
+            page_thm_ref_map = {}
+            for m in ThmRefProcessor.PATTERN.finditer(unresolved_page):
+                name = m.group(1)
+                if name not in thm_ref_map:
+                    continue
+                page_thm_ref_map[name] = thm_ref_map[name]
+                if ref_pages[name] != i and name in thm_id_map:
+                    href = html.escape(f"{page_files[ref_pages[name]]}#{thm_id_map[name]}")
+                    page_thm_ref_map[name] = f'<a href="{href}">{thm_ref_map[name]}</a>'
+            pages.append(ThmRefProcessor.resolve_refs(unresolved_page, page_thm_ref_map))
+
+        id_pages = {}
+        for i, page in enumerate(pages):
+            for m in self.HTML_ID_PATTERN.finditer(page):
+                id_pages.setdefault(m.group(1), i)
+
+        def rewrite_href(m: re.Match, i: int) -> str:
+            target_page = id_pages.get(m.group(1))
+            if target_page is None or target_page == i:
+                return m.group(0)
+            return f'href="{html.escape(page_files[target_page])}#{m.group(1)}"'
+
+        pages = [self.HTML_HREF_PATTERN.sub(lambda m: rewrite_href(m, i), page) for i, page in enumerate(pages)]
+        manifest = {
+            "pages": [{"file": page_file, "title": self.get_title(page)} for page_file, page in zip(page_files, pages)],
+            "ids": id_pages
+        }
+        return pages, manifest
+
+    def get_title(self, page: str) -> str:
+        m = self.HTML_HEADING_PATTERN.search(page)
+        if m is None:
+            return ""
+        return html.unescape(self.HTML_TAG_PATTERN.sub("", m.group(1))).strip()
+
+    def write(self, text: str, out_dir: str) -> list:
+        r"""
+        Render a document into pages, and write them and `manifest.json` to `out_dir`.
+
+        Returns:
+            The paths of the written pages.
+        """
+
+        pages, manifest = self.paginate(text)
+        paths = []
+        for page_info, page in zip(manifest["pages"], pages):
+            path = os.path.join(out_dir, page_info["file"])
+            utils.atomic_write(path, page)
+            paths.append(path)
+        # written last, so it never lists pages that aren't there yet
+        utils.atomic_write(
+            os.path.join(out_dir, "manifest.json"), json.dumps(manifest, ensure_ascii=False, separators=(",", ":"))
+        )
+        return paths
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m markdown_environments.paginate", description=__doc__.split("\n")[1]
+    )
+    parser.add_argument("--config", required=True, help="JSON file containing extension configs")
+    parser.add_argument("--out-dir", required=True, help="directory to write pages and manifest to")
+    parser.add_argument(
+        "--split-env", action="append", default=[], help="environment type to start a new page at (repeatable)"
+    )
+    parser.add_argument("--split-heading-level", type=int, help="start a new page at headings up to this level")
+    parser.add_argument("--page-file-name", default="page-{}.html", help="page file name, with {} for page number")
+    parser.add_argument("path", help="Markdown file to paginate")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as file:
+        extension_configs = json.load(file)
+    with open(args.path, "r", encoding="utf-8") as file:
+        text = file.read()
+    paginator = Paginator(
+        extension_configs, split_env_types=args.split_env, split_heading_level=args.split_heading_level,
+        page_file_name=args.page_file_name
+    )
+    for path in paginator.write(text, args.out_dir):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+r"""
+Parallel rendering of large documents.
+
+The document is split into chunks at top-level environment boundaries (see `Renderer.split_top_level()`), and the
+chunks are block-parsed in a process pool. The resulting subtrees are then stitched back together in order, and the
+rest of the pipeline (theorem counters, inline Markdown, theorem headings, theorem `\ref{}`s, etc.) runs once over the
+whole document in the calling process, so the output is byte-identical to `Renderer.convert()`.
+
+Important:
+    Block-level state is only carried back from the workers for Python-Markdown's own link references. Other
+    extensions that keep state during block parsing (e.g. `footnotes` or `abbr`) aren't supported in parallel mode.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .render import Renderer
+
+
+_worker_renderer = None
+
+
+def _init_worker(extension_configs: dict) -> None:
+    global _worker_renderer
+    _worker_renderer = Renderer(extension_configs)
+
+
+def _parse_chunk(blocks: list) -> tuple:
+    _worker_renderer.md.reset()
+    return _worker_renderer.parse_blocks(blocks)
+
+
+class ParallelRenderer:
+    """
+    A `Renderer` whose block parsing is spread over a pool of worker processes.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.parallel import ParallelRenderer
+
+            with ParallelRenderer(extension_configs, processes=8) as renderer:
+                html = renderer.convert(input_text)
+    """
+
+    def __init__(self, extension_configs: dict, processes: int | None = None, min_chunks: int = 64):
+        """
+        Args:
+            extension_configs: `Renderer` extension configs.
+            processes: Number of worker processes. Defaults to the number of CPUs.
+            min_chunks: Documents that split into fewer chunks than this are block-parsed in the calling process,
+                since the pool's overhead wouldn't pay off.
+        """
+
+        self.renderer = Renderer(extension_configs)
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+        self.min_chunks = min_chunks
+        self.extension_configs = extension_configs
+        # started on the first document big enough to need it, so renderers that never see one don't pay for it
+        self.executor = None
+
+    def convert(self, text: str) -> str:
+        md = self.renderer.md
+        md.reset()
+        if not text.strip():
+            return ""
+
+        blocks = self.renderer.preprocess(text)
+        ranges = self.renderer.split_top_level(blocks)
+        chunks = [blocks[start:end] for start, end in ranges]
+        if len(chunks) < self.min_chunks:
+            results = [self.renderer.parse_blocks(blocks)]
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    self.processes, initializer=_init_worker, initargs=(self.extension_configs,)
+                )
+            # a few batches per worker balances load without paying IPC costs per chunk
+            results = self.executor.map(_parse_chunk, chunks, chunksize=max(1, len(chunks) // (self.processes * 4)))
+
+        root = None
+        for chunk_root, references in results:
+            if root is None:
+                root = chunk_root
+            else:
+                root.extend(chunk_root)
+            md.references.update(references)
+        md.parser.root = root
+        return self.renderer.finish(root)
+
+    def get_thm_ref_map(self) -> dict:
+        return self.renderer.get_thm_ref_map()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,177 @@
+r"""
+Incremental live previews: apply small edits to a document and get back only the HTML fragments that changed.
+
+The document is split into top-level units at top-level environment boundaries (see `Renderer.split_top_level()`),
+and every unit is rendered on its own, with theorem counters carried over from the unit before it and theorem
+`\ref{}`s resolved across the whole document. Each unit is wrapped in its own element with a stable `id`, so an editor
+can patch its preview DOM in place instead of re-rendering and replacing the whole document on every keystroke.
+
+Important:
+    Like `Watcher`, units are rendered independently, so Python-Markdown link references and other block-level state
+    (e.g. from `footnotes` or `abbr`) don't carry over between units.
+"""
+
+import bisect
+import itertools
+
+from .render import DocumentPart, Renderer
+
+
+class PreviewSession:
+    r"""
+    Holds a document and every top-level unit's last render in memory, so that each edit only re-renders the units it
+    touched (plus units whose theorem numbers or `\ref{}` targets it changed).
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.preview import PreviewSession
+
+            session = PreviewSession(extension_configs)
+            update = session.set_text(input_text)
+            update = session.edit(start, end, "replacement text")
+            for id, html in update["fragments"].items():
+                ...  # replace the element with this `id` (or insert it at its place in `update["order"]`)
+            for id in update["removed"]:
+                ...  # remove the element with this `id`
+    """
+
+    def __init__(self, extension_configs: dict, id_prefix: str = "md-preview-", html_tag: str = "div"):
+        """
+        Args:
+            extension_configs: `Renderer` extension configs.
+            id_prefix: Prefix of each unit's element `id`.
+            html_tag: Tag of the element each unit is wrapped in.
+        """
+
+        self.renderer = Renderer(extension_configs, resolve_refs=False)
+        self.id_prefix = id_prefix
+        self.html_tag = html_tag
+        self.text = ""
+        self.ids = []
+        self.parts = []
+        # offset of each unit in `text`
+        self.unit_starts = []
+        self.thm_ref_map = {}
+        self.id_counter = itertools.count()
+
+    def split(self, text: str) -> list:
+        # split the raw text (rather than preprocessed blocks) so each unit can be rendered as a document of its own
+        blocks = text.replace("\r\n", "\n").replace("\r", "\n").split("\n\n")
+        return ["\n\n".join(blocks[start:end]) for start, end in self.renderer.split_top_level(blocks)]
+
+    def set_text(self, text: str) -> dict:
+        """
+        Replace the whole document.
+
+        Returns:
+            The update, as described in `edit()`.
+        """
+
+        self.text = text
+        return self.replace_units(0, len(self.parts), self.split(text), 0)
+
+    def edit(self, start: int, end: int, replacement: str) -> dict:
+        r"""
+        Replace `self.text[start:end]` with `replacement`.
+
+        Only the text from the unit before the one containing `start` through the first unit boundary after `end` that
+        still holds is split again.
+
+        Returns:
+            The update, as a dict with keys:
+
+            - `"fragments"`: Maps the `id` of every new or changed unit to its new HTML (including its wrapper
+              element).
+            - `"removed"`: The `id`\ s of units that no longer exist.
+            - `"order"`: The `id`\ s of all units, in document order.
+        """
+
+        if not 0 <= start <= end <= len(self.text):
+            raise IndexError(f"edit range [{start}, {end}) out of bounds for text of length {len(self.text)}")
+        text = self.text[:start] + replacement + self.text[end:]
+        # unit offsets only line up with the text if its newlines didn't need normalizing
+        if "\r" in self.text or "\r" in replacement or len(self.parts) == 0:
+            return self.set_text(text)
+        self.text = text
+        delta = len(replacement) - (end - start)
+
+        # the unit before the edited one too, since a run of blocks only ends where the environment after it begins
+        first = max(bisect.bisect_right(self.unit_starts, start) - 2, 0)
+        # the first unit whose text, and the blank line before it, the edit didn't touch
+        stop = bisect.bisect_left(self.unit_starts, end + 2, lo=first + 1)
+        window_start = self.unit_starts[first]
+        step = 1
+        while True:
+            if stop >= len(self.parts):
+                unit_texts = self.split(text[window_start:])
+                break
+            window = text[window_start:self.unit_starts[stop] + delta - 2]
+            blocks = window.split("\n\n")
+            # the old boundary still holds if the blank line before it is still where splitting into blocks finds one
+            # (i.e. isn't part of a longer run of newlines), and if it does with the next unit's first block after it,
+            # i.e. if nothing before it (e.g. an environment that's no longer closed) reaches past it
+            next_block = self.parts[stop].text.split("\n\n", 1)[0]
+            ranges = [] if window.endswith("\n") else self.renderer.split_top_level(blocks + [next_block])
+            if any(range_end == len(blocks) for _, range_end in ranges):
+                unit_texts = [
+                    "\n\n".join(blocks[range_start:range_end]) for range_start, range_end in ranges
+                    if range_end <= len(blocks)
+                ]
+                break
+            stop += step
+            step *= 2
+        return self.replace_units(first, min(stop, len(self.parts)), unit_texts, delta)
+
+    def replace_units(self, first: int, stop: int, unit_texts: list, delta: int) -> dict:
+        # units before and after the edited region are unchanged and keep their ids; everything in between is new
+        old_texts = [part.text for part in self.parts[first:stop]]
+        prefix_len = 0
+        max_prefix_len = min(len(old_texts), len(unit_texts))
+        while prefix_len < max_prefix_len and old_texts[prefix_len] == unit_texts[prefix_len]:
+            prefix_len += 1
+        suffix_len = 0
+        max_suffix_len = max_prefix_len - prefix_len
+        while suffix_len < max_suffix_len and old_texts[-1 - suffix_len] == unit_texts[-1 - suffix_len]:
+            suffix_len += 1
+
+        old_start = first + prefix_len
+        old_end = stop - suffix_len
+        new_end = old_start + len(unit_texts) - prefix_len - suffix_len
+        removed = self.ids[old_start:old_end]
+        new_ids = [f"{self.id_prefix}{next(self.id_counter)}" for _ in range(old_start, new_end)]
+        new_parts = [DocumentPart(text=unit_text) for unit_text in unit_texts[prefix_len:len(unit_texts) - suffix_len]]
+        self.ids[old_start:old_end] = new_ids
+        self.parts[old_start:old_end] = new_parts
+
+        # units are joined by blank lines, so their offsets follow from their lengths
+        unit_start = self.unit_starts[first] if first < len(self.unit_starts) else 0
+        new_unit_starts = []
+        for unit_text in unit_texts:
+            new_unit_starts.append(unit_start)
+            unit_start += len(unit_text) + 2
+        self.unit_starts[first:] = new_unit_starts + [
+            unit_start + delta for unit_start in self.unit_starts[stop:]
+        ]
+
+        changed, self.thm_ref_map = self.renderer.update_parts(self.parts, self.thm_ref_map)
+        # new units must always be sent, even if their HTML happens to match what a removed unit had
+        changed = set(changed) | set(range(old_start, new_end))
+        return {
+            "fragments": {self.ids[i]: self.render_unit(i) for i in sorted(changed)},
+            "removed": removed,
+            "order": list(self.ids)
+        }
+
+    def render_unit(self, i: int) -> str:
+        return f'<{self.html_tag} id="{self.ids[i]}">\n{self.parts[i].html}\n</{self.html_tag}>'
+
+    def get_html(self) -> str:
+        """
+        Return the whole preview as it currently stands.
+        """
+
+        return "\n".join(self.render_unit(i) for i in range(len(self.parts)))
+
+    def get_thm_ref_map(self) -> dict:
+        return dict(self.thm_ref_map)
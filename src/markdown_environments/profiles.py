@@ -0,0 +1,223 @@
+r"""
+Rendering one document under several profiles (e.g. site themes) that only differ in HTML `class` attributes and
+`id` prefixes.
+
+The document is rendered once with a placeholder token in place of every `html_class`-like config (`html_class`,
+`summary_html_class`, `caption_html_class`, etc., including types' `html_class`) and every `html_id_prefix`, so
+block parsing, environment matching, and theorem counters are all done once. Each profile's HTML is then made from
+that with a single substitution pass, and is byte-identical to rendering it on its own with `Renderer.convert()`.
+"""
+
+import copy
+import re
+import secrets
+
+from .render import Renderer
+from . import utils
+
+
+# characters that serializers would escape or that `compact` would treat as separators, which substituting values
+# into already-serialized HTML can't reproduce
+UNSUBSTITUTABLE_CHARS = set("&<>\"\t\n\r")
+
+
+def is_profile_key(key) -> bool:
+    r"""
+    Return whether a config key is one that profiles may set differently.
+    """
+
+    return isinstance(key, str) and (key.endswith("html_class") or key == "html_id_prefix")
+
+
+def split_profile_config(config, path: tuple = ()) -> tuple:
+    r"""
+    Split a config into a copy without its profile keys and a `dict` mapping the profile keys' paths to their values.
+    """
+
+    if not isinstance(config, dict):
+        return config, {}
+    rest = {}
+    values = {}
+    for key, value in config.items():
+        if is_profile_key(key):
+            values[path + (key,)] = value
+        else:
+            rest[key], sub_values = split_profile_config(value, path + (key,))
+            values.update(sub_values)
+    return rest, values
+
+
+def paired_class_paths(config, path: tuple = ()) -> set:
+    r"""
+    Return the paths of every `html_class` joined with a type's `html_class` (i.e. those of configs with `types`, and
+    of the types themselves), set or not.
+    """
+
+    if not isinstance(config, dict):
+        return set()
+    paths = set()
+    if isinstance(config.get("types"), dict):
+        paths.add(path + ("html_class",))
+        paths.update(path + ("types", type_name, "html_class") for type_name in config["types"])
+    for key, value in config.items():
+        paths.update(paired_class_paths(value, path + (key,)))
+    return paths
+
+
+class ProfileRenderer:
+    r"""
+    Render one document under several profiles of extension configs at once.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.profiles import ProfileRenderer
+
+            renderer = ProfileRenderer({
+                "light": {"ThmsExtension": {"div_config": {"types": types, "html_class": "light-thm"}}},
+                "dark": {"ThmsExtension": {"div_config": {"types": types, "html_class": "dark-thm"}}}
+            })
+            html_by_profile = renderer.convert(input_text)
+
+    Important:
+        - Profiles may only differ in `html_class`-like configs and `html_id_prefix`es, whose values can't contain
+          `&`, `<`, `>`, `"`, tabs, or newlines.
+        - `DropdownExtension`'s `deferred_content` can't be `"side_file"`, since side files are keyed by a hash of
+          their contents.
+    """
+
+    def __init__(self, profiles: dict, resolve_refs: bool = True):
+        r"""
+        Args:
+            profiles: Maps profile names to `Renderer` extension configs.
+            resolve_refs: Same as `Renderer`'s.
+
+        Raises:
+            ValueError: If there are no profiles, or they differ in anything besides `html_class`-like configs and
+                `html_id_prefix`es.
+        """
+
+        if len(profiles) == 0:
+            raise ValueError("there must be at least one profile")
+        self.profiles = copy.deepcopy(profiles)
+        self.resolve_refs = resolve_refs
+
+        base_config = None
+        profile_values = {}
+        for name, extension_configs in self.profiles.items():
+            config, profile_values[name] = split_profile_config(extension_configs)
+            if base_config is None:
+                base_config = config
+            elif config != base_config:
+                raise ValueError(
+                    f"profile `{name}` differs from the others in more than `html_class`-like configs and "
+                    "`html_id_prefix`es"
+                )
+            for path, value in profile_values[name].items():
+                if not isinstance(value, str) or not UNSUBSTITUTABLE_CHARS.isdisjoint(value):
+                    raise ValueError(f"profile `{name}`'s `{'.'.join(map(str, path))}` can't be substituted: {value!r}")
+        dropdown_configs = [
+            base_config.get("DropdownExtension", {}), base_config.get("ThmsExtension", {}).get("dropdown_config", {})
+        ]
+        if any(config.get("deferred_content") == "side_file" for config in dropdown_configs):
+            raise ValueError("profiles can't defer dropdown content to a side file")
+
+        # every value the profile keys take is `""` where a profile leaves them out, like their defaults. Joined
+        # `class`es always get tokens, since an empty half would otherwise leave no trace of where it was joined
+        paths = {path for values in profile_values.values() for path in values} | paired_class_paths(base_config)
+        paths = sorted(paths, key=str)
+        self.nonce = "mdprofile" + secrets.token_hex(6)
+        template_config = copy.deepcopy(base_config)
+        self.class_values = {name: [] for name in self.profiles}
+        self.id_prefixes = {name: [] for name in self.profiles}
+        first_profile = next(iter(self.profiles))
+        for path in paths:
+            if path[-1] == "html_id_prefix":
+                values_by_profile = self.id_prefixes
+                token = f"{self.nonce}i{len(values_by_profile[first_profile])}z"
+            else:
+                values_by_profile = self.class_values
+                # the trailing space survives only where `compact` didn't normalize the `class` attribute, which is
+                # how substitution tells which of the two to reproduce
+                token = f"{self.nonce}c{len(values_by_profile[first_profile])}z "
+            for name, values in values_by_profile.items():
+                values.append(profile_values[name].get(path, ""))
+            parent = template_config
+            for key in path[:-1]:
+                parent = parent[key]
+            parent[path[-1]] = token
+
+        self.renderer = Renderer(template_config, resolve_refs=resolve_refs)
+        self.pattern = re.compile(rf' class="([^"]*{self.nonce}[^"]*)"|{self.nonce}i([0-9]+)z')
+        self.class_token_pattern = re.compile(rf"{self.nonce}c([0-9]+)z")
+        # rendering each profile on its own, for documents that happen to contain the tokens' prefix
+        self.fallback_renderers = {}
+        self.fallback = False
+
+    def convert(self, text: str, thm_counter: list | None = None) -> dict:
+        r"""
+        Render a document under every profile.
+
+        Args:
+            text: The document.
+            thm_counter: Same as `Renderer.convert()`'s.
+
+        Returns:
+            The HTML for each profile, keyed by profile name.
+        """
+
+        self.fallback = self.nonce in text
+        if self.fallback:
+            html_by_profile = {}
+            for name in self.profiles:
+                if name not in self.fallback_renderers:
+                    self.fallback_renderers[name] = Renderer(self.profiles[name], resolve_refs=self.resolve_refs)
+                html_by_profile[name] = self.fallback_renderers[name].convert(text, thm_counter=thm_counter)
+            return html_by_profile
+
+        html = self.renderer.convert(text, thm_counter=thm_counter)
+        return {name: self.apply_profile(html, name) for name in self.profiles}
+
+    def apply_profile(self, html: str, profile: str) -> str:
+        r"""
+        Substitute a profile's values for the tokens in HTML rendered by `self.renderer`.
+        """
+
+        class_values = self.class_values[profile]
+        id_prefixes = self.id_prefixes[profile]
+
+        def repl(m: re.Match) -> str:
+            if m.group(2) is not None:
+                return id_prefixes[int(m.group(2))]
+            value = m.group(1)
+            html_classes = []
+            for token in value.split():
+                token_m = self.class_token_pattern.fullmatch(token)
+                html_classes.append(class_values[int(token_m.group(1))] if token_m is not None else token)
+            # see `DivProcessor`, etc. for when they add `class` attributes
+            if value.endswith(" "):
+                if all(html_class == "" for html_class in html_classes):
+                    return ""
+                return f' class="{" ".join(html_classes)}"'
+            html_class = utils.join_html_classes(*html_classes)
+            return f' class="{html_class}"' if html_class != "" else ""
+
+        return self.pattern.sub(repl, html)
+
+    def get_thm_ref_map(self, profile: str) -> dict:
+        r"""
+        Return the `\ref{}` targets found by the last `convert()`, as rendered under a profile.
+        """
+
+        if self.fallback:
+            return self.fallback_renderers[profile].get_thm_ref_map()
+        return {name: self.apply_profile(text, profile) for name, text in self.renderer.get_thm_ref_map().items()}
+
+    def get_thm_id_map(self, profile: str) -> dict:
+        r"""
+        Return the HTML `id`\ s of `\ref{}` targets found by the last `convert()`, as rendered under a profile.
+        """
+
+        if self.fallback:
+            return self.fallback_renderers[profile].get_thm_id_map()
+        return {name: self.apply_profile(html_id, profile) for name, html_id in self.renderer.get_thm_id_map().items()}
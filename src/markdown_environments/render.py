@@ -0,0 +1,659 @@
+import copy
+import re
+import xml.etree.ElementTree as etree
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from typing import TextIO
+
+import markdown
+
+import markdown_environments
+from .captioned_figure import CaptionedFigureProcessor
+from .cited_blockquote import CitedBlockquoteProcessor
+from .dropdown import DropdownProcessor
+from .thms import ThmRefProcessor, ThmsExtension, increment_thm_counter
+from . import utils
+
+
+# stands in for the i-th theorem counter's text in `DocumentPart.thm_ref_templates`
+THM_COUNTER_MARKER = "\x02md-thm-counter:{}\x03"
+THM_COUNTER_MARKER_PATTERN = re.compile(r"\x02md-thm-counter:([0-9]+)\x03")
+
+
+@dataclass
+class DocumentPart:
+    r"""
+    One independently rendered part of a larger document (e.g. one file of a book, or one top-level block of a
+    document being previewed), along with everything needed to decide whether it has to be rendered again.
+    """
+
+    text: str = ""
+    # set whenever `text` changes, and cleared by `Renderer.update_parts()`
+    changed: bool = True
+    thm_counter_in: list | None = None
+    thm_counter_out: list = field(default_factory=list)
+    thm_ref_map: dict = field(default_factory=dict)
+    # with CSS numbering, each theorem counter's increments and `thm_ref_map` with its counters' text left out, so the
+    # part can be renumbered without rendering it again
+    thm_counter_increments: list = field(default_factory=list)
+    thm_ref_templates: dict = field(default_factory=dict)
+    ref_names: set = field(default_factory=set)
+    unresolved_html: str = ""
+    html: str | None = None
+
+
+class Renderer:
+    r"""
+    A reusable `markdown.Markdown` object built once from a set of extension configs.
+
+    Building the extensions (and compiling every type's regex patterns) happens only in `__init__()`, and every call to
+    `convert()` resets the underlying `markdown.Markdown` object (including theorem counters and `\ref{}` targets)
+    before rendering, so one `Renderer` can render any number of independent documents.
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.render import Renderer
+
+            renderer = Renderer({
+                "ThmsExtension": {
+                    "div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,0,1"}}}
+                },
+                "toc": {}
+            })
+            html = renderer.convert(input_text)
+            thm_ref_map = renderer.get_thm_ref_map()
+
+    Important:
+        `markdown.Markdown` objects are not thread-safe, so a `Renderer` must not be used by multiple threads at once.
+    """
+
+    def __init__(self, extension_configs: dict, resolve_refs: bool = True):
+        r"""
+        Build a renderer.
+
+        Args:
+            extension_configs: Maps extension names to their configs. Names of this package's extensions (e.g.
+                `"ThmsExtension"`) are constructed with their config as keyword arguments; any other name (e.g.
+                `"toc"`) is passed on to Python-Markdown as a regular extension name with its config. The configs are
+                copied, so the caller's dicts are never mutated.
+            resolve_refs: Whether to resolve theorem `\ref{}`s during `convert()`. Pass `False` when rendering a
+                document in pieces, and then resolve them later with `resolve_refs()` once every piece's
+                `\ref{}` targets are known.
+        """
+
+        self.extension_configs = copy.deepcopy(extension_configs)
+        self.defer_refs = not resolve_refs
+        extensions = []
+        markdown_extension_configs = {}
+        for name, config in copy.deepcopy(extension_configs).items():
+            if name in markdown_environments.__all__:
+                extensions.append(getattr(markdown_environments, name)(**config))
+            else:
+                extensions.append(name)
+                markdown_extension_configs[name] = config
+        self.md = markdown.Markdown(extensions=extensions, extension_configs=markdown_extension_configs)
+
+        self.thms_extension = None
+        for extension in self.md.registeredExtensions:
+            if isinstance(extension, ThmsExtension):
+                self.thms_extension = extension
+        if not resolve_refs and "thm_ref" in self.md.postprocessors:
+            self.md.postprocessors.deregister("thm_ref")
+
+    def convert(self, text: str, thm_counter: list | None = None) -> str:
+        r"""
+        Render a document.
+
+        Args:
+            text: Markdown source.
+            thm_counter: Theorem counter segments to start from instead of all zeros, e.g. the result of
+                `get_thm_counter()` after rendering the previous chapter of a book.
+        """
+
+        self.md.reset()
+        if thm_counter is not None and self.thms_extension is not None:
+            self.thms_extension.thm_counter_processor.counter = list(thm_counter)
+        return self.md.convert(text)
+
+    def convert_stream(
+        self, text: str, thm_counter: list | None = None, batch_blocks: int = 64, max_pending_blocks: int | None = None
+    ) -> Iterator[str]:
+        r"""
+        Render a document piece by piece, yielding each top-level chunk's HTML as soon as it's finished.
+
+        The document is split with `split_top_level()`, and each chunk is block-parsed, run through the treeprocessors
+        and postprocessors, and serialized on its own, with theorem counters carrying over from chunk to chunk. Joining
+        the yielded strings gives the same HTML as `convert()` (for extensions that don't need to see the whole
+        element tree at once, e.g. not `toc`), but only one chunk's element tree and HTML are held at a time.
+
+        A chunk that `\ref{}`s a theorem defined further down can't be finished yet, so it (and every chunk after it,
+        to keep the output in order) is held back until the theorem's `\ref{}` target is known. `\ref{}`s that never
+        resolve (e.g. MathJax's) are left as-is at the end, just like in `convert()`, so a document with one holds back
+        everything after it unless `max_pending_blocks` is set. A chunk's `\ref{}`s are resolved as soon as their
+        targets are known, though, so `\ref{}`s to a name that more than one theorem uses (which the linter reports)
+        may resolve to an earlier theorem than in `convert()`. Likewise, Markdown reference links only resolve to
+        definitions in the same or an earlier chunk, so a link used before its definition (in another chunk) is left
+        as-is, and one whose label is defined more than once may link to an earlier definition than in `convert()`.
+
+        Args:
+            text: Markdown source.
+            thm_counter: Theorem counter segments to start from instead of all zeros.
+            batch_blocks: Consecutive chunks are rendered together until they add up to at least this many blocks,
+                since every chunk has some fixed overhead. Larger values use more memory.
+            max_pending_blocks: The most blocks to hold back for unresolved `\ref{}`s. Beyond that, the oldest chunks
+                are yielded with the `\ref{}`s that aren't known yet left as-is, unlike in `convert()`. Defaults to
+                no limit.
+        """
+
+        self.md.reset()
+        if thm_counter is not None and self.thms_extension is not None:
+            self.thms_extension.thm_counter_processor.counter = list(thm_counter)
+        if not text.strip():
+            return
+
+        # the processors' own `\ref{}` targets, which are only merged (see `get_thm_ref_map()`) when a chunk needs
+        # them, rather than after every batch
+        known_ref_maps = [] if self.thms_extension is None else [
+            self.thms_extension.thm_counter_processor.get_thm_ref_map(),
+            self.thms_extension.thm_heading_processor.get_thm_ref_map()
+        ]
+        thm_ref_map = {}
+        is_first = True
+        separator = "\n"
+
+        def flush(chunk: tuple) -> str:
+            nonlocal thm_ref_map, is_first, separator
+            html, ref_names, _, next_separator = chunk
+            if any(
+                name not in thm_ref_map and any(name in known_ref_map for known_ref_map in known_ref_maps)
+                for name in ref_names
+            ):
+                thm_ref_map = self.get_thm_ref_map()
+            if ref_names:
+                html = ThmRefProcessor.resolve_refs(html, thm_ref_map)
+            html = html if is_first else separator + html
+            is_first = False
+            separator = next_separator
+            return html
+
+        blocks = self.preprocess(text)
+        # chunks held back by unresolved forward `\ref{}`s, as `(html, ref names, block count, separator after)`
+        pending = deque()
+        pending_blocks = 0
+        batches = []
+        for start, end in self.split_top_level(blocks):
+            if batches and batches[-1][1] - batches[-1][0] < batch_blocks:
+                batches[-1] = (batches[-1][0], end)
+            else:
+                batches.append((start, end))
+        for start, end in batches:
+            root, references = self.parse_blocks(blocks[start:end])
+            self.md.references.update(references)
+            blocks[start:end] = [""] * (end - start) # drop the source of finished chunks
+            html = self.finish(root, resolve_refs=False)
+            if html == "":
+                continue
+            # the whitespace `finish()` stripped from the end, which separates this chunk from the next one: a newline
+            # after block-level elements, but nothing after inline ones (e.g. a cited blockquote's `<cite>`)
+            tail = root[-1].tail or "" if len(root) > 0 else ""
+            ref_names = set() if self.defer_refs else {m.group(1) for m in ThmRefProcessor.PATTERN.finditer(html)}
+            pending.append((html, ref_names, end - start, tail[len(tail.rstrip()):]))
+            pending_blocks += end - start
+            while pending and all(
+                any(name in known_ref_map for known_ref_map in known_ref_maps) for name in pending[0][1]
+            ):
+                pending_blocks -= pending[0][2]
+                yield flush(pending.popleft())
+            while max_pending_blocks is not None and pending_blocks > max_pending_blocks:
+                pending_blocks -= pending[0][2]
+                yield flush(pending.popleft())
+
+        while pending:
+            yield flush(pending.popleft())
+
+    def convert_to_file(
+        self, text: str, file: TextIO, thm_counter: list | None = None, batch_blocks: int = 64,
+        max_pending_blocks: int | None = None
+    ) -> None:
+        """
+        Render a document straight into a writable text file object, using `convert_stream()`.
+        """
+
+        for html in self.convert_stream(
+            text, thm_counter=thm_counter, batch_blocks=batch_blocks, max_pending_blocks=max_pending_blocks
+        ):
+            file.write(html)
+
+    def convert_tree(self, text: str, thm_counter: list | None = None) -> etree.Element:
+        r"""
+        Render a document into its final element tree instead of HTML, so callers that transform the output don't have
+        to parse the HTML back.
+
+        Theorem headings and `\ref{}`s are resolved directly on the tree, and Python-Markdown's raw HTML placeholders
+        are replaced by parsed elements. Serializing the children of the returned root element (e.g. with
+        `xml.etree.ElementTree.tostring()`) gives the same document as `convert()`, up to HTML escaping and attribute
+        quoting.
+
+        Args:
+            text: Markdown source.
+            thm_counter: Theorem counter segments to start from instead of all zeros.
+
+        Returns:
+            A root element (with the `markdown.Markdown` object's `doc_tag`) holding the whole document.
+
+        Raises:
+            ValueError: If an extension registered a postprocessor that can only run on serialized HTML.
+        """
+
+        from markdown.postprocessors import AndSubstitutePostprocessor, RawHtmlPostprocessor
+
+        from . import tree
+
+        self.md.reset()
+        if thm_counter is not None and self.thms_extension is not None:
+            self.thms_extension.thm_counter_processor.counter = list(thm_counter)
+        if not text.strip():
+            return etree.Element(self.md.doc_tag)
+
+        root, references = self.parse_blocks(self.preprocess(text))
+        self.md.references.update(references)
+        root = self.run_treeprocessors(root)
+        placeholder_postprocessors = []
+        for postprocessor in self.md.postprocessors:
+            if isinstance(postprocessor, (RawHtmlPostprocessor, AndSubstitutePostprocessor)):
+                placeholder_postprocessors.append(postprocessor)
+            elif hasattr(postprocessor, "run_tree"):
+                # later stages must see restored raw HTML, just like in `convert()`
+                if placeholder_postprocessors:
+                    tree.resolve_placeholders(self.md, root, placeholder_postprocessors)
+                    placeholder_postprocessors = []
+                postprocessor.run_tree(root)
+            else:
+                raise ValueError(f"{postprocessor.__class__.__name__} can't be run on an element tree")
+        if placeholder_postprocessors:
+            tree.resolve_placeholders(self.md, root, placeholder_postprocessors)
+        return root
+
+    def get_thm_counter(self) -> list:
+        """
+        Return the theorem counter segments as they were at the end of the last `convert()`.
+        """
+
+        if self.thms_extension is None:
+            return []
+        return list(self.thms_extension.thm_counter_processor.counter)
+
+    def get_thm_ref_map(self, fallback_texts: list | None = None) -> dict:
+        r"""
+        Return the `\ref{}` targets (names/hidden names mapped to their text) found by the last `convert()`.
+
+        Args:
+            fallback_texts: With CSS numbering, the text to use for each theorem counter of the last `convert()`, in
+                order, instead of its digits.
+        """
+
+        from markdown.postprocessors import AndSubstitutePostprocessor, RawHtmlPostprocessor
+
+        thm_ref_map = {}
+        if self.thms_extension is not None:
+            thm_ref_map.update(self.thms_extension.thm_counter_processor.get_thm_ref_map())
+            thm_ref_map.update(self.thms_extension.thm_heading_processor.get_thm_ref_map())
+            thm_ref_map = self.thms_extension.thm_counter_processor.resolve_fallbacks(thm_ref_map, fallback_texts)
+        # theorem headings can hold Python-Markdown's placeholders for raw HTML (e.g. theorem counters' `<span>`s),
+        # which `convert()` only restores after resolving `\ref{}`s, so restore them here for anything resolving
+        # `\ref{}`s later
+        for postprocessor in self.md.postprocessors:
+            if isinstance(postprocessor, (RawHtmlPostprocessor, AndSubstitutePostprocessor)):
+                thm_ref_map = {name: postprocessor.run(text) for name, text in thm_ref_map.items()}
+        return thm_ref_map
+
+    def get_thm_id_map(self) -> dict:
+        r"""
+        Return the HTML `id`\ s of the elements that `\ref{}` targets found by the last `convert()` point to, for those
+        that have one (named theorems, and hidden names of theorem counters with `add_html_elem`).
+        """
+
+        thm_id_map = {}
+        if self.thms_extension is not None:
+            thm_id_map.update(self.thms_extension.thm_counter_processor.get_thm_id_map())
+            thm_id_map.update(self.thms_extension.thm_heading_processor.get_thm_id_map())
+        return thm_id_map
+
+    def get_image_paths(self) -> list:
+        r"""
+        Return the local image files that captioned figures' image options (see `CaptionedFigureExtension`) read
+        during the last `convert()`.
+        """
+
+        if "captioned_figure_images" not in self.md.treeprocessors:
+            return []
+        return list(self.md.treeprocessors["captioned_figure_images"].image_paths)
+
+    def get_deferred_content(self) -> dict:
+        r"""
+        Return the dropdown contents deferred to a side file by the last conversion (see `DropdownExtension`'s
+        `deferred_content` config), keyed by the `data-md-deferred` attribute of their `<template>`.
+        """
+
+        if "deferred_content" not in self.md.postprocessors:
+            return {}
+        return dict(self.md.postprocessors["deferred_content"].get_deferred_content())
+
+    @staticmethod
+    def resolve_refs(text: str, thm_ref_map: dict) -> str:
+        r"""
+        Resolve theorem `\ref{}`s in HTML rendered with `resolve_refs=False`.
+        """
+
+        return ThmRefProcessor.resolve_refs(text, thm_ref_map)
+
+    def update_parts(self, parts: list, thm_ref_map: dict, shared_numbering: bool = True) -> tuple[list, dict]:
+        r"""
+        Incrementally re-render a document made of consecutive `DocumentPart`s.
+
+        Only parts that changed, or whose starting theorem counter moved, are rendered again. Other parts only have
+        their `\ref{}`s resolved again (without re-rendering), and only if a `\ref{}` target they use changed.
+        With CSS numbering (see `ThmsExtension`), parts whose starting theorem counter moved aren't rendered again
+        either, since their HTML doesn't depend on it; only their `\ref{}` targets are renumbered. Requires
+        `resolve_refs=False`.
+
+        Args:
+            parts: The document's parts, in order.
+            thm_ref_map: The whole document's `\ref{}` targets as returned by the previous call (`{}` for the first).
+            shared_numbering: Whether theorem counters carry over from each part into the next.
+
+        Returns:
+            The indices of parts whose `html` changed, and the whole document's new `\ref{}` targets.
+        """
+
+        css_numbering = (
+            self.thms_extension is not None and self.thms_extension.thm_counter_processor.numbering == "css"
+        )
+        thm_counter = []
+        rendered = set()
+        for i, part in enumerate(parts):
+            thm_counter_in = thm_counter if shared_numbering else []
+            if part.changed or (thm_counter_in != part.thm_counter_in and not css_numbering):
+                part.unresolved_html = self.convert(part.text, thm_counter=thm_counter_in)
+                part.thm_counter_in = list(thm_counter_in)
+                part.thm_counter_out = self.get_thm_counter()
+                part.thm_ref_map = self.get_thm_ref_map()
+                if css_numbering:
+                    part.thm_counter_increments = list(self.thms_extension.thm_counter_processor.increments)
+                    part.thm_ref_templates = self.get_thm_ref_map(
+                        [THM_COUNTER_MARKER.format(j) for j in range(len(part.thm_counter_increments))]
+                    )
+                part.ref_names = {m.group(1) for m in ThmRefProcessor.PATTERN.finditer(part.unresolved_html)}
+                part.changed = False
+                rendered.add(i)
+            elif thm_counter_in != part.thm_counter_in:
+                # replay the part's theorem counters from its new starting counter
+                part.thm_counter_in = list(thm_counter_in)
+                part.thm_counter_out = list(thm_counter_in)
+                fallback_texts = [
+                    increment_thm_counter(part.thm_counter_out, increments)
+                    for increments in part.thm_counter_increments
+                ]
+                part.thm_ref_map = {
+                    name: THM_COUNTER_MARKER_PATTERN.sub(lambda m: fallback_texts[int(m.group(1))], text)
+                    for name, text in part.thm_ref_templates.items()
+                }
+            thm_counter = part.thm_counter_out
+
+        new_thm_ref_map = {}
+        for part in parts:
+            new_thm_ref_map.update(part.thm_ref_map)
+        changed_ref_names = {
+            name for name in new_thm_ref_map.keys() | thm_ref_map.keys()
+            if new_thm_ref_map.get(name) != thm_ref_map.get(name)
+        }
+
+        changed = []
+        for i, part in enumerate(parts):
+            if i not in rendered and part.ref_names.isdisjoint(changed_ref_names):
+                continue
+            html = ThmRefProcessor.resolve_refs(part.unresolved_html, new_thm_ref_map)
+            if html != part.html:
+                part.html = html
+                changed.append(i)
+        return changed, new_thm_ref_map
+
+    def preprocess(self, text: str) -> list:
+        """
+        Run the preprocessors on a document, returning its top-level blocks exactly as the block parser would split
+        them.
+        """
+
+        lines = text.split("\n")
+        for preprocessor in self.md.preprocessors:
+            lines = preprocessor.run(lines)
+        return "\n".join(lines).split("\n\n")
+
+    def get_env_patterns(self) -> list:
+        r"""
+        Return every environment the block parser knows, as `(type, start pattern, end pattern, minimum number of
+        blocks read)` tuples, in the order the block parser tries them. `type` is the environment's type key, or `None`
+        for environments without types (e.g. captioned figures).
+        """
+
+        env_patterns = []
+        for processor in self.md.parser.blockprocessors:
+            # dropdowns always look at the block after their `\begin{}` block for a summary, even if they end there
+            min_blocks = 2 if isinstance(processor, DropdownProcessor) else 1
+            if hasattr(processor, "start_pattern_choices"):
+                for typ in processor.start_pattern_choices:
+                    env_patterns.append(
+                        (typ, processor.start_pattern_choices[typ], processor.end_pattern_choices[typ], min_blocks)
+                    )
+            elif hasattr(processor, "START_PATTERN") and hasattr(processor, "END_PATTERN"):
+                env_patterns.append((None, processor.START_PATTERN, processor.END_PATTERN, min_blocks))
+        return env_patterns
+
+    def split_top_level(self, blocks: list) -> list:
+        r"""
+        Split a document's top-level blocks into independent chunks at top-level environment boundaries.
+
+        Every chunk is either a single top-level environment (from its `\begin{}` block through its `\end{}` block) or
+        the run of blocks between two such environments, so each chunk can be block-parsed on its own with the same
+        result as when parsing the whole document. An environment with no `\end{}` makes the rest of the document one
+        chunk, since environments inside it will search the rest of the document for their `\end{}`s.
+
+        Returns:
+            A list of `(start, end)` slice indices into `blocks`, in order.
+        """
+
+        env_patterns = self.get_env_patterns()
+        # environments holding a sub-environment (a caption or citation), which is searched for before their
+        # `\end{}` and so can reach past it
+        sub_env_patterns = {}
+        for processor in self.md.parser.blockprocessors:
+            if isinstance(processor, CaptionedFigureProcessor):
+                sub_env_patterns[processor.START_PATTERN] = (
+                    processor.CAPTION_START_PATTERN, processor.CAPTION_END_PATTERN
+                )
+            elif isinstance(processor, CitedBlockquoteProcessor):
+                sub_env_patterns[processor.START_PATTERN] = (
+                    processor.CITATION_START_PATTERN, processor.CITATION_END_PATTERN
+                )
+
+        def find_first(pattern_test, start: int, start_block: str) -> int | None:
+            for j in range(start, len(blocks)):
+                if pattern_test(start_block if j == start else blocks[j]):
+                    return j
+            return None
+
+        def find_sub_env_end(i: int, block: str, start_pattern, end_pattern) -> int:
+            # same searches as `CaptionedFigureProcessor.run()` and `CitedBlockquoteProcessor.run()`
+            sub_start_pattern, sub_end_pattern = sub_env_patterns[start_pattern]
+            first_block = start_pattern.sub("", block)
+            sub_start_i = find_first(sub_start_pattern.match, i, first_block)
+            if sub_start_i is None:
+                return -1
+            sub_end_i = find_first(
+                sub_end_pattern.search, sub_start_i,
+                sub_start_pattern.sub("", first_block if sub_start_i == i else blocks[sub_start_i])
+            )
+            if sub_end_i is None:
+                return -1
+            end_i = find_first(end_pattern.search, i, first_block)
+            if end_i is not None and end_i < sub_start_i:
+                # the sub-environment comes after the environment's `\end{}`, so the blocks between them are left
+                # behind for whatever comes next, which can then reach further than it looks
+                return -1
+            end_i = find_first(end_pattern.search, sub_end_i + 1, blocks[sub_end_i + 1]) \
+                if sub_end_i + 1 < len(blocks) else None
+            return end_i if end_i is not None else -1
+
+        def find_env_end(i: int) -> int | None:
+            # `None` if `blocks[i]` doesn't start an environment, and `-1` if the environment is never closed
+            # a leading newline is stripped by Python-Markdown's `EmptyBlockProcessor` before the block is tested again
+            block = blocks[i][1:] if blocks[i].startswith("\n") else blocks[i]
+            for _, start_pattern, end_pattern, min_blocks in env_patterns:
+                if start_pattern.match(block):
+                    if start_pattern in sub_env_patterns:
+                        return find_sub_env_end(i, block, start_pattern, end_pattern)
+                    end_i = find_first(end_pattern.search, i, block)
+                    return min(max(end_i, i + min_blocks - 1), len(blocks) - 1) if end_i is not None else -1
+            # block processors that split lines off the start of a block (e.g. headings) can leave an environment
+            # starting in the middle of one, so make sure the chunk covers any environment that might
+            env_end = None
+            for _, start_pattern, end_pattern, min_blocks in env_patterns:
+                start_match = start_pattern.search(block)
+                if start_match is None:
+                    continue
+                end_i = find_first(end_pattern.search, i, block[start_match.end():])
+                if start_pattern in sub_env_patterns or end_i is None:
+                    return -1
+                env_end = max(env_end or 0, min(max(end_i, i + min_blocks - 1), len(blocks) - 1))
+            return env_end
+
+        ranges = []
+        chunk_start = 0
+        i = 0
+        while i < len(blocks):
+            env_end = find_env_end(i)
+            if env_end is None:
+                i += 1
+                continue
+            # widen the chunk until no (possibly malformed) environment inside it reaches past its end
+            k = i + 1
+            while env_end != -1 and k <= env_end:
+                inner_env_end = find_env_end(k)
+                if inner_env_end is not None and (inner_env_end == -1 or inner_env_end > env_end):
+                    env_end = inner_env_end
+                k += 1
+            if env_end == -1:
+                break
+            # `EmptyBlockProcessor` also looks at the previous sibling when stripping a leading newline, so don't
+            # separate such a block from whatever comes before it
+            if chunk_start < i and not blocks[i].startswith("\n"):
+                ranges.append((chunk_start, i))
+                chunk_start = i
+            ranges.append((chunk_start, env_end + 1))
+            chunk_start = i = env_end + 1
+        if chunk_start < len(blocks):
+            ranges.append((chunk_start, len(blocks)))
+        return ranges
+
+    def parse_blocks(self, blocks: list) -> tuple[etree.Element, dict]:
+        """
+        Block-parse some top-level blocks into a new root element, without resetting any state.
+
+        Returns:
+            The root element, and the link references defined in the blocks.
+        """
+
+        root = etree.Element(self.md.doc_tag)
+        references = dict(self.md.references)
+        self.md.references.clear()
+        self.md.parser.root = root
+        self.md.parser.parseChunk(root, "\n\n".join(blocks))
+        new_references = dict(self.md.references)
+        self.md.references.clear()
+        self.md.references.update(references)
+        return root, new_references
+
+    def run_treeprocessors(self, root: etree.Element) -> etree.Element:
+        for treeprocessor in self.md.treeprocessors:
+            new_root = treeprocessor.run(root)
+            if new_root is not None:
+                root = new_root
+        return root
+
+    def finish(self, root: etree.Element, resolve_refs: bool = True) -> str:
+        r"""
+        Run the treeprocessors, serializer, and postprocessors on a block-parsed document, exactly like the rest of
+        `markdown.Markdown.convert()`.
+
+        Args:
+            root: Block-parsed document.
+            resolve_refs: Whether to resolve theorem `\ref{}`s (if this `Renderer` resolves them at all).
+        """
+
+        root = self.run_treeprocessors(root)
+        output = self.md.serializer(root)
+        if self.md.stripTopLevelTags:
+            try:
+                start = output.index(f"<{self.md.doc_tag}>") + len(self.md.doc_tag) + 2
+                end = output.rindex(f"</{self.md.doc_tag}>")
+                output = output[start:end].strip()
+            except ValueError:
+                if output.strip().endswith(f"<{self.md.doc_tag} />"):
+                    output = ""
+                else:
+                    raise
+        thm_ref_processor = self.md.postprocessors["thm_ref"] if "thm_ref" in self.md.postprocessors else None
+        for postprocessor in self.md.postprocessors:
+            if postprocessor is thm_ref_processor and not resolve_refs:
+                continue
+            output = postprocessor.run(output)
+        return output.strip()
+
+
+class RendererRegistry:
+    """
+    A cache of ready-to-use `Renderer`s keyed by a fingerprint of their extension configs, for services that render
+    with many different configs (e.g. one per tenant).
+
+    Usage:
+        .. code-block:: py
+
+            from markdown_environments.render import RendererRegistry
+
+            registry = RendererRegistry(max_size=256)
+            html = registry.get(tenant_extension_configs).convert(input_text)
+
+    Important:
+        The same `Renderer` is returned for equal configs, and `Renderer`s aren't thread-safe, so multi-threaded callers
+        should keep one registry per thread.
+    """
+
+    def __init__(self, max_size: int = 128):
+        """
+        Args:
+            max_size: Number of `Renderer`s to keep before evicting the least recently used one.
+        """
+
+        self.renderers = utils.LRUCache(max_size)
+
+    def get(self, extension_configs: dict, resolve_refs: bool = True) -> Renderer:
+        """
+        Return the `Renderer` for these `Renderer` arguments, building it only if it isn't cached already.
+        """
+
+        key = (utils.fingerprint_config(extension_configs), resolve_refs)
+        renderer = self.renderers.get(key)
+        if renderer is None:
+            renderer = Renderer(extension_configs, resolve_refs=resolve_refs)
+            self.renderers.put(key, renderer)
+        return renderer
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.renderers),
+            "hits": self.renderers.hits,
+            "misses": self.renderers.misses,
+            "evictions": self.renderers.evictions
+        }
@@ -1,14 +1,16 @@
 import re
 import xml.etree.ElementTree as etree
 
-from bs4 import BeautifulSoup
 from markdown.extensions import Extension
 from markdown.postprocessors import Postprocessor
 from markdown.treeprocessors import Treeprocessor
+from markdown.util import HTML_PLACEHOLDER_RE
 
 from . import utils
 
 
+NUMBERING_MODES = ("server", "css")
+
 # the only reason this is a `Treeprocessor` and not a `Preprocessor`, `InlineProcessor`, or `Postprocessor`, all of
 # which make more sense, is because we need this to run after `thms` (`BlockProcessor`) and before the TOC extension
 # (`Treeprocessor` with low priority): `thms` generates `counter` syntax, while TOC will duplicate unparsed
@@ -17,13 +19,32 @@ class ThmCounterProcessor(Treeprocessor):
 
     PATTERN = re.compile(r"{{([0-9,]+)}}(?:{(.+?)})?", flags=re.MULTILINE)
 
-    def __init__(self, *args, add_html_elem: bool, html_id_prefix: str, html_class: str, **kwargs):
+    def __init__(
+        self, *args, add_html_elem: bool, html_id_prefix: str, html_class: str, numbering: str = "server",
+        css_counter_name: str = "thm-counter", **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.add_html_elem = add_html_elem
         self.html_id_prefix = html_id_prefix
         self.html_class = html_class
+        self.numbering = numbering
+        self.css_counter_name = css_counter_name
         self.counter = []
         self.thm_ref_map = {}
+        self.thm_id_map = {}
+        # with CSS numbering, each counter's increments and the text it would have had with server numbering, in
+        # order, and the raw HTML placeholders standing in for them in `thm_ref_map`
+        self.increments = []
+        self.fallback_texts = []
+        self.fallback_placeholders = {}
+
+    def reset(self):
+        self.counter = []
+        self.thm_ref_map = {}
+        self.thm_id_map = {}
+        self.increments = []
+        self.fallback_texts = []
+        self.fallback_placeholders = {}
 
     def run(self, root):
         for child in root.iter():
@@ -36,33 +57,34 @@ class ThmCounterProcessor(Treeprocessor):
                 input_counter = m.group(1)
                 hidden_name = m.group(2)
 
-                parsed_counter = input_counter.split(",")
-                # make sure we have enough room to parse counter into `self.counter`
-                while len(parsed_counter) > len(self.counter):
-                    self.counter.append(0)
-
-                # parse counter
-                for i, parsed_item in enumerate(parsed_counter):
-                    try:
-                        parsed_item = int(parsed_item)
-                    except:
-                        return False
-                    self.counter[i] += parsed_item
-                    # if changing current counter segment, reset all child segments back to 0
-                    if parsed_item != 0 and len(parsed_counter) >= i + 1:
-                        self.counter[i+1:] = [0] * (len(self.counter) - (i+1))
-
-                # only output as many counter segments as were inputted
-                output_counter = list(map(str, self.counter[:len(parsed_counter)]))
-                output_counter_text = ".".join(output_counter)
+                try:
+                    parsed_counter = [int(parsed_item) for parsed_item in input_counter.split(",")]
+                except ValueError:
+                    return False
+                output_counter_text = increment_thm_counter(self.counter, parsed_counter)
+                output_counter = output_counter_text.split(".")
+                if self.numbering == "css":
+                    # digits would depend on everything before this counter, so leave them to the stylesheet (see
+                    # `css_counter_stylesheet()`), stashed whole so the element stays empty through inline parsing
+                    elem = etree.Element("span")
+                    if self.html_class != "":
+                        elem.set("class", self.html_class)
+                    elem.set("data-thm-counter", ",".join(map(str, parsed_counter)))
+                    placeholder = self.md.htmlStash.store(etree.tostring(elem, encoding="unicode", method="html"))
+                    self.fallback_placeholders[placeholder] = len(self.fallback_texts)
+                    self.fallback_texts.append(output_counter_text)
+                    self.increments.append(parsed_counter)
+                    output_counter_text = placeholder
                 if hidden_name is not None:
                     # since backslashes are escaped in final HTML and in thm heading's `Postprocessor`, but not yet
                     # in `Treeprocessor` (otherwise, `\ref{}` on thm counters will require double the backslashes)
                     hidden_name = hidden_name.replace("\\\\", "\\")
                     self.thm_ref_map[hidden_name] = output_counter_text
-                if self.add_html_elem:
+                if self.add_html_elem and self.numbering != "css":
                     elem = etree.Element("span")
                     elem.set("id", self.html_id_prefix + '-'.join(output_counter))
+                    if hidden_name is not None:
+                        self.thm_id_map[hidden_name] = elem.get("id")
                     if self.html_class != "":
                         elem.set("class", self.html_class)
                     elem.text = output_counter_text
@@ -77,6 +99,103 @@ class ThmCounterProcessor(Treeprocessor):
     def get_thm_ref_map(self):
         return self.thm_ref_map
 
+    def get_thm_id_map(self):
+        return self.thm_id_map
+
+    def resolve_fallbacks(self, thm_ref_map: dict, fallback_texts: list | None = None) -> dict:
+        r"""
+        Replace the placeholders that CSS numbering leaves for counters in `\ref{}` targets with fallback text, since
+        CSS counters don't carry over into text referencing them.
+
+        Args:
+            thm_ref_map: `\ref{}` targets, e.g. from `get_thm_ref_map()`.
+            fallback_texts: Text for each counter of the last conversion, in order. Defaults to their digits as
+                server numbering would have output them.
+
+        Returns:
+            `thm_ref_map` itself if there's nothing to replace, otherwise a new `dict`.
+        """
+
+        if not self.fallback_placeholders:
+            return thm_ref_map
+        if fallback_texts is None:
+            fallback_texts = self.fallback_texts
+
+        def repl(m: re.Match) -> str:
+            i = self.fallback_placeholders.get(m.group(0))
+            return m.group(0) if i is None else fallback_texts[i]
+
+        return {name: HTML_PLACEHOLDER_RE.sub(repl, text) for name, text in thm_ref_map.items()}
+
+
+def increment_thm_counter(counter: list, increments: list) -> str:
+    r"""
+    Increment theorem counter segments in place the way `{{<counter>}}` does, and return the counter's text.
+    """
+
+    # make sure we have enough room to parse counter into `counter`
+    while len(increments) > len(counter):
+        counter.append(0)
+    for i, increment in enumerate(increments):
+        counter[i] += increment
+        # if changing current counter segment, reset all child segments back to 0
+        if increment != 0:
+            counter[i+1:] = [0] * (len(counter) - (i+1))
+    # only output as many counter segments as were inputted
+    return ".".join(map(str, counter[:len(increments)]))
+
+
+def css_counter_stylesheet(
+    patterns, counter_name: str = "thm-counter", scope: str = ":root", thm_counter: list | None = None
+) -> str:
+    r"""
+    Return the CSS that numbers theorem counters rendered with `thm_counter_config`'s `numbering` set to `"css"`.
+
+    Each counter segment is its own CSS counter (`<counter_name>-0`, `<counter_name>-1`, ...), and each distinct
+    `{{<counter>}}` becomes one rule setting those segments like `{{<counter>}}` does and displaying as many of them as
+    it has.
+
+    Args:
+        patterns: Every `<counter>` (e.g. `"0,0,1"`) that can appear in the documents the stylesheet is for.
+        counter_name: Prefix of the CSS counters' names.
+        scope: CSS selector of the element whose descendants are numbered together (e.g. one book chapter).
+        thm_counter: Theorem counter segments to start from instead of all zeros, like `Renderer.convert()`'s.
+
+    Returns:
+        The stylesheet.
+    """
+
+    parsed_patterns = sorted({tuple(int(parsed_item) for parsed_item in pattern.split(",")) for pattern in patterns})
+    thm_counter = list(thm_counter) if thm_counter is not None else []
+    depth = max([len(thm_counter)] + [len(increments) for increments in parsed_patterns])
+    if depth == 0:
+        return ""
+    thm_counter += [0] * (depth - len(thm_counter))
+
+    def segment(i: int) -> str:
+        return f"{counter_name}-{i}"
+
+    rules = [
+        f"{scope} {{ counter-reset: "
+        + " ".join(f"{segment(i)} {thm_counter[i]}" for i in range(depth)) + "; }"
+    ]
+    for increments in parsed_patterns:
+        selector = '[data-thm-counter="' + ",".join(map(str, increments)) + '"]'
+        first_changed = next((i for i, increment in enumerate(increments) if increment != 0), None)
+        if first_changed is not None:
+            # the first segment changed is incremented, and every segment after it is reset and then incremented
+            # (i.e. set), so the two never touch the same counter and the order browsers apply them in doesn't matter
+            declarations = f"counter-increment: {segment(first_changed)} {increments[first_changed]};"
+            if first_changed + 1 < depth:
+                declarations += " counter-set: " + " ".join(
+                    f"{segment(i)} {increments[i] if i < len(increments) else 0}"
+                    for i in range(first_changed + 1, depth)
+                ) + ";"
+            rules.append(f"{selector} {{ {declarations} }}")
+        content = ' "." '.join(f"counter({segment(i)})" for i in range(len(increments)))
+        rules.append(f"{selector}::before {{ content: {content}; }}")
+    return "\n".join(rules) + "\n"
+
 
 # `Postprocessor` instead of `Treeprocessor` to avoid placeholders for Markdown syntax in thm heading
 class ThmHeadingProcessor(Postprocessor):
@@ -85,23 +204,38 @@ class ThmHeadingProcessor(Postprocessor):
     FORMAT_FOR_HTML_HYPHEN_PATTERN = re.compile(r"[ \./\u2013\u2014]", flags=re.MULTILINE)
     FORMAT_FOR_HTML_REMOVE_PATTERN = re.compile(r"[^A-Za-z0-9-]", flags=re.MULTILINE)
 
-    def __init__(self, *args, html_id_prefix: str, html_class: str, emph_html_class: str, **kwargs):
+    def __init__(
+        self, *args, html_id_prefix: str, html_class: str, emph_html_class: str, compact: bool = False, **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.html_id_prefix = html_id_prefix
         self.html_class = html_class
         self.emph_html_class = emph_html_class
+        self.compact = compact
         self.thm_ref_map = {}
+        self.thm_id_map = {}
 
-    def run(self, text):
-        def format_for_html(s: str) -> str:
+    def reset(self):
+        self.thm_ref_map = {}
+        self.thm_id_map = {}
+
+    def format_for_html(self, s: str) -> str:
+        # only pay for BeautifulSoup if there could be HTML tags or entities to remove
+        if "<" in s or "&" in s:
+            # imported here since it's slow to import and most documents never need it
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(s, "html.parser") # remove any HTML tags
             s = soup.get_text()
-            s = s.lower()
-            s = self.FORMAT_FOR_HTML_HYPHEN_PATTERN.sub("-", s[:-1]) + s[-1] # don't have trailing hyphens since ugly
-            s = self.FORMAT_FOR_HTML_REMOVE_PATTERN.sub("", s)
-            return s
+        s = s.lower()
+        s = self.FORMAT_FOR_HTML_HYPHEN_PATTERN.sub("-", s[:-1]) + s[-1] # don't have trailing hyphens since ugly
+        s = self.FORMAT_FOR_HTML_REMOVE_PATTERN.sub("", s)
+        return s
 
-        new_text = ""
+    def run(self, text):
+        format_for_html = self.format_for_html
+        # collect pieces in a list and join once at the end, since repeatedly appending to a string of the whole
+        # document is quadratic in the worst case
+        new_text = []
         prev_match_end = 0
         for m in self.PATTERN.finditer(text):
             thm_type = m.group(1)
@@ -123,27 +257,83 @@ class ThmHeadingProcessor(Postprocessor):
                 emph_elem.tail = f" ({thm_name})"
                 elem.set("id", self.html_id_prefix + format_for_html(thm_name))
                 self.thm_ref_map[thm_name] = thm_type
+                self.thm_id_map[thm_name] = elem.get("id")
             elif thm_hidden_name is not None:
                 elem.set("id", self.html_id_prefix + format_for_html(thm_hidden_name))
                 self.thm_ref_map[thm_hidden_name] = thm_type
+                self.thm_id_map[thm_hidden_name] = elem.get("id")
             # generate theorem punct HTML, applying `emph` styling to it as well (even if separated from
             # main `emph` section of thm type + counter by theorem name; this is default LaTeX behavior)
-            thm_punct_elem = etree.SubElement(elem, "span")
-            if self.emph_html_class != "":
-                thm_punct_elem.set("class", self.emph_html_class)
-            thm_punct_elem.text = thm_punct
+            if not self.compact:
+                thm_punct_elem = etree.SubElement(elem, "span")
+                if self.emph_html_class != "":
+                    thm_punct_elem.set("class", self.emph_html_class)
+                thm_punct_elem.text = thm_punct
+            # or in compact markup, saving an element, put it in the `emph` span unless the theorem name is in between
+            elif thm_name is not None:
+                emph_elem.tail += thm_punct
+            else:
+                emph_elem.text += thm_punct
 
             # convert all this to HTML and insert into final output, replacing the original match
             # unescape HTML that `tostring()` escapes to allow HTML and previously-rendered Markdown in thm heading
-            new_text += text[prev_match_end:m.start()] \
-                    + etree.tostring(elem, encoding="unicode").replace("&lt;", "<").replace("&gt;", ">")
+            new_text.append(text[prev_match_end:m.start()])
+            new_text.append(etree.tostring(elem, encoding="unicode").replace("&lt;", "<").replace("&gt;", ">"))
             prev_match_end = m.end()
-        new_text += text[prev_match_end:] # fill in remaining text after last regex match
-        return new_text
+        new_text.append(text[prev_match_end:]) # fill in remaining text after last regex match
+        return "".join(new_text)
+
+    def run_tree(self, root: etree.Element) -> None:
+        r"""
+        Same as `run()`, but on the element tree right before serialization, building theorem headings as elements.
+        """
+
+        from . import tree
+
+        # a heading's type and name may contain inline Markdown that's already been rendered into child elements
+        def repl(m: re.Match, flat_content) -> list:
+            thm_type = flat_content.slice(*m.span(1))
+            thm_name = flat_content.slice(*m.span(2)) if m.group(2) is not None else None
+            thm_hidden_name = m.group(3)
+
+            elem = etree.Element("span")
+            if self.html_class != "":
+                elem.set("class", self.html_class)
+            emph_elem = etree.Element("span")
+            if self.emph_html_class != "":
+                emph_elem.set("class", self.emph_html_class)
+            tree.set_content(emph_elem, thm_type + ["."] if self.compact and thm_name is None else thm_type)
+            elem_content = [emph_elem]
+            # ids and `\ref{}` targets are computed from the same HTML that `run()` would see
+            if thm_name is not None:
+                thm_name_html = tree.serialize_content(self.md, thm_name)
+                elem_content += [" ("] + thm_name + [")"]
+                elem.set("id", self.html_id_prefix + self.format_for_html(thm_name_html))
+                self.thm_ref_map[thm_name_html] = tree.serialize_content(self.md, thm_type)
+                self.thm_id_map[thm_name_html] = elem.get("id")
+            elif thm_hidden_name is not None:
+                elem.set("id", self.html_id_prefix + self.format_for_html(thm_hidden_name))
+                self.thm_ref_map[thm_hidden_name] = tree.serialize_content(self.md, thm_type)
+                self.thm_id_map[thm_hidden_name] = elem.get("id")
+            if not self.compact:
+                thm_punct_elem = etree.Element("span")
+                if self.emph_html_class != "":
+                    thm_punct_elem.set("class", self.emph_html_class)
+                thm_punct_elem.text = "."
+                elem_content.append(thm_punct_elem)
+            elif thm_name is not None:
+                elem_content.append(".")
+            tree.set_content(elem, elem_content)
+            return [elem]
+
+        tree.sub_content(root, self.PATTERN, repl, "{[")
 
     def get_thm_ref_map(self):
         return self.thm_ref_map
 
+    def get_thm_id_map(self):
+        return self.thm_id_map
+
 
 # `Postprocessor` to make sure it runs after both thm counter and thm heading processors
 class ThmRefProcessor(Postprocessor):
@@ -160,10 +350,15 @@ class ThmRefProcessor(Postprocessor):
     def run(self, text):
         thm_ref_map = self.thm_counter_processor.get_thm_ref_map()
         thm_ref_map.update(self.thm_heading_processor.get_thm_ref_map())
+        thm_ref_map = self.thm_counter_processor.resolve_fallbacks(thm_ref_map)
+        return self.resolve_refs(text, thm_ref_map)
 
-        new_text = ""
+    @classmethod
+    def resolve_refs(cls, text: str, thm_ref_map: dict) -> str:
+        # separate from `run()` so that callers rendering a document in pieces can resolve `\ref{}`s once at the end
+        new_text = []
         prev_match_end = 0
-        for m in self.PATTERN.finditer(text):
+        for m in cls.PATTERN.finditer(text):
             ref_name = m.group(1)
             text_to_add = ""
             if ref_name in thm_ref_map:
@@ -171,10 +366,34 @@ class ThmRefProcessor(Postprocessor):
             else:
                 text_to_add = m.group(0)
             # convert all this to HTML and insert into final output, replacing the original match
-            new_text += text[prev_match_end:m.start()] + text_to_add
+            new_text.append(text[prev_match_end:m.start()])
+            new_text.append(text_to_add)
             prev_match_end = m.end()
-        new_text += text[prev_match_end:] # fill in remaining text after last regex match
-        return new_text
+        new_text.append(text[prev_match_end:]) # fill in remaining text after last regex match
+        return "".join(new_text)
+
+    def run_tree(self, root: etree.Element) -> None:
+        r"""
+        Same as `run()`, but on the element tree right before serialization.
+        """
+
+        thm_ref_map = self.thm_counter_processor.get_thm_ref_map()
+        thm_ref_map.update(self.thm_heading_processor.get_thm_ref_map())
+        thm_ref_map = self.thm_counter_processor.resolve_fallbacks(thm_ref_map)
+        self.resolve_refs_tree(root, thm_ref_map, self.md)
+
+    @classmethod
+    def resolve_refs_tree(cls, root: etree.Element, thm_ref_map: dict, md) -> None:
+        from . import tree
+
+        def repl(m: re.Match, flat_content) -> list:
+            # `\ref{}` targets are keyed by their names as they appear in serialized HTML
+            ref_name = tree.serialize_content(md, flat_content.slice(*m.span(1)))
+            if ref_name in thm_ref_map:
+                return tree.parse_html_fragment(thm_ref_map[ref_name])
+            return flat_content.slice(*m.span())
+
+        tree.sub_content(root, cls.PATTERN, repl, "\\ref{")
 
 
 class ThmsExtension(Extension):
@@ -211,6 +430,18 @@ class ThmsExtension(Extension):
                   [thm name]<span class="[thm_heading_config's emph_html_class]">.</span>
                 </span>
 
+            or, with `thm_heading_config`'s `compact` set, which has the same `id` without the punct's own
+            element (so style the punct through the heading's `class`):
+
+            .. code-block:: html
+
+                <span id="[thm name/hidden thm name]" class="[thm_heading_config's html_class]">
+                  <span class="[thm_heading_config's emph_html_class]">[thm type][thm counter]</span>
+                  [thm name].
+                </span>
+
+            where the punct goes inside the `emph` span instead if there's no theorem name.
+
     Note:
         `<optional hidden thm name>` is only used for the HTML `id` or `\ref{}` (see below)
         without being displayed on the page. It is ignored if `<optional thm name>` is provided.
@@ -255,6 +486,23 @@ class ThmsExtension(Extension):
     Note:
         `<optional hidden name>` is only used for `\ref{}` (see below).
 
+    CSS numbering:
+        With `thm_counter_config`'s `numbering` set to `"css"`, theorem counters are numbered by the browser instead,
+        so their HTML no longer depends on what comes before them (and e.g. cached fragments stay valid when a theorem
+        is inserted earlier in the document). Each counter becomes:
+
+        .. code-block:: html
+
+            <span class="[thm_counter_config's html_class]" data-thm-counter="[counter]"></span>
+
+        (without an `id`, since it would depend on the counter's position), to be styled with the stylesheet from
+        `get_css_counter_stylesheet()` or `css_counter_stylesheet()`. `\ref{}`s still resolve to the counter's digits
+        as server numbering would have output them.
+
+        Important:
+            Browsers don't count elements that aren't rendered, so counters inside dropdown contents deferred with
+            `deferred_content` are only counted once opened.
+
     Theorem `\ref{}`s:
         Much like `label{}` and then `\ref{}` in LaTeX, this lets you reference:
 
@@ -421,6 +669,14 @@ class ThmsExtension(Extension):
                 - **types** (*dict*) -- Types of div-based theorem environments to define. Defaults to `{}`.
                 - **html_class** (*str*) -- HTML `class` attribute to add to div-based theorem environments.
                   Defaults to `""`.
+                - **literal_types** (*bool*) -- Whether to match the keys of `types` literally instead of as regex.
+                  Defaults to `False`.
+                - **fragment_cache** (*FragmentCache*) -- Cache of already-parsed div-based theorem environments to
+                  reuse across conversions (see `markdown_environments.cache.FragmentCache`). Defaults to `None`.
+                - **codegen_dir** (*str*) -- Directory to keep a processor generated specifically for this config in
+                  (see `DivExtension`). Defaults to `""`.
+                - **compact** (*bool*) -- Whether to normalize HTML `class` attributes (see `DivExtension`).
+                  Defaults to `False`.
 
             - **dropdown_config** (*dict*) -- configs for dropdowns. Possible config keys are:
 
@@ -431,6 +687,16 @@ class ThmsExtension(Extension):
                   Defaults to `""`.
                 - **content_html_class** (*str*) -- HTML `class` attribute to add to dropdown contents.
                   Defaults to `""`.
+                - **deferred_content** (*str*) -- Where to put dropdown contents so browsers don't have to load them
+                  until opened: `""`, `"template"`, or `"side_file"` (see `DropdownExtension`). Defaults to `""`.
+                - **literal_types** (*bool*) -- Whether to match the keys of `types` literally instead of as regex.
+                  Defaults to `False`.
+                - **fragment_cache** (*FragmentCache*) -- Cache of already-parsed dropdown-based theorem environments
+                  to reuse across conversions (see `markdown_environments.cache.FragmentCache`). Defaults to `None`.
+                - **codegen_dir** (*str*) -- Directory to keep a processor generated specifically for this config in
+                  (see `DropdownExtension`). Defaults to `""`.
+                - **compact** (*bool*) -- Whether to normalize HTML `class` attributes (see `DropdownExtension`).
+                  Defaults to `False`.
 
             - **thm_counter_config** (*dict*) -- configs for theorem counter. Possible config keys are:
 
@@ -439,7 +705,11 @@ class ThmsExtension(Extension):
                 - **html_id_prefix** (*str*) -- Text to prepend to HTML `id` attribute of theorem counters if
                   `add_html_elem` is `True`; usually useful for linking. Defaults to `""`.
                 - **html_class** (*str*) -- HTML `class` attribute to add to theorem counters if `add_html_elem` is
-                  `True`. Defaults to `""`.
+                  `True` or `numbering` is `"css"`. Defaults to `""`.
+                - **numbering** (*str*) -- Who numbers theorem counters: `"server"` or `"css"` (see "Theorem counters"
+                  above). Defaults to `"server"`.
+                - **css_counter_name** (*str*) -- Prefix of the CSS counters' names if `numbering` is `"css"`.
+                  Defaults to `"thm-counter"`.
 
             - **thm_heading_config** (*dict*) -- configs for theorem headings. Possible config keys are:
 
@@ -448,10 +718,13 @@ class ThmsExtension(Extension):
                 - **html_class** (*str*) -- HTML `class` attribute to add to theorem headings. Defaults to `""`.
                 - **emph_html_class** (*str*) -- HTML `class` attribute to add to theorem types in theorem headings.
                   Defaults to `""`.
+                - **compact** (*bool*) -- Whether to output theorem headings with one fewer element (see "Theorem
+                  headings" above). Defaults to `False`.
 
-        The key for each type defined in both `div_config`'s and `dropdown_config`'s `types` is inserted directly into
-        the regex patterns that search for `\\begin{<type>}` and `\\end{<type>}`, so anything you specify will be
-        interpreted as regex. However, if the key is an empty string, its regex will never be matched against, so it
+        Unless `literal_types` is set, the key for each type defined in both `div_config`'s and `dropdown_config`'s
+        `types` is inserted directly into the regex patterns that search for `\\begin{<type>}` and `\\end{<type>}`, so
+        anything you specify will be interpreted as regex (and keys that risk catastrophic backtracking raise a
+        `ValueError`). However, if the key is an empty string, its regex will never be matched against, so it
         is effectively useless. In addition, each type's value in `types` is itself a dictionary with the following
         possible options:
 
@@ -489,22 +762,40 @@ class ThmsExtension(Extension):
         div_config = self.getConfig("div_config")
         div_config.setdefault("types", {})
         div_config.setdefault("html_class", "")
+        div_config.setdefault("literal_types", False)
+        div_config.setdefault("fragment_cache", None)
+        div_config.setdefault("codegen_dir", "")
+        div_config.setdefault("compact", False)
 
         dropdown_config = self.getConfig("dropdown_config")
         dropdown_config.setdefault("types", {})
         dropdown_config.setdefault("html_class", "")
         dropdown_config.setdefault("summary_html_class", "")
         dropdown_config.setdefault("content_html_class", "")
+        dropdown_config.setdefault("deferred_content", "")
+        dropdown_config.setdefault("literal_types", False)
+        dropdown_config.setdefault("fragment_cache", None)
+        dropdown_config.setdefault("codegen_dir", "")
+        dropdown_config.setdefault("compact", False)
+        # imported here like the processors themselves in `extendMarkdown()`
+        from .dropdown import DEFERRED_CONTENT_MODES
+        if dropdown_config.get("deferred_content") not in DEFERRED_CONTENT_MODES:
+            raise ValueError(f"`dropdown_config`'s `deferred_content` must be one of {DEFERRED_CONTENT_MODES}")
 
         thm_counter_config = self.getConfig("thm_counter_config")
         thm_counter_config.setdefault("add_html_elem", False)
         thm_counter_config.setdefault("html_id_prefix", "")
         thm_counter_config.setdefault("html_class", "")
+        thm_counter_config.setdefault("numbering", "server")
+        thm_counter_config.setdefault("css_counter_name", "thm-counter")
+        if thm_counter_config.get("numbering") not in NUMBERING_MODES:
+            raise ValueError(f"`thm_counter_config`'s `numbering` must be one of {NUMBERING_MODES}")
 
         thm_heading_config = self.getConfig("thm_heading_config")
         thm_heading_config.setdefault("html_id_prefix", "")
         thm_heading_config.setdefault("html_class", "")
         thm_heading_config.setdefault("emph_html_class", "")
+        thm_heading_config.setdefault("compact", False)
 
     def extendMarkdown(self, md):
         # registering resets state between uses of `markdown.Markdown` object for things like the `ThmCounter` extension
@@ -518,12 +809,13 @@ class ThmsExtension(Extension):
         thm_counter_processor = ThmCounterProcessor(
             md, add_html_elem=thm_counter_config.get("add_html_elem"),
             html_id_prefix=thm_counter_config.get("html_id_prefix"),
-            html_class=thm_counter_config.get("html_class")
+            html_class=thm_counter_config.get("html_class"), numbering=thm_counter_config.get("numbering"),
+            css_counter_name=thm_counter_config.get("css_counter_name")
         )
         thm_heading_processor = ThmHeadingProcessor(
             md, html_id_prefix=thm_heading_config.get("html_id_prefix"),
             html_class=thm_heading_config.get("html_class"),
-            emph_html_class=thm_heading_config.get("emph_html_class")
+            emph_html_class=thm_heading_config.get("emph_html_class"), compact=thm_heading_config.get("compact")
         )
         thm_ref_processor = ThmRefProcessor(
             md, thm_counter_processor=thm_counter_processor, thm_heading_processor=thm_heading_processor
@@ -532,27 +824,81 @@ class ThmsExtension(Extension):
         md.treeprocessors.register(thm_counter_processor, "thm_counter", 999)
         md.postprocessors.register(thm_heading_processor, "thm_heading", 105)
         md.postprocessors.register(thm_ref_processor, "thm_ref", 95)
+        # keep references to stateful processors so `reset()` can clear them between documents
+        self.thm_counter_processor = thm_counter_processor
+        self.thm_heading_processor = thm_heading_processor
 
         if len(div_config.get("types", {})) > 0:
             from .div import DivProcessor
+            processor_configs = {
+                "types": div_config.get("types"), "html_class": div_config.get("html_class"), "is_thm": True,
+                "literal_types": div_config.get("literal_types"), "compact": div_config.get("compact")
+            }
+            processor_class = DivProcessor
+            if div_config.get("codegen_dir") != "":
+                from .codegen import load_processor_class
+                processor_class = load_processor_class("div", processor_configs, div_config.get("codegen_dir"))
             md.parser.blockprocessors.register(
-                DivProcessor(
-                    md.parser, types=div_config.get("types"), html_class=div_config.get("html_class"), is_thm=True
-                ),
+                processor_class(md.parser, fragment_cache=div_config.get("fragment_cache"), **processor_configs),
                 "thms_div", 105
             )
         if len(dropdown_config.get("types", {})) > 0:
-            from .dropdown import DropdownProcessor
+            from .dropdown import DropdownProcessor, register_deferred_content
+            processor_configs = {
+                "types": dropdown_config.get("types"), "html_class": dropdown_config.get("html_class"),
+                "summary_html_class": dropdown_config.get("summary_html_class"),
+                "content_html_class": dropdown_config.get("content_html_class"),
+                "is_thm": True, "deferred_content": dropdown_config.get("deferred_content"),
+                "literal_types": dropdown_config.get("literal_types"), "compact": dropdown_config.get("compact")
+            }
+            processor_class = DropdownProcessor
+            if dropdown_config.get("codegen_dir") != "":
+                from .codegen import load_processor_class
+                processor_class = load_processor_class(
+                    "dropdown", processor_configs, dropdown_config.get("codegen_dir")
+                )
             md.parser.blockprocessors.register(
-                DropdownProcessor(
-                    md.parser, types=dropdown_config.get("types"), 
-                    html_class=dropdown_config.get("html_class"),
-                    summary_html_class=dropdown_config.get("summary_html_class"),
-                    content_html_class=dropdown_config.get("content_html_class"),
-                    is_thm=True
-                ),
+                processor_class(md.parser, fragment_cache=dropdown_config.get("fragment_cache"), **processor_configs),
                 "thms_dropdown", 999
             )
+            self.deferred_content_processor = register_deferred_content(md, dropdown_config.get("deferred_content"))
+
+    def reset(self):
+        # called by `markdown.Markdown.reset()`; without this, reusing a `markdown.Markdown` object would carry theorem
+        # counters and `\ref{}` targets over from the previous document
+        if hasattr(self, "thm_counter_processor"):
+            self.thm_counter_processor.reset()
+            self.thm_heading_processor.reset()
+        if getattr(self, "deferred_content_processor", None) is not None:
+            self.deferred_content_processor.reset()
+
+    def get_deferred_content(self) -> dict:
+        r"""
+        Return the dropdown contents deferred to a side file by the last conversion (see `DropdownExtension`).
+        """
+
+        if getattr(self, "deferred_content_processor", None) is None:
+            return {}
+        return dict(self.deferred_content_processor.get_deferred_content())
+
+    def get_css_counter_stylesheet(self, scope: str = ":root", thm_counter: list | None = None) -> str:
+        r"""
+        Return the stylesheet numbering theorem counters rendered with CSS numbering (see `css_counter_stylesheet()`),
+        covering every type's `thm_counter_incr` and every `{{<counter>}}` in the last conversion.
+        """
+
+        patterns = {
+            type_opts.get("thm_counter_incr", "")
+            for config_name in ("div_config", "dropdown_config")
+            for type_opts in self.getConfig(config_name).get("types").values()
+        }
+        patterns.discard("")
+        if hasattr(self, "thm_counter_processor"):
+            patterns.update(",".join(map(str, increments)) for increments in self.thm_counter_processor.increments)
+        return css_counter_stylesheet(
+            patterns, counter_name=self.getConfig("thm_counter_config").get("css_counter_name"), scope=scope,
+            thm_counter=thm_counter
+        )
 
 
 def makeExtension(**kwargs):
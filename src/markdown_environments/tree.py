@@ -0,0 +1,261 @@
+r"""
+Helpers for working on element trees in place of serialized HTML, used by `Renderer.convert_tree()`.
+
+An element's *content* is its text, children, and children's tails as one flat list of strings and elements, which is
+the natural unit for stages that used to run on serialized HTML (e.g. replacing a pattern that may sit anywhere in an
+element's text, or splicing parsed HTML into the middle of it).
+"""
+
+import bisect
+import re
+import xml.etree.ElementTree as etree
+from html.parser import HTMLParser
+
+from markdown import serializers, util
+
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+}
+
+
+class HTMLFragmentParser(HTMLParser):
+    r"""
+    Parses an HTML fragment into a list of strings and elements, closing any tags it leaves open.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = etree.Element("fragment")
+        self.stack = [self.root]
+
+    def append_text(self, data: str) -> None:
+        parent = self.stack[-1]
+        if len(parent) > 0:
+            parent[-1].tail = (parent[-1].tail or "") + data
+        else:
+            parent.text = (parent.text or "") + data
+
+    def handle_starttag(self, tag, attrs):
+        elem = etree.SubElement(self.stack[-1], tag, {k: v if v is not None else "" for k, v in attrs})
+        if tag not in VOID_TAGS:
+            self.stack.append(elem)
+
+    def handle_startendtag(self, tag, attrs):
+        etree.SubElement(self.stack[-1], tag, {k: v if v is not None else "" for k, v in attrs})
+
+    def handle_endtag(self, tag):
+        # stray end tags are ignored, and end tags of an outer element close any inner elements left open
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        self.append_text(data)
+
+    def handle_comment(self, data):
+        self.stack[-1].append(etree.Comment(data))
+
+    def handle_pi(self, data):
+        self.stack[-1].append(etree.ProcessingInstruction(data.rstrip("?")))
+
+
+def parse_html_fragment(html: str) -> list:
+    r"""
+    Parse an HTML fragment into content (see `get_content()`).
+    """
+
+    if "<" not in html and "&" not in html:
+        return [html] if html != "" else []
+    # most fragments are well-formed XML (Python-Markdown's own output is), which the C XML parser handles much faster
+    try:
+        parser = etree.XMLParser(target=etree.TreeBuilder(insert_comments=True, insert_pis=True))
+        parser.feed(f"<fragment>{html}</fragment>")
+        return get_content(parser.close())
+    except etree.ParseError:
+        pass
+    parser = HTMLFragmentParser()
+    parser.feed(html)
+    parser.close()
+    return get_content(parser.root)
+
+
+def get_content(elem: etree.Element) -> list:
+    r"""
+    Return an element's text, children, and children's tails as a flat list of (non-empty) strings and elements.
+    """
+
+    content = []
+    if elem.text:
+        content.append(elem.text)
+    for child in elem:
+        content.append(child)
+        if child.tail:
+            content.append(child.tail)
+    return content
+
+
+def set_content(elem: etree.Element, content: list) -> None:
+    r"""
+    Replace an element's text, children, and children's tails with `content` (as returned by `get_content()`).
+    """
+
+    texts = [] # pieces of the text (or tail) currently being built, joined once at the end
+    children = []
+    for node in content:
+        if isinstance(node, str):
+            texts.append(node)
+            continue
+        if children:
+            children[-1].tail = "".join(texts) or None
+        else:
+            elem.text = "".join(texts) or None
+        texts = []
+        children.append(node)
+    if children:
+        children[-1].tail = "".join(texts) or None
+    else:
+        elem.text = "".join(texts) or None
+    elem[:] = children
+
+
+def serialize_content(md, content: list) -> str:
+    r"""
+    Serialize content (see `get_content()`) exactly as it would appear in the output of `md`'s serializer.
+    """
+
+    if len(content) == 1 and isinstance(content[0], str):
+        return serializers._escape_cdata(content[0])
+    wrapper = etree.Element("fragment")
+    # `ElementTree` elements don't know their parents, so this leaves `content`'s elements where they were
+    set_content(wrapper, content)
+    return md.serializer(wrapper)[len("<fragment>"):-len("</fragment>")]
+
+
+class FlatContent:
+    r"""
+    Content (see `get_content()`) flattened into one string, with every element standing in as one character, so
+    patterns can match across the element boundaries they would have matched across in serialized HTML.
+    """
+
+    ELEM_CHAR = "\ufffc"
+
+    def __init__(self, content: list):
+        pieces = []
+        self.elem_positions = {}
+        flat_len = 0
+        for node in content:
+            if isinstance(node, str):
+                pieces.append(node)
+                flat_len += len(node)
+            else:
+                self.elem_positions[flat_len] = node
+                pieces.append(self.ELEM_CHAR)
+                flat_len += 1
+        self.text = "".join(pieces)
+        self.sorted_positions = sorted(self.elem_positions)
+
+    def slice(self, start: int, end: int) -> list:
+        r"""
+        Return the content between two indices of `text`.
+        """
+
+        sliced = []
+        prev_end = start
+        for pos in self.sorted_positions[bisect.bisect_left(self.sorted_positions, start):]:
+            if pos >= end:
+                break
+            sliced.append(self.text[prev_end:pos])
+            sliced.append(self.elem_positions[pos])
+            prev_end = pos + 1
+        sliced.append(self.text[prev_end:end])
+        return [node for node in sliced if not isinstance(node, str) or node != ""]
+
+
+def contains(elem: etree.Element, s: str, attrib: bool = False) -> bool:
+    r"""
+    Return whether an element's text or children's tails (or, if `attrib`, children's attribute values) contain `s`.
+    """
+
+    if elem.text and s in elem.text:
+        return True
+    for child in elem:
+        if child.tail and s in child.tail:
+            return True
+        if attrib:
+            for value in child.attrib.values():
+                if s in value:
+                    return True
+    return False
+
+
+def sub_content(root: etree.Element, pattern: re.Pattern, repl, trigger: str) -> None:
+    r"""
+    Replace every match of `pattern` in the content of every element under `root` with the content that
+    `repl(match, flat_content)` returns.
+
+    Args:
+        root: Element tree to modify in place.
+        pattern: Pattern to match against each element's `FlatContent`.
+        repl: Returns the content to replace a match with.
+        trigger: Substring every match starts with, so elements that can't match are skipped without flattening them.
+    """
+
+    # snapshot the tree first, so replacements aren't themselves searched for matches
+    for elem in list(root.iter()):
+        if not contains(elem, trigger):
+            continue
+        flat_content = FlatContent(get_content(elem))
+        new_content = []
+        prev_match_end = 0
+        for m in pattern.finditer(flat_content.text):
+            new_content += flat_content.slice(prev_match_end, m.start())
+            new_content += repl(m, flat_content)
+            prev_match_end = m.end()
+        if prev_match_end > 0:
+            new_content += flat_content.slice(prev_match_end, len(flat_content.text))
+            set_content(elem, new_content)
+
+
+def resolve_placeholders(md, root: etree.Element, postprocessors: list) -> None:
+    r"""
+    Restore the raw HTML (and ampersands) that Python-Markdown stashes behind placeholders until its postprocessors run.
+
+    Only the smallest elements containing placeholders are serialized, run through `postprocessors` (e.g. Python-
+    Markdown's `RawHtmlPostprocessor`), and parsed back, so the cost doesn't grow with the rest of the document.
+    """
+
+    wrapped_pattern = re.compile(util.HTML_PLACEHOLDER % r"[0-9]+")
+
+    def postprocess(html: str) -> list:
+        for postprocessor in postprocessors:
+            html = postprocessor.run(html)
+        return parse_html_fragment(html)
+
+    stack = [root]
+    while stack:
+        elem = stack.pop()
+        # placeholders all start with `STX`
+        if contains(elem, util.STX, attrib=True):
+            set_content(elem, postprocess(serialize_content(md, get_content(elem))))
+            continue
+
+        # a block of raw HTML is a `<p>` holding just its placeholder, which is replaced by the raw HTML outright
+        raw_html_blocks = set()
+        for child in elem:
+            if (
+                child.tag == "p" and child.text is not None and child.text.startswith(util.STX) and len(child) == 0
+                and not child.attrib and wrapped_pattern.fullmatch(child.text)
+            ):
+                raw_html_blocks.add(child)
+            else:
+                stack.append(child)
+        if raw_html_blocks:
+            new_content = []
+            for node in get_content(elem):
+                if node in raw_html_blocks:
+                    new_content += postprocess(f"<p>{node.text}</p>")
+                else:
+                    new_content.append(node)
+            set_content(elem, new_content)
@@ -1,5 +1,8 @@
+import os
 import re
+import threading
 import xml.etree.ElementTree as etree
+from collections import OrderedDict
 
 
 def init_extension_with_configs(obj, **kwargs) -> None:
@@ -9,7 +12,96 @@ def init_extension_with_configs(obj, **kwargs) -> None:
         raise KeyError(f"{e} (did you pass in an invalid config key to {obj.__class__.__name__}.__init__()?)")
 
 
-def init_env_types(types: dict, is_thm: bool) -> tuple[dict, dict, dict]:
+class LRUCache:
+    """
+    A thread-safe mapping that holds at most `max_size` items, evicting the least recently used one when full.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def join_html_classes(*html_classes: str) -> str:
+    # normalized HTML `class` attribute value: no empty classes, and no leading, trailing, or repeated spaces
+    return " ".join(" ".join(html_classes).split())
+
+
+def fingerprint_config(config) -> str:
+    # imported here to keep them out of the package's import time
+    import hashlib
+    import json
+
+    # key order doesn't matter to any config, so sort it away; anything that isn't JSON falls back to its `repr()`
+    serialized = json.dumps(config, sort_keys=True, default=repr, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+# compiled patterns per `(type, is_thm, literal_types)`, shared by every processor, since `re`'s own cache is small and
+# global
+ENV_TYPE_PATTERNS_CACHE = LRUCache(max_size=4096)
+
+
+def atomic_write(path: str, contents: str | None = None, copy_from: str | None = None) -> None:
+    r"""
+    Write `contents` (or a copy of the file at `copy_from`) to `path`, creating its directory if needed.
+
+    The file is written to a temporary file next to it and renamed into place, so concurrent readers (other processes,
+    scrapes, etc.) never see it partially written.
+    """
+
+    # imported here since most conversions never write anything
+    import shutil
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        if copy_from is not None:
+            os.close(fd)
+            shutil.copyfile(copy_from, tmp_path)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(contents)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def init_env_types(types: dict, is_thm: bool, literal_types: bool = False) -> tuple[dict, dict, dict]:
     start_pattern_choices = {}
     end_pattern_choices = {}
     for typ, opts in types.items():
@@ -19,14 +111,114 @@ def init_env_types(types: dict, is_thm: bool) -> tuple[dict, dict, dict]:
         opts.setdefault("thm_counter_incr", "")
         opts.setdefault("thm_name_overrides_thm_heading", False)
         # add type to regex pattern choices
-        if is_thm:
-            start_pattern_choices[typ] = re.compile(rf"^\\begin{{{typ}}}(?:\[(.+?)\])?(?:{{(.+?)}})?$", flags=re.MULTILINE)
-        else:
-            start_pattern_choices[typ] = re.compile(rf"^\\begin{{{typ}}}$", flags=re.MULTILINE)
-        end_pattern_choices[typ] = re.compile(rf"^\\end{{{typ}}}", flags=re.MULTILINE)
+        patterns = ENV_TYPE_PATTERNS_CACHE.get((typ, is_thm, literal_types))
+        if patterns is None:
+            if literal_types:
+                typ_pattern = re.escape(typ)
+            else:
+                # imported here since it's only needed on cache misses
+                from .limits import check_type_pattern
+                check_type_pattern(typ)
+                typ_pattern = typ
+            if is_thm:
+                start_pattern = re.compile(
+                    rf"^\\begin{{{typ_pattern}}}(?:\[(.+?)\])?(?:{{(.+?)}})?$", flags=re.MULTILINE
+                )
+            else:
+                start_pattern = re.compile(rf"^\\begin{{{typ_pattern}}}$", flags=re.MULTILINE)
+            patterns = (start_pattern, re.compile(rf"^\\end{{{typ_pattern}}}", flags=re.MULTILINE))
+            ENV_TYPE_PATTERNS_CACHE.put((typ, is_thm, literal_types), patterns)
+        start_pattern_choices[typ], end_pattern_choices[typ] = patterns
     return types, start_pattern_choices, end_pattern_choices
 
 
+class BlockSearch:
+    r"""
+    Finds the first block in a list of blocks that matches a pattern, remembering how many blocks at the end of the
+    last list searched don't match it.
+
+    Block processors mostly modify, insert, and remove blocks at the start of the list they're given, so blocks at the
+    end that didn't match keep not matching for as long as the list still ends with the same block. That way, every
+    unclosed `\\begin{}` in a document costs one search of the rest of it in total, instead of one search each.
+    Removing blocks from the middle of the list (e.g. a captioned figure's caption) would move earlier, unsearched
+    blocks into that end, so processors that do must call `forget()`.
+    """
+
+    def __init__(self, md=None):
+        r"""
+        Args:
+            md: The `markdown.Markdown` object whose block processors search with this, if any, so `forget()` reaches
+                all of them.
+        """
+
+        # per `(pattern, match)`: (list searched, its last block, number of blocks at its end that don't match)
+        self.unmatched = {}
+        # every `BlockSearch` of `md`'s block processors, which all search the same lists
+        if md is None:
+            self.shared = [self]
+        else:
+            if getattr(md, "block_searches", None) is None:
+                md.block_searches = []
+            self.shared = md.block_searches
+            self.shared.append(self)
+
+    def forget(self, blocks: list) -> None:
+        r"""
+        Forget what every `BlockSearch` sharing this one's `markdown.Markdown` object knows about `blocks`, after blocks
+        were removed from the middle of it.
+        """
+
+        for block_search in self.shared:
+            for key, entry in list(block_search.unmatched.items()):
+                if entry[0] is blocks:
+                    del block_search.unmatched[key]
+
+    def find(
+        self, blocks: list, pattern: re.Pattern, start: int = 0, start_block: str | None = None, match: bool = False,
+        work_budget=None
+    ) -> int | None:
+        r"""
+        Return the index of the first block from `start` on that `pattern` is found in, or `None` if there's none.
+
+        Args:
+            blocks: Blocks to search.
+            pattern: Pattern to search for.
+            start: Index of the first block to search.
+            start_block: Block to search instead of `blocks[start]`, e.g. with a starting delim already removed.
+            match: Whether `pattern` has to match at the start of a block instead of anywhere in it.
+            work_budget: `WorkBudget` to charge the blocks searched to, if any.
+        """
+
+        key = (pattern, match)
+        test = pattern.match if match else pattern.search
+        unmatched = 0
+        entry = self.unmatched.get(key)
+        if entry is not None and entry[0] is blocks and blocks and blocks[-1] is entry[1]:
+            # the first block may have been modified since
+            unmatched = min(entry[2], len(blocks) - 1)
+        end = len(blocks) - unmatched
+        for i in range(start, end):
+            if test(start_block if i == start and start_block is not None else blocks[i]):
+                if work_budget is not None:
+                    work_budget.scan(i - start + 1)
+                return i
+        if work_budget is not None:
+            work_budget.scan(max(end - start, 0))
+        if blocks:
+            # a substituted `start_block` says nothing about the actual `blocks[start]`
+            searched_start = max(start + 1 if start_block is not None else start, 1)
+            self.unmatched[key] = (blocks, blocks[-1], max(unmatched, len(blocks) - searched_start))
+        return None
+
+
+def get_work_budget(md):
+    r"""
+    Return the `WorkBudget` that `LimitsExtension` installed on `md`, or `None` if there's none.
+    """
+
+    return getattr(md, "work_budget", None)
+
+
 def test_for_env_types(start_pattern_choices: dict, parent: etree.Element, block: str) -> str | None:
     for typ, pattern in start_pattern_choices.items():
         if pattern.match(block):
@@ -0,0 +1,122 @@
+r"""
+Watch a set of Markdown files and incrementally re-render them whenever they change, e.g. for a live-reload preview.
+
+Run with::
+
+    python -m markdown_environments.watch --config config.json --out-dir build/ chapter1.md chapter2.md ...
+
+where `config.json` holds `Renderer` extension configs. The files are treated as consecutive parts of one book: theorem
+counters carry over from each file into the next (unless `--separate-numbering` is given), and theorem `\ref{}`s
+resolve across all files.
+
+Only files that were saved are re-rendered. A file that wasn't saved is re-rendered only if the theorem counter it
+starts from changed, and it only has its `\ref{}`s re-resolved (without re-rendering) if a `\ref{}` target it uses
+changed. Output files are only rewritten if their HTML actually changed.
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+from .render import DocumentPart, Renderer
+from . import utils
+
+
+@dataclass
+class WatchedFile:
+    path: str
+    out_path: str
+    stat: tuple | None = None
+    part: DocumentPart = field(default_factory=DocumentPart)
+
+
+class Watcher:
+    r"""
+    Keeps a `Renderer` and every watched file's last render in memory, so that `update()` only redoes work that a change
+    could actually affect.
+    """
+
+    def __init__(self, extension_configs: dict, paths: list, out_dir: str, shared_numbering: bool = True):
+        r"""
+        Args:
+            extension_configs: `Renderer` extension configs.
+            paths: Markdown files to watch, in book order.
+            out_dir: Directory to write each file's HTML to, as `<file name without extension>.html`.
+            shared_numbering: Whether theorem counters carry over from each file into the next.
+        """
+
+        self.renderer = Renderer(extension_configs, resolve_refs=False)
+        self.out_dir = out_dir
+        self.shared_numbering = shared_numbering
+        self.files = [
+            WatchedFile(path, os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".html"))
+            for path in paths
+        ]
+        self.thm_ref_map = {}
+
+    def update(self) -> list:
+        """
+        Re-render whatever changed since the last call (everything on the first call).
+
+        Returns:
+            The paths of output files that were rewritten.
+        """
+
+        for file in self.files:
+            try:
+                st = os.stat(file.path)
+                stat = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stat = None
+            if stat != file.stat:
+                text = ""
+                if stat is not None:
+                    with open(file.path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                file.part.text = text
+                file.part.changed = True
+                file.stat = stat
+
+        changed, self.thm_ref_map = self.renderer.update_parts(
+            [file.part for file in self.files], self.thm_ref_map, shared_numbering=self.shared_numbering
+        )
+        written = []
+        for i in changed:
+            file = self.files[i]
+            utils.atomic_write(file.out_path, file.part.html)
+            written.append(file.out_path)
+        return written
+
+    def watch(self, poll_interval: float = 0.05) -> None:
+        """
+        Call `update()` every `poll_interval` seconds forever, printing each rewritten output file.
+        """
+
+        while True:
+            for out_path in self.update():
+                print(out_path, flush=True)
+            time.sleep(poll_interval)
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m markdown_environments.watch", description=__doc__.split("\n")[1])
+    parser.add_argument("--config", required=True, help="JSON file containing extension configs")
+    parser.add_argument("--out-dir", required=True, help="directory to write rendered HTML to")
+    parser.add_argument("--separate-numbering", action="store_true", help="restart theorem counters in every file")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="seconds between checks for changes")
+    parser.add_argument("paths", nargs="+", help="Markdown files to watch, in book order")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as file:
+        extension_configs = json.load(file)
+    watcher = Watcher(extension_configs, args.paths, args.out_dir, shared_numbering=not args.separate_numbering)
+    try:
+        watcher.watch(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
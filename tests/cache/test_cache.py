@@ -0,0 +1,132 @@
+import struct
+
+import pytest
+
+from markdown_environments.cache import FragmentCache, RenderCache
+from markdown_environments.render import Renderer
+from ..tests_utils import read_file
+
+
+def extension_configs(fragment_cache: FragmentCache | None) -> dict:
+    return {
+        "DivExtension": {"types": {"textbox": {"html_class": "md-textbox"}}, "fragment_cache": fragment_cache},
+        "DropdownExtension": {"types": {"dropdown": {}}, "html_class": "md-dropdown", "fragment_cache": fragment_cache},
+        "CaptionedFigureExtension": {},
+        "CitedBlockquoteExtension": {},
+        "ThmsExtension": {
+            "div_config": {
+                "types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,0,1"}},
+                "fragment_cache": fragment_cache
+            },
+            "dropdown_config": {
+                "types": {
+                    "exer": {"thm_type": "Exercise", "thm_counter_incr": "0,0,1"},
+                    "pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,0,1", "thm_name_overrides_thm_heading": True}
+                },
+                "fragment_cache": fragment_cache
+            }
+        }
+    }
+
+
+@pytest.mark.parametrize(
+    "filename", ["nesting/success_1.txt", "thms/success_4.txt", "thms/success_8.txt", "thms/success_1.txt"]
+)
+def test_fragment_cache(filename):
+    fixture = read_file(filename)
+    fragment_cache = FragmentCache()
+    expected = Renderer(extension_configs(None)).convert(fixture)
+
+    renderer = Renderer(extension_configs(fragment_cache))
+    assert renderer.convert(fixture) == expected
+    misses = fragment_cache.stats()["misses"]
+    assert misses > 0
+    # second render comes entirely from the cache
+    assert renderer.convert(fixture) == expected
+    assert fragment_cache.stats()["misses"] == misses
+    assert fragment_cache.stats()["hits"] > 0
+
+
+def test_fragment_cache_edits():
+    fragment_cache = FragmentCache()
+    renderer = Renderer(extension_configs(fragment_cache))
+    uncached_renderer = Renderer(extension_configs(None))
+    pfs = [f"\\begin{{pf}}\n{i} [link][{i}]\n\n[{i}]: https://example.com/{i}\n\\end{{pf}}" for i in range(5)]
+    thms = [f"\\begin{{thm}}\n{i}\n\\end{{thm}}" for i in range(5)]
+    fixture = "\n\n".join(pf + "\n\n" + thm for pf, thm in zip(pfs, thms))
+    assert renderer.convert(fixture) == uncached_renderer.convert(fixture)
+
+    # inserting a theorem near the start renumbers cached theorems after it, and link references
+    # defined in cached environments still resolve
+    fixture = "\\begin{thm}\nnew\n\\end{thm}\n\n" + fixture
+    hits = fragment_cache.stats()["hits"]
+    assert renderer.convert(fixture) == uncached_renderer.convert(fixture)
+    assert fragment_cache.stats()["hits"] == hits + 10
+
+
+def test_fragment_cache_eviction():
+    fragment_cache = FragmentCache(max_entries=1)
+    renderer = Renderer(extension_configs(fragment_cache))
+    renderer.convert("\\begin{thm}\n1\n\\end{thm}\n\n\\begin{thm}\n2\n\\end{thm}")
+    assert fragment_cache.stats()["size"] == 1
+    assert fragment_cache.stats()["evictions"] == 1
+
+
+def test_render_cache(tmp_path):
+    render_cache = RenderCache(str(tmp_path))
+    renderer = Renderer(extension_configs(None))
+    fixture = read_file("thms/success_1.txt")
+    expected = renderer.convert(fixture), renderer.get_thm_ref_map()
+
+    assert render_cache.convert(renderer, fixture) == expected
+    assert render_cache.convert(renderer, fixture) == expected
+    # another process (or another `RenderCache` object) using the same directory shares entries
+    assert RenderCache(str(tmp_path)).convert(renderer, fixture) == expected
+    # different configs are different entries
+    render_cache.convert(Renderer({"DivExtension": {}}), fixture)
+    assert render_cache.stats()["hits"] == 1
+    assert render_cache.stats()["misses"] == 2
+    assert not any(path.suffix == ".tmp" for path in tmp_path.rglob("*"))
+
+
+def test_render_cache_eviction(tmp_path):
+    renderer = Renderer(extension_configs(None))
+    render_cache = RenderCache(str(tmp_path), max_bytes=100)
+    for text in ["a" * 40, "b" * 40, "c" * 40]:
+        render_cache.convert(renderer, text)
+    stats = render_cache.stats()
+    assert stats["evictions"] >= 1 and stats["bytes"] <= 100
+    # the most recently written entry survives
+    misses = stats["misses"]
+    render_cache.convert(renderer, "c" * 40)
+    assert render_cache.stats()["misses"] == misses
+
+
+def test_render_cache_images(tmp_path):
+    (tmp_path / "static").mkdir()
+    image_path = tmp_path / "static" / "a.gif"
+    image_path.write_bytes(b"GIF89a" + struct.pack("<HH", 32, 24) + b"\x00\x00\x00")
+    render_cache = RenderCache(str(tmp_path / "cache"))
+    renderer = Renderer({"CaptionedFigureExtension": {
+        "image_attrs": True, "hash_images": True, "image_base_dir": str(tmp_path / "static")
+    }})
+    fixture = "\n\n".join([
+        r"\begin{captioned_figure}", "![a](a.gif) ![b](b.gif)", r"\begin{caption}", "hi", r"\end{caption}",
+        r"\end{captioned_figure}"
+    ])
+
+    html, _ = render_cache.convert(renderer, fixture)
+    assert 'width="32"' in html
+    assert render_cache.convert(renderer, fixture)[0] == html
+    assert render_cache.stats()["hits"] == 1
+
+    # same source, but the image changed, so its hash and dimensions in cached HTML would be stale
+    image_path.write_bytes(b"GIF89a" + struct.pack("<HH", 64, 48) + b"\x00\x00\x00\x00")
+    new_html, _ = render_cache.convert(renderer, fixture)
+    assert new_html == renderer.convert(fixture) and 'width="64"' in new_html and new_html != html
+    # and so did a missing image appearing
+    (tmp_path / "static" / "b.gif").write_bytes(b"GIF89a" + struct.pack("<HH", 8, 8) + b"\x00\x00\x00")
+    assert 'width="8"' in render_cache.convert(renderer, fixture)[0]
+    assert render_cache.stats()["hits"] == 1
+    assert render_cache.convert(renderer, fixture)[0] == renderer.convert(fixture)
+    assert render_cache.stats()["hits"] == 2
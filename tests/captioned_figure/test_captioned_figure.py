@@ -1,3 +1,6 @@
+import struct
+
+import markdown
 import pytest
 
 from markdown_environments import CaptionedFigureExtension
@@ -20,3 +23,117 @@ from ..tests_utils import run_extension_test
 )
 def test_captioned_figure(extension, filename_base):
     run_extension_test([extension], filename_base)
+
+
+def test_captioned_figure_image_attrs(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "a.gif").write_bytes(b"GIF89a" + struct.pack("<HH", 32, 24) + b"\x00\x00\x00")
+    extension = CaptionedFigureExtension(
+        image_attrs=True, image_base_dir=str(tmp_path), image_cache_path=str(tmp_path / "sizes.json")
+    )
+    fixture = "\n\n".join([
+        r"\begin{captioned_figure}",
+        "![a](img/a.gif) ![b](https://example.com/b.png) ![c](img/missing.png)",
+        r"\begin{caption}",
+        "caption ![d](img/a.gif)",
+        r"\end{caption}",
+        r"\end{captioned_figure}",
+        "![outside](img/a.gif)"
+    ])
+    actual = markdown.markdown(fixture, extensions=[extension])
+    assert actual == (
+        "<figure>\n"
+        '<p><img alt="a" decoding="async" height="24" loading="lazy" src="img/a.gif" width="32" /> '
+        '<img alt="b" decoding="async" loading="lazy" src="https://example.com/b.png" /> '
+        '<img alt="c" decoding="async" loading="lazy" src="img/missing.png" /></p>\n'
+        "<figcaption>\n"
+        '<p>caption <img alt="d" decoding="async" height="24" loading="lazy" src="img/a.gif" width="32" /></p>\n'
+        "</figcaption>\n"
+        "</figure>\n"
+        '<p><img alt="outside" src="img/a.gif" /></p>'
+    )
+    assert (tmp_path / "sizes.json").exists()
+
+
+def test_captioned_figure_hash_images(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "a.png").write_bytes(b"abc")
+    extension = CaptionedFigureExtension(
+        hash_images=True, image_base_dir=str(tmp_path), image_hash_cache_path=str(tmp_path / "hashes.json"),
+        image_out_dir=str(tmp_path / "out")
+    )
+    fixture = "\n\n".join([
+        r"\begin{captioned_figure}",
+        "![a](/img/a.png?v=1) ![b](https://example.com/b.png) ![c](img/missing.png)",
+        r"\begin{caption}",
+        "caption",
+        r"\end{caption}",
+        r"\end{captioned_figure}"
+    ])
+    actual = markdown.markdown(fixture, extensions=[extension])
+    assert actual == (
+        "<figure>\n"
+        '<p><img alt="a" src="/img/a.ba7816bf8f01.png?v=1" /> <img alt="b" src="https://example.com/b.png" /> '
+        '<img alt="c" src="img/missing.png" /></p>\n'
+        "<figcaption>\n"
+        "<p>caption</p>\n"
+        "</figcaption>\n"
+        "</figure>"
+    )
+    assert (tmp_path / "out" / "img" / "a.ba7816bf8f01.png").read_bytes() == b"abc"
+    assert (tmp_path / "hashes.json").exists()
+
+
+def test_captioned_figure_images_outside_base_dir(tmp_path):
+    (tmp_path / "secret.png").write_bytes(b"GIF89a" + struct.pack("<HH", 32, 24) + b"\x00\x00\x00")
+    (tmp_path / "static").mkdir()
+    extension = CaptionedFigureExtension(
+        image_attrs=True, hash_images=True, image_base_dir=str(tmp_path / "static"),
+        image_out_dir=str(tmp_path / "out" / "static")
+    )
+    fixture = "\n\n".join([
+        r"\begin{captioned_figure}",
+        "![a](../secret.png) ![b](%2e%2e/secret.png) ![c](/img/..%2F..%2Fsecret.png)",
+        r"\begin{caption}",
+        "caption",
+        r"\end{caption}",
+        r"\end{captioned_figure}"
+    ])
+    actual = markdown.markdown(fixture, extensions=[extension])
+    # neither probed nor hashed, so `src`s are left as is
+    assert actual == (
+        "<figure>\n"
+        '<p><img alt="a" decoding="async" loading="lazy" src="../secret.png" /> '
+        '<img alt="b" decoding="async" loading="lazy" src="%2e%2e/secret.png" /> '
+        '<img alt="c" decoding="async" loading="lazy" src="/img/..%2F..%2Fsecret.png" /></p>\n'
+        "<figcaption>\n"
+        "<p>caption</p>\n"
+        "</figcaption>\n"
+        "</figure>"
+    )
+    assert not (tmp_path / "out").exists()
+
+
+def test_captioned_figure_raw_html_images(tmp_path):
+    (tmp_path / "a.gif").write_bytes(b"GIF89a" + struct.pack("<HH", 32, 24) + b"\x00\x00\x00")
+    extension = CaptionedFigureExtension(image_attrs=True, hash_images=True, image_base_dir=str(tmp_path))
+    md = markdown.Markdown(extensions=[extension])
+    fixture = "\n\n".join([
+        r"\begin{captioned_figure}",
+        '<img alt="a" src="a.gif">',
+        r"\begin{caption}",
+        "caption",
+        r"\end{caption}",
+        r"\end{captioned_figure}"
+    ])
+    actual = md.convert(fixture)
+    # raw HTML is stashed rather than parsed into elements, so it's left untouched, and its file is never read
+    assert actual == (
+        "<figure>\n"
+        '<p><img alt="a" src="a.gif"></p>\n'
+        "<figcaption>\n"
+        "<p>caption</p>\n"
+        "</figcaption>\n"
+        "</figure>"
+    )
+    assert md.treeprocessors["captioned_figure_images"].image_paths == []
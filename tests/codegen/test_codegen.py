@@ -0,0 +1,188 @@
+import os
+
+import markdown
+import pytest
+
+from markdown_environments import DivExtension, DropdownExtension, ThmsExtension, codegen
+from markdown_environments.div import DivProcessor
+from markdown_environments.dropdown import DropdownProcessor
+from ..tests_utils import read_file, run_extension_test
+from ..thms.test_thms import DIV_TYPES as THM_DIV_TYPES, DROPDOWN_TYPES as THM_DROPDOWN_TYPES
+
+
+TYPES = {
+    "default": {},
+    "div2": {
+        "html_class": "lol mb-0"
+    }
+}
+
+DROPDOWN_TYPES = {
+    "default": {},
+    "O_O": {
+        "html_class": "lmao, even"
+    }
+}
+
+
+@pytest.fixture
+def codegen_dir(tmp_path):
+    yield str(tmp_path)
+    # so every test generates its own modules
+    codegen._loaded_classes.clear()
+
+
+@pytest.mark.parametrize(
+    "make_extension, filename_base",
+    [
+        (lambda codegen_dir: DivExtension(types=TYPES, codegen_dir=codegen_dir), "div/success_1"),
+        (lambda codegen_dir: DivExtension(types=TYPES, html_class="md-div", codegen_dir=codegen_dir), "div/success_2"),
+        (lambda codegen_dir: DivExtension(types=TYPES, codegen_dir=codegen_dir), "div/fail_2"),
+        (lambda codegen_dir: DropdownExtension(types=DROPDOWN_TYPES, codegen_dir=codegen_dir), "dropdown/success_1"),
+        (
+            lambda codegen_dir: DropdownExtension(
+                types=DROPDOWN_TYPES, html_class="phd-dropdown", summary_html_class="md-dropdown__summary",
+                content_html_class="md-dropdown__content", codegen_dir=codegen_dir
+            ),
+            "dropdown/success_2"
+        ),
+        (
+            lambda codegen_dir: DropdownExtension(
+                types=DROPDOWN_TYPES, deferred_content="template", codegen_dir=codegen_dir
+            ),
+            "dropdown/success_3"
+        ),
+        (lambda codegen_dir: DropdownExtension(types=DROPDOWN_TYPES, codegen_dir=codegen_dir), "dropdown/fail_4"),
+        (
+            lambda codegen_dir: ThmsExtension(
+                div_config={"types": THM_DIV_TYPES, "html_class": "md-div", "codegen_dir": codegen_dir},
+                dropdown_config={
+                    "types": THM_DROPDOWN_TYPES, "html_class": "md-dropdown",
+                    "summary_html_class": "md-dropdown__summary mb-0", "codegen_dir": codegen_dir
+                },
+                thm_heading_config={"html_class": "md-thm-heading", "emph_html_class": "md-thm-heading__emph"}
+            ),
+            "thms/success_1"
+        ),
+        (
+            lambda codegen_dir: ThmsExtension(
+                div_config={"types": THM_DIV_TYPES, "codegen_dir": codegen_dir},
+                dropdown_config={"types": THM_DROPDOWN_TYPES, "codegen_dir": codegen_dir}
+            ),
+            "thms/success_4"
+        )
+    ]
+)
+def test_codegen_fixtures(codegen_dir, make_extension, filename_base):
+    run_extension_test([make_extension(codegen_dir)], filename_base)
+    assert len(os.listdir(codegen_dir)) > 0
+
+
+def test_codegen_processor_classes(codegen_dir):
+    md = markdown.Markdown(extensions=[
+        DivExtension(types=TYPES, codegen_dir=codegen_dir),
+        DropdownExtension(types=DROPDOWN_TYPES, codegen_dir=codegen_dir)
+    ])
+    div_processor = md.parser.blockprocessors["div"]
+    dropdown_processor = md.parser.blockprocessors["dropdown"]
+    assert type(div_processor) is not DivProcessor and isinstance(div_processor, DivProcessor)
+    assert type(dropdown_processor) is not DropdownProcessor and isinstance(dropdown_processor, DropdownProcessor)
+    # under the package, so e.g. `MetricsExtension` instruments them too
+    assert type(div_processor).__module__.startswith("markdown_environments.")
+    assert sorted(file_name.split("_")[0] for file_name in os.listdir(codegen_dir)) == ["div", "dropdown"]
+
+
+def test_codegen_reuses_generated_modules(codegen_dir, monkeypatch):
+    config = {"types": TYPES, "html_class": "md-div", "is_thm": False}
+    cls = codegen.load_processor_class("div", config, codegen_dir)
+    assert codegen.load_processor_class("div", config, codegen_dir) is cls
+    (file_name,) = os.listdir(codegen_dir)
+    path = os.path.join(codegen_dir, file_name)
+    mtime = os.stat(path).st_mtime_ns
+    with open(path) as file:
+        source = file.read()
+
+    # loaded from disk by a new process, without generating it again
+    codegen._loaded_classes.clear()
+    with monkeypatch.context() as m:
+        m.setattr(codegen, "gen_source", None)
+        loaded_cls = codegen.load_processor_class("div", config, codegen_dir)
+    assert loaded_cls is not cls and loaded_cls.__module__ == cls.__module__
+    assert os.stat(path).st_mtime_ns == mtime
+
+    # regenerated if broken
+    codegen._loaded_classes.clear()
+    with open(path, "w") as file:
+        file.write("FINGERPRINT = ")
+    cls = codegen.load_processor_class("div", config, codegen_dir)
+    assert issubclass(cls, DivProcessor) and cls is not DivProcessor
+
+    # regenerated, without being run, if it was generated for another config or version
+    codegen._loaded_classes.clear()
+    with open(path, "w") as file:
+        file.write(source.replace("FINGERPRINT = ", "raise RuntimeError\nFINGERPRINT = 'x' + "))
+    cls = codegen.load_processor_class("div", config, codegen_dir)
+    assert issubclass(cls, DivProcessor) and cls is not DivProcessor
+    with open(path) as file:
+        assert file.read() == source
+
+
+def test_codegen_fingerprint():
+    def fingerprint(**config):
+        return codegen.fingerprint("div", codegen.normalize_config("div", {"is_thm": False, **config}))
+
+    base = fingerprint(types={"default": {}}, html_class="")
+    # defaults don't matter, nor does the fragment cache
+    assert fingerprint(types={"default": {"html_class": ""}}, html_class="", literal_types=False) == base
+    assert fingerprint(types={"default": {}}, html_class="", fragment_cache=object()) == base
+    assert fingerprint(types={"default": {}}, html_class="md-div") != base
+    assert fingerprint(types={"default": {"html_class": "a"}}, html_class="") != base
+    assert fingerprint(types={"default": {}, "other": {}}, html_class="") != base
+    assert fingerprint(types={"default": {}}, html_class="", literal_types=True) != base
+
+
+def test_codegen_regex_types(codegen_dir):
+    # overlapping regex types match the first type in order, like the generic processor, and an empty type never does
+    types = {"": {}, "ab?": {"html_class": "first"}, "a": {"html_class": "second"}, "[cd]": {"html_class": "third"}}
+    text = "\n\n".join([
+        "\\begin{a}\nx\n\\end{a}", "\\begin{ab}\nx\n\\end{ab}", "\\begin{}\nx\n\\end{}", "\\begin{d}\nx\n\\end{d}"
+    ])
+    expected = markdown.markdown(text, extensions=[DivExtension(types=types)])
+    actual = markdown.markdown(text, extensions=[DivExtension(types=types, codegen_dir=codegen_dir)])
+    assert actual == expected
+    assert 'class=" first"' in actual and 'class=" third"' in actual
+
+
+def test_codegen_literal_types(codegen_dir):
+    types = {"a}b": {"html_class": "brace"}, "c.d": {"html_class": "dot"}}
+    text = "\\begin{a}b}\nx\n\\end{a}b}\n\n\\begin{c.d}\ny\n\\end{c.d}\n\n\\begin{cxd}\nz\n\\end{cxd}"
+    expected = markdown.markdown(text, extensions=[DivExtension(types=types, literal_types=True)])
+    actual = markdown.markdown(
+        text, extensions=[DivExtension(types=types, literal_types=True, codegen_dir=codegen_dir)]
+    )
+    assert actual == expected
+    assert 'class=" brace"' in actual and 'class=" dot"' in actual and "cxd" in actual
+
+
+def test_codegen_unspecializable_config(codegen_dir):
+    # formatted at runtime by the generic processor, so it's left to it
+    config = {"types": {"default": {"html_class": ["not", "a", "str"]}}, "html_class": "", "is_thm": False}
+    assert codegen.load_processor_class("div", config, codegen_dir) is DivProcessor
+    assert os.listdir(codegen_dir) == []
+
+
+def test_codegen_compact(codegen_dir):
+    def make_extension(codegen_dir):
+        return ThmsExtension(
+            div_config={"types": THM_DIV_TYPES, "html_class": "", "compact": True, "codegen_dir": codegen_dir},
+            dropdown_config={
+                "types": THM_DROPDOWN_TYPES, "summary_html_class": " md-dropdown__summary ", "compact": True,
+                "codegen_dir": codegen_dir
+            },
+            thm_heading_config={"compact": True}
+        )
+
+    text = read_file("thms/success_1.txt")
+    expected = markdown.markdown(text, extensions=[make_extension("")])
+    assert markdown.markdown(text, extensions=[make_extension(codegen_dir)]) == expected
+    assert 'class="md-thm"' in expected and 'class="md-dropdown__summary"' in expected
@@ -0,0 +1,178 @@
+import gc
+import math
+import time
+
+import pytest
+
+from markdown_environments.metrics import iter_processors
+from markdown_environments.render import Renderer
+
+
+# numbers of environments to render each input with
+SIZES = (250, 500, 1000, 2000)
+# numbers of environments to count blocks scanned at, which needs no timing and so no large sizes
+COUNT_SIZES = (100, 200, 400)
+# renders per size, keeping the fastest, since anything else running only ever makes a render slower
+REPEATS = 3
+# maximum scaling exponent of any stage's time in the number of environments (linear is 1, quadratic is 2)
+MAX_EXPONENT = 1.4
+# stages that take less than this at the largest size are too fast to time reliably
+MIN_STAGE_SECONDS = 0.01
+
+EXTENSION_CONFIGS = {
+    "CaptionedFigureExtension": {},
+    "CitedBlockquoteExtension": {},
+    "DivExtension": {"types": {"textbox": {}}},
+    "DropdownExtension": {"types": {"dropdown": {}}},
+    "ThmsExtension": {
+        "div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}},
+        "dropdown_config": {"types": {"proof": {"thm_type": "Proof"}}},
+        "thm_counter_config": {"add_html_elem": True}
+    }
+}
+
+ENVS = {
+    "captioned_figure": [
+        r"\begin{captioned_figure}", "![image](a.png)", r"\begin{caption}", "A *caption*.", r"\end{caption}",
+        r"\end{captioned_figure}"
+    ],
+    "cited_blockquote": [
+        r"\begin{cited_blockquote}", "A quote.", r"\begin{citation}", "Someone", r"\end{citation}",
+        r"\end{cited_blockquote}"
+    ],
+    "div": [r"\begin{textbox}", "Some *text*.", r"\end{textbox}"],
+    "dropdown": [r"\begin{dropdown}", r"\begin{summary}", "Summary", r"\end{summary}", "Content.", r"\end{dropdown}"],
+    # `<i>` is replaced with the environment's index, and `<j>` with an earlier one
+    "thm": [r"\begin{thm}[Name <i>]", r"Statement, unlike \ref{Name <j>}.", r"\end{thm}"],
+    "proof": [r"\begin{proof}", "Proof.", r"\end{proof}"]
+}
+
+
+def fill_in(block: str, i: int) -> str:
+    return block.replace("<i>", str(i)).replace("<j>", str(i // 2))
+
+
+def gen_flat(kind: str, n: int) -> str:
+    blocks = []
+    for i in range(n):
+        blocks += [fill_in(block, i) for block in ENVS[kind]]
+    return "\n\n".join(blocks)
+
+
+def gen_nested(n: int) -> str:
+    # four deep
+    blocks = []
+    for i in range(n):
+        blocks += [
+            fill_in(ENVS["thm"][0], i), r"\begin{proof}", r"\begin{textbox}", *ENVS["cited_blockquote"],
+            r"\end{textbox}", r"\end{proof}", r"\end{thm}"
+        ]
+    return "\n\n".join(blocks)
+
+
+def gen_unclosed(kind: str, n: int) -> str:
+    # `\begin{}`s that never end, each searching for its `\end{}`, interleaved with other environments that do end
+    closed_kind = "proof" if kind == "div" else "div"
+    blocks = []
+    for i in range(n):
+        blocks += [fill_in(ENVS[kind][0], i), "Text.", *ENVS[closed_kind]]
+    return "\n\n".join(blocks)
+
+
+INPUTS = {
+    **{kind: lambda n, kind=kind: gen_flat(kind, n) for kind in ENVS},
+    "nested": gen_nested,
+    **{f"unclosed_{kind}": lambda n, kind=kind: gen_unclosed(kind, n) for kind in ENVS}
+}
+
+
+class StageTimer:
+    # accumulates the time spent in each of this package's processors in a `markdown.Markdown` object, by wrapping
+    # them; Python-Markdown's own are left out, since e.g. its block processors remove every block they handle from
+    # the start of the list of blocks (quadratic with a tiny constant), and its tree walks slow down a little once
+    # the tree outgrows the CPU's caches
+
+    def __init__(self, md):
+        self.totals = {}
+        for stage, name, processor in iter_processors(md, own_only=True):
+            processor.run = self.wrap(f"{stage}:{name}", processor.run)
+
+    def wrap(self, name: str, function):
+        self.totals[name] = 0.0
+
+        # CPU time, so other processes getting scheduled in between doesn't count
+        def timed(*args, **kwargs):
+            start = time.process_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                # block processors nest, so this includes the time spent in environments' content
+                self.totals[name] += time.process_time() - start
+        return timed
+
+
+def fit_exponent(sizes: list, times: list) -> float:
+    # least-squares slope of log(time) against log(size)
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    return (
+        sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+        / sum((x - x_mean) ** 2 for x in xs)
+    )
+
+
+def measure_stages(text: str) -> dict:
+    renderer = Renderer(EXTENSION_CONFIGS)
+    stage_timer = StageTimer(renderer.md)
+    fastest = None
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(REPEATS):
+            for name in stage_timer.totals:
+                stage_timer.totals[name] = 0.0
+            renderer.convert(text)
+            if fastest is None:
+                fastest = dict(stage_timer.totals)
+            else:
+                fastest = {name: min(t, stage_timer.totals[name]) for name, t in fastest.items()}
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return fastest
+
+
+@pytest.mark.parametrize("input_name", list(INPUTS))
+def test_blocks_scanned(input_name):
+    # deterministic, unlike timings: the blocks that environments scan must grow linearly with their number
+    renderer = Renderer({**EXTENSION_CONFIGS, "LimitsExtension": {}})
+    blocks_scanned = []
+    for n in COUNT_SIZES:
+        renderer.convert(INPUTS[input_name](n))
+        blocks_scanned.append(renderer.md.work_budget.blocks_scanned)
+    assert blocks_scanned[0] > 0
+    for size, next_size, scanned, next_scanned in zip(
+        COUNT_SIZES, COUNT_SIZES[1:], blocks_scanned, blocks_scanned[1:]
+    ):
+        assert next_scanned <= scanned * next_size / size + 1
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("input_name", list(INPUTS))
+def test_complexity(input_name):
+    stage_times = [measure_stages(INPUTS[input_name](n)) for n in SIZES]
+    exponents = {
+        name: fit_exponent(SIZES, [times[name] for times in stage_times])
+        for name in stage_times[-1] if stage_times[-1][name] >= MIN_STAGE_SECONDS
+    }
+    assert exponents # otherwise nothing was actually checked
+    superlinear = {name: round(exponent, 2) for name, exponent in exponents.items() if exponent > MAX_EXPONENT}
+    assert superlinear == {}, f"stages scale superlinearly (exponents above {MAX_EXPONENT}): {superlinear}"
+
+
+def test_fit_exponent():
+    assert fit_exponent([1, 2, 4], [3, 6, 12]) == pytest.approx(1)
+    assert fit_exponent([1, 2, 4], [3, 12, 48]) == pytest.approx(2)
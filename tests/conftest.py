@@ -1,4 +1,20 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="also run slow, timing-based tests")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: slow, timing-based test, only run with `--run-slow`")
+
+
 def pytest_collection_modifyitems(session, config, items):
     # don't interpret `test_for_env_types()` from actual package's `utils.py` as a test!
     # otherwise it screams about fixture not found or something
     items[:] = [item for item in items if item.name != "test_for_env_types"]
+    if not config.getoption("--run-slow"):
+        skip_slow = pytest.mark.skip(reason="slow; run with `--run-slow`")
+        for item in items:
+            if "slow" in item.keywords:
+                item.add_marker(skip_slow)
@@ -0,0 +1,52 @@
+import io
+import json
+
+from markdown_environments.daemon import RenderServer
+
+
+CONFIGS = {
+    "default": {
+        "ThmsExtension": {"div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}}
+    },
+    "divs": {
+        "DivExtension": {"types": {"default": {}}, "html_class": "md-div"}
+    }
+}
+
+
+def serve(server: RenderServer, requests: list) -> list:
+    instream = io.StringIO("".join(json.dumps(request) + "\n" for request in requests) + "\n")
+    outstream = io.StringIO()
+    server.serve_stream(instream, outstream)
+    return [json.loads(line) for line in outstream.getvalue().splitlines()]
+
+
+def test_serve_stream():
+    server = RenderServer(CONFIGS)
+    text = "\\begin{thm}{meow}\nhi\n\\end{thm}\n\nsee \\ref{meow}"
+    responses = serve(server, [
+        {"id": 1, "text": text, "config": "default", "metadata": True},
+        # counters must restart for every request
+        {"id": 2, "text": text, "config": "default"},
+        {"id": "three", "text": "\\begin{default}\nhi\n\\end{default}", "config": "divs"}
+    ])
+
+    assert responses[0] == {
+        "id": 1,
+        "html": '<div>\n<p><span id="meow"><span>Theorem 0.1</span><span>.</span></span> hi</p>\n</div>\n'
+                "<p>see Theorem 0.1</p>",
+        "thm_ref_map": {"meow": "Theorem 0.1"}
+    }
+    assert responses[1] == {"id": 2, "html": responses[0]["html"]}
+    assert responses[2] == {"id": "three", "html": '<div class="md-div ">\n<p>hi</p>\n</div>'}
+
+
+def test_serve_stream_errors():
+    server = RenderServer(CONFIGS)
+    responses = serve(server, [{"id": 1, "text": "hi"}, {"id": 2, "text": "hi", "config": "nope"}, {"id": 3}])
+    assert [response["id"] for response in responses] == [1, 2, 3]
+    assert all("error" in response and "html" not in response for response in responses)
+
+    outstream = io.StringIO()
+    server.serve_stream(io.StringIO("not json\n"), outstream)
+    assert "error" in json.loads(outstream.getvalue())
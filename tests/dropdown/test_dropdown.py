@@ -1,7 +1,8 @@
+import markdown
 import pytest
 
 from markdown_environments import DropdownExtension
-from ..tests_utils import run_extension_test
+from ..tests_utils import read_file, run_extension_test
 
 
 TYPES = {
@@ -25,6 +26,7 @@ TYPES = {
             ),
             "dropdown/success_2"
         ),
+        (DropdownExtension(types=TYPES, deferred_content="template"), "dropdown/success_3"),
         (DropdownExtension(), "dropdown/fail_1"),
         (DropdownExtension(types=TYPES), "dropdown/fail_2"),
         (DropdownExtension(types=TYPES), "dropdown/fail_3"),
@@ -35,3 +37,37 @@ TYPES = {
 )
 def test_dropdown(extension, filename_base):
     run_extension_test([extension], filename_base)
+
+
+def test_dropdown_deferred_content_side_file():
+    extension = DropdownExtension(types=TYPES, deferred_content="side_file")
+    md = markdown.Markdown(extensions=[extension])
+    actual = md.convert(read_file("dropdown/success_3.txt"))
+    deferred_content = extension.get_deferred_content()
+    assert len(deferred_content) == 2
+    outer_key, inner_key = [key for key in deferred_content if "outer" in deferred_content[key]] + [
+        key for key in deferred_content if "outer" not in deferred_content[key]
+    ]
+    assert actual.endswith(f'<template data-md-deferred="{outer_key}"></template>\n</details>')
+    assert "(im sorry)" not in actual
+    # nested dropdowns are deferred separately
+    assert f'<template data-md-deferred="{inner_key}"></template>' in deferred_content[outer_key]
+    assert deferred_content[inner_key] == "<div>\n<p>(im sorry)</p>\n</div>"
+
+    # keys are stable, and reset between conversions
+    md.reset().convert(read_file("dropdown/success_3.txt"))
+    assert extension.get_deferred_content() == deferred_content
+    md.reset().convert("no dropdowns here")
+    assert extension.get_deferred_content() == {}
+
+
+def test_dropdown_deferred_content_invalid():
+    with pytest.raises(ValueError):
+        DropdownExtension(types=TYPES, deferred_content="lazy")
+
+
+def test_dropdown_nested_begin_in_summary():
+    # parsing the summary tests the nested `\begin{}`, which mustn't change the type of the dropdown being parsed
+    md = markdown.Markdown(extensions=[DropdownExtension(types=TYPES)])
+    actual = md.convert("\\begin{default}\n\n\\begin{summary}\\begin{O_O}\n\\end{summary}\n\n\\end{default}")
+    assert actual == "<details>\n<summary>\n<p>\\begin{O_O}</p>\n</summary>\n<div></div>\n</details>"
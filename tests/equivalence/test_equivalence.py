@@ -0,0 +1,99 @@
+import glob
+
+import pytest
+
+from markdown_environments import equivalence
+from markdown_environments.equivalence import EquivalenceChecker, Fuzzer, ddmin, minimize
+from markdown_environments.render import Renderer
+from ..tests_utils import TESTS_PATH, read_file
+
+
+EXTENSION_CONFIGS = {
+    "CaptionedFigureExtension": {"html_class": "md-captioned-figure"},
+    "CitedBlockquoteExtension": {"html_class": "md-cited-blockquote"},
+    "DivExtension": {"types": {"default": {}, "textbox": {"html_class": "md-textbox"}}},
+    "DropdownExtension": {"types": {"dropdown": {}}, "html_class": "md-dropdown"},
+    "ThmsExtension": {
+        "div_config": {
+            "types": {
+                "thm": {"thm_type": "Theorem", "thm_counter_incr": "0,0,1"},
+                "lem": {"thm_type": "Lemma", "thm_counter_incr": "0,0,1"}
+            }
+        },
+        "dropdown_config": {
+            "types": {
+                "exer": {"thm_type": "Exercise", "thm_counter_incr": "0,0,1"},
+                "pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,0,1", "thm_name_overrides_thm_heading": True}
+            }
+        },
+        "thm_counter_config": {"add_html_elem": True}
+    }
+}
+
+FILENAMES = sorted(
+    filename[len(TESTS_PATH) + 1:] for filename in glob.glob(f"{TESTS_PATH}/**/*.txt", recursive=True)
+    if not filename.endswith("_expected.txt")
+)
+
+
+@pytest.fixture(scope="module")
+def checker():
+    with EquivalenceChecker(EXTENSION_CONFIGS) as checker:
+        yield checker
+
+
+def test_equivalence_fixtures(checker):
+    for filename in FILENAMES:
+        checker.check(read_file(filename), source=filename)
+    assert checker.mismatches == []
+    assert set(checker.timing_ratios()) == set(equivalence.ENGINES)
+
+
+def test_equivalence_fuzz():
+    with EquivalenceChecker(EXTENSION_CONFIGS) as checker:
+        fuzzer = Fuzzer(seed=0)
+        for filename in FILENAMES:
+            text = read_file(filename)
+            for i in range(4):
+                checker.check(fuzzer.mutate(text), source=f"{filename}#fuzz-{i}")
+        assert [str(mismatch) for mismatch in checker.mismatches] == []
+        # fuzzing readily defines theorem names twice, which `stream` skips (see `Renderer.convert_stream()`)
+        assert 0 < checker.skipped["stream"] < checker.documents
+        assert checker.skipped["parallel"] == checker.skipped["fragment_cache"] == checker.skipped["codegen"] == 0
+
+
+def broken_engine(extension_configs, exit_stack):
+    renderer = Renderer(extension_configs)
+
+    def convert(text):
+        # forgets every textbox
+        return renderer.convert(text.replace("\\begin{textbox}", "")), renderer.get_thm_ref_map()
+    return convert
+
+
+def test_equivalence_minimizes_mismatches(monkeypatch):
+    monkeypatch.setitem(equivalence.ENGINES, "broken", broken_engine)
+    text = "\n\n".join([read_file("thms/success_1.txt"), "\\begin{textbox}\nhi\n\\end{textbox}", "more text"])
+    with EquivalenceChecker(EXTENSION_CONFIGS, engines=["broken"]) as checker:
+        mismatches = checker.check(text, source="doc")
+        assert checker.check(read_file("thms/success_1.txt")) == []
+    assert len(mismatches) == 1
+    assert (mismatches[0].engine, mismatches[0].kind, mismatches[0].source) == ("broken", "html", "doc")
+    assert mismatches[0].minimized == "\\begin{textbox}"
+    assert checker.report()["mismatches"] == [
+        {"engine": "broken", "kind": "html", "source": "doc", "minimized": "\\begin{textbox}"}
+    ]
+
+
+def test_ddmin():
+    units = list(range(100))
+    assert ddmin(units, lambda units: 17 in units and 42 in units, max_tests=1000) == [17, 42]
+    # gives up once out of tests, with whatever it had so far
+    assert len(ddmin(units, lambda units: 17 in units and 42 in units, max_tests=2)) > 2
+    assert minimize("a\n\nb c\nd\n\ne", lambda text: "c" in text) == "c"
+
+
+def test_fuzzer():
+    text = read_file("thms/success_1.txt")
+    assert Fuzzer(seed=1).mutate(text) == Fuzzer(seed=1).mutate(text)
+    assert len({Fuzzer(seed=seed).mutate(text) for seed in range(10)}) > 1
@@ -0,0 +1,127 @@
+import os
+import struct
+
+import pytest
+
+from markdown_environments.images import (
+    StatCache, copy_if_missing, hash_file, hashed_src, probe_image_size, resolve_local_src
+)
+
+
+def png_bytes(width: int, height: int) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+
+
+def jpeg_bytes(width: int, height: int) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+def gif_bytes(width: int, height: int) -> bytes:
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00\x00\x00"
+
+
+def webp_bytes(chunk_type: bytes, width: int, height: int) -> bytes:
+    if chunk_type == b"VP8 ":
+        payload = b"\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", width, height)
+    elif chunk_type == b"VP8L":
+        bits = (width - 1) | ((height - 1) << 14)
+        payload = b"\x2f" + struct.pack("<I", bits)
+    else:
+        payload = b"\x00\x00\x00\x00" + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    chunk = chunk_type + struct.pack("<I", len(payload)) + payload
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+@pytest.mark.parametrize(
+    "contents, expected",
+    [
+        (png_bytes(640, 480), [640, 480]),
+        (jpeg_bytes(1024, 768), [1024, 768]),
+        (gif_bytes(16, 9), [16, 9]),
+        (webp_bytes(b"VP8 ", 300, 200), [300, 200]),
+        (webp_bytes(b"VP8L", 5000, 3), [5000, 3]),
+        (webp_bytes(b"VP8X", 70000, 2), [70000, 2]),
+        (b"not an image", None),
+        (b"\xff\xd8\xff", None),
+        (b"", None)
+    ]
+)
+def test_probe_image_size(tmp_path, contents, expected):
+    path = tmp_path / "image"
+    path.write_bytes(contents)
+    assert probe_image_size(str(path)) == expected
+
+
+def test_probe_image_size_missing(tmp_path):
+    assert probe_image_size(str(tmp_path / "missing.png")) is None
+
+
+def test_stat_cache(tmp_path):
+    calls = []
+
+    def compute(path):
+        calls.append(path)
+        return probe_image_size(path)
+
+    image_path = tmp_path / "a.png"
+    image_path.write_bytes(png_bytes(1, 2))
+    cache_path = tmp_path / "cache" / "sizes.json"
+    cache = StatCache(compute, path=str(cache_path))
+    assert cache.get(str(image_path)) == [1, 2]
+    assert cache.get(str(image_path)) == [1, 2]
+    assert len(calls) == 1
+    cache.save()
+
+    # a fresh cache loads the saved entries instead of probing again
+    cache = StatCache(compute, path=str(cache_path))
+    assert cache.get(str(image_path)) == [1, 2]
+    assert len(calls) == 1
+
+    # changing the file's size invalidates its entry
+    image_path.write_bytes(png_bytes(3, 4) + b"\x00")
+    assert cache.get(str(image_path)) == [3, 4]
+    assert len(calls) == 2
+    assert cache.get(str(tmp_path / "missing.png")) is None
+
+
+def test_resolve_local_src():
+    static = os.path.realpath("static")
+    assert resolve_local_src("img/a%20b.png?v=1#x", "static") == os.path.join(static, "img", "a b.png")
+    assert resolve_local_src("/img/a.png", "static") == os.path.join(static, "img", "a.png")
+    assert resolve_local_src("img/../a.png", "static") == os.path.join(static, "a.png")
+    # nothing outside the base directory
+    assert resolve_local_src("../a.png", "static") is None
+    assert resolve_local_src("/img/../../a.png", "static") is None
+    assert resolve_local_src("%2e%2e/a.png", "static") is None
+    assert resolve_local_src("img/%2E%2E%2F%2E%2E%2Fa.png", "static") is None
+    assert resolve_local_src("../static-other/a.png", "static") is None
+    assert resolve_local_src("https://example.com/a.png", "static") is None
+    assert resolve_local_src("//example.com/a.png", "static") is None
+    assert resolve_local_src("data:image/png;base64,AAAA", "static") is None
+
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"abc")
+    assert hash_file(str(path)) == "ba7816bf8f01"
+    assert hash_file(str(path), length=4) == "ba78"
+    assert hash_file(str(tmp_path / "missing.png")) is None
+
+
+def test_hashed_src():
+    assert hashed_src("img/a.png", "0123") == "img/a.0123.png"
+    assert hashed_src("/img/a.b.png?v=1#x", "0123") == "/img/a.b.0123.png?v=1#x"
+    assert hashed_src("img/a%20b.png", "0123") == "img/a%20b.0123.png"
+    assert hashed_src("img/LICENSE", "0123") == "img/LICENSE.0123"
+
+
+def test_copy_if_missing(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"abc")
+    dst_path = tmp_path / "out" / "img" / "a.png"
+    copy_if_missing(str(tmp_path / "a.png"), str(dst_path))
+    assert dst_path.read_bytes() == b"abc"
+    (tmp_path / "a.png").write_bytes(b"def")
+    copy_if_missing(str(tmp_path / "a.png"), str(dst_path))
+    assert dst_path.read_bytes() == b"abc"
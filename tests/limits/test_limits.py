@@ -0,0 +1,102 @@
+import markdown
+import pytest
+
+from markdown_environments import DivExtension, DropdownExtension, LimitsExtension, ThmsExtension
+from markdown_environments.cache import FragmentCache
+from markdown_environments.limits import BudgetExceededError, check_type_pattern
+
+
+def convert(text: str, **limits) -> str:
+    md = markdown.Markdown(extensions=[
+        DivExtension(types={"textbox": {}}), DropdownExtension(types={"dropdown": {}}), LimitsExtension(**limits)
+    ])
+    return md.reset().convert(text)
+
+
+NESTED = "\n\n".join([
+    r"\begin{textbox}", r"\begin{dropdown}", r"\begin{summary}", "summary", r"\end{summary}", "content",
+    r"\end{dropdown}", r"\end{textbox}"
+])
+
+
+def test_limits_within():
+    assert convert(NESTED, max_document_size=len(NESTED), max_nesting_depth=2, max_envs=2) == convert(NESTED)
+
+
+@pytest.mark.parametrize(
+    "limits, limit_name",
+    [
+        ({"max_document_size": len(NESTED) - 1}, "max_document_size"),
+        ({"max_nesting_depth": 1}, "max_nesting_depth"),
+        ({"max_envs": 1}, "max_envs"),
+        ({"max_blocks_scanned": 5}, "max_blocks_scanned")
+    ]
+)
+def test_limits_exceeded(limits, limit_name):
+    with pytest.raises(BudgetExceededError) as e:
+        convert(NESTED, **limits)
+    assert e.value.limit_name == limit_name
+    assert f"`{limit_name}`" in str(e.value)
+
+
+def test_limits_unclosed_envs():
+    # unclosed `\begin{}`s search the rest of the document once between all of them, so the blocks scanned are linear
+    text = "\n\n".join([r"\begin{textbox}"] * 2000)
+    convert(text, max_blocks_scanned=10_000)
+    with pytest.raises(BudgetExceededError):
+        convert(text, max_blocks_scanned=1000)
+
+
+def test_limits_reset_between_conversions():
+    md = markdown.Markdown(extensions=[DivExtension(types={"textbox": {}}), LimitsExtension(max_envs=1)])
+    text = "\n\n".join([r"\begin{textbox}", "a", r"\end{textbox}"])
+    for _ in range(3):
+        md.reset().convert(text)
+
+
+def test_limits_fragment_cache():
+    fragment_cache = FragmentCache()
+    md = markdown.Markdown(extensions=[
+        DivExtension(types={"textbox": {}}, fragment_cache=fragment_cache), LimitsExtension(max_envs=2)
+    ])
+    text = "\n\n".join([r"\begin{textbox}", "a", r"\end{textbox}"] * 3)
+    with pytest.raises(BudgetExceededError):
+        md.reset().convert(text)
+
+
+def test_limits_invalid_config():
+    with pytest.raises(ValueError):
+        LimitsExtension(max_envs=-1)
+
+
+@pytest.mark.parametrize("typ", ["(a+)+", "(a|aa)*", "(?:x*y?)+", "((ab)*)*", "a(b|c+)+"])
+def test_check_type_pattern_rejects(typ):
+    with pytest.raises(ValueError):
+        check_type_pattern(typ)
+
+
+@pytest.mark.parametrize("typ", ["thm", "thm|lem", "lem(ma)?", "a+b*", "(ab)+", "[a-z]+", r"proof\*"])
+def test_check_type_pattern_accepts(typ):
+    check_type_pattern(typ)
+
+
+def test_init_rejects_unsafe_types():
+    with pytest.raises(ValueError):
+        markdown.Markdown(extensions=[DivExtension(types={"(a+)+": {}})])
+    with pytest.raises(ValueError):
+        markdown.Markdown(extensions=[ThmsExtension(div_config={"types": {"[": {}}})])
+
+
+def test_literal_types():
+    extensions = [
+        DivExtension(types={"a.b(": {}, "(a+)+": {}}, literal_types=True),
+        ThmsExtension(dropdown_config={"types": {"c+": {"thm_type": "C"}}, "literal_types": True})
+    ]
+    text = "\n\n".join([
+        r"\begin{a.b(}", "x", r"\end{a.b(}", r"\begin{axb(}", "y", r"\end{axb(}", r"\begin{(a+)+}", "z",
+        r"\end{(a+)+}", r"\begin{c+}", "w", r"\end{c+}"
+    ])
+    actual = markdown.markdown(text, extensions=extensions)
+    assert actual.count("<div>") == 3 # two divs, plus the dropdown's content
+    assert "<p>\\begin{axb(}</p>" in actual
+    assert "<details>" in actual
@@ -0,0 +1,108 @@
+import pytest
+
+from markdown_environments.lint import Diagnostic, Linter, lint_paths, main
+
+
+EXTENSION_CONFIGS = {
+    "CaptionedFigureExtension": {},
+    "CitedBlockquoteExtension": {},
+    "DivExtension": {"types": {"textbox": {}}},
+    "DropdownExtension": {"types": {"dropdown": {}}},
+    "ThmsExtension": {
+        "div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}},
+        "dropdown_config": {"types": {"proof": {"thm_type": "Proof"}}}
+    }
+}
+
+
+def lint(text: str) -> list:
+    return [(d.line, d.code) for d in Linter(EXTENSION_CONFIGS).lint(text)]
+
+
+def test_lint_clean():
+    text = "\n\n".join([
+        r"\begin{thm}[Fermat]{fermat}", r"\begin{textbox}", "a", r"\end{textbox}", r"\end{thm}",
+        r"\begin{proof}", "b", r"\end{proof}",
+        r"\begin{dropdown}", r"\begin{summary}", "s", r"\end{summary}", "c", r"\end{dropdown}",
+        r"\begin{captioned_figure}", "img", r"\begin{caption}", "cap", r"\end{caption}", r"\end{captioned_figure}",
+        r"\begin{thm}{hidden}", "c", r"\end{thm}", r"{{0,1}}{counter}",
+        r"See \ref{Fermat}, \ref{hidden}, and \ref{counter}.",
+        "```", r"\begin{textbox}", r"\ref{nothing}", "```"
+    ])
+    assert lint(text) == []
+
+
+def test_lint_unclosed_and_unmatched():
+    text = "\n".join([r"\begin{thm}", "", r"\begin{textbox}", "", "a", "", r"\end{thm}", "", r"\end{textbox}"])
+    assert lint(text) == [(3, "unclosed-env"), (9, "unmatched-end")]
+    assert lint(r"\begin{textbox}") == [(1, "unclosed-env")]
+
+
+def test_lint_missing_sub_envs():
+    text = "\n\n".join([
+        r"\begin{dropdown}", "c", r"\end{dropdown}",
+        r"\begin{captioned_figure}", "img", r"\end{captioned_figure}",
+        r"\begin{cited_blockquote}", "quote", r"\end{cited_blockquote}",
+        r"\begin{proof}", "no summary needed", r"\end{proof}"
+    ])
+    assert lint(text) == [(1, "missing-summary"), (7, "missing-caption"), (13, "missing-citation")]
+
+
+def test_lint_block_starts():
+    # `\begin{}`s in the middle of a block aren't environments, but ones right after another `\begin{}` line are
+    text = "\n".join([
+        "para", r"\begin{textbox}", "a", r"\end{textbox}", "",
+        r"\begin{thm}", r"\begin{textbox}", "b", r"\end{textbox}", r"\end{thm}", "",
+        r"\begin{dropdown}", r"\begin{summary}", "s", r"\end{summary}", r"\end{dropdown}"
+    ])
+    assert lint(text) == [(4, "unmatched-end")]
+
+
+def test_lint_nested_env():
+    text = "\n\n".join([r"\begin{textbox}", r"\begin{textbox}", "a", r"\end{textbox}", r"\end{textbox}"])
+    assert lint(text) == [(3, "nested-env")]
+    text = "\n\n".join([
+        r"\begin{textbox}", r"\begin{thm}", r"\begin{textbox}", r"\end{textbox}", r"\end{thm}", r"\end{textbox}"
+    ])
+    assert lint(text) == [(5, "nested-env")]
+
+
+def test_lint_duplicates_and_refs():
+    text = "\n\n".join([
+        r"\begin{thm}[A]{a}", "x", r"\end{thm}",
+        r"\begin{thm}[A]{a}", "y", r"\end{thm}",
+        r"\begin{thm}{b}", "x", r"\end{thm}",
+        r"\begin{thm}{b}", "y", r"\end{thm}",
+        # hidden names of theorems with names are never used
+        r"\ref{A} \ref{a} \ref{b}"
+    ])
+    assert lint(text) == [(7, "duplicate-name"), (19, "duplicate-hidden-name"), (25, "unresolved-ref")]
+
+
+def test_lint_diagnostic_str():
+    diagnostic = Linter(EXTENSION_CONFIGS).lint(r"\ref{x}", path="a.md")[0]
+    assert diagnostic == Diagnostic("a.md", 1, "unresolved-ref", r"`\ref{x}` doesn't match any theorem")
+    assert str(diagnostic) == r"a.md:1: unresolved-ref: `\ref{x}` doesn't match any theorem"
+
+
+@pytest.mark.parametrize("processes, min_paths", [(1, 16), (2, 1)])
+def test_lint_paths(tmp_path, processes, min_paths):
+    (tmp_path / "a.md").write_text("\n\n".join([r"\begin{thm}{a}", "x", r"\end{thm}", r"\ref{b}"]))
+    (tmp_path / "b.md").write_text("\n\n".join([r"\begin{thm}{b}", "x", r"\end{thm}", r"\ref{a}", r"\begin{textbox}"]))
+    paths = [str(tmp_path / "a.md"), str(tmp_path / "b.md")]
+
+    diagnostics = lint_paths(EXTENSION_CONFIGS, paths, processes=processes, min_paths=min_paths)
+    assert [(d.path, d.line, d.code) for d in diagnostics] == [
+        (paths[0], 7, "unresolved-ref"), (paths[1], 7, "unresolved-ref"), (paths[1], 9, "unclosed-env")
+    ]
+    diagnostics = lint_paths(EXTENSION_CONFIGS, paths, processes=processes, min_paths=min_paths, shared_refs=True)
+    assert [(d.path, d.line, d.code) for d in diagnostics] == [(paths[1], 9, "unclosed-env")]
+
+
+def test_lint_main(tmp_path, capsys):
+    (tmp_path / "config.json").write_text('{"DivExtension": {"types": {"textbox": {}}}}')
+    (tmp_path / "a.md").write_text("\\begin{textbox}\n")
+    assert main(["--config", str(tmp_path / "config.json"), str(tmp_path / "a.md")]) == 1
+    assert "unclosed-env" in capsys.readouterr().out
+    (tmp_path / "a.md").write_text("\\begin{textbox}\n\n\\end{textbox}\n")
+    assert main(["--config", str(tmp_path / "config.json"), str(tmp_path / "a.md")]) == 0
@@ -0,0 +1,133 @@
+import re
+import threading
+
+import markdown
+
+from markdown_environments import DivExtension, MetricsExtension, ThmsExtension
+from markdown_environments.metrics import ConversionStats, collect
+from markdown_environments.thms import ThmRefProcessor
+
+
+TEXT = "\n\n".join([
+    r"\begin{textbox}", "one", r"\end{textbox}",
+    r"\begin{textbox}", "two", r"\end{textbox}",
+    r"\begin{textbox}", "never ends"
+])
+
+
+def make_md(**kwargs):
+    metrics_extension = MetricsExtension(**kwargs)
+    md = markdown.Markdown(extensions=[DivExtension(types={"textbox": {}}), metrics_extension])
+    return md, metrics_extension
+
+
+def test_metrics_output_unchanged():
+    plain_md = markdown.Markdown(extensions=[
+        DivExtension(types={"textbox": {}}),
+        ThmsExtension(div_config={"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}})
+    ])
+    metrics_md = markdown.Markdown(extensions=[
+        DivExtension(types={"textbox": {}}),
+        ThmsExtension(div_config={"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}),
+        MetricsExtension()
+    ])
+    text = TEXT + "\n\n" + "\n\n".join([r"\begin{thm}[A]", r"See \ref{A}.", r"\end{thm}"])
+    assert metrics_md.reset().convert(text) == plain_md.reset().convert(text)
+
+
+def test_metrics_counts():
+    md, metrics_extension = make_md()
+    md.reset().convert(TEXT)
+    stats = metrics_extension.last_stats
+    assert stats.conversions == 1
+    assert stats.seconds > 0
+    div_stats = stats.stages["div"]
+    assert div_stats.matches == 3
+    assert div_stats.runs == 3
+    # the last one never ends
+    assert div_stats.rollbacks == 1
+    assert div_stats.tests >= div_stats.matches
+    assert div_stats.blocks_scanned > 0
+    assert div_stats.regex_calls > 0
+    assert div_stats.seconds > 0
+
+    md.reset().convert(TEXT)
+    assert metrics_extension.last_stats is not stats
+    assert metrics_extension.last_stats.stages["div"].runs == 3
+    assert metrics_extension.totals.conversions == 2
+    assert metrics_extension.totals.stages["div"].runs == 6
+
+
+def test_metrics_class_patterns():
+    metrics_extension = MetricsExtension()
+    md = markdown.Markdown(extensions=[
+        ThmsExtension(div_config={"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}),
+        metrics_extension
+    ])
+    md.reset().convert("\n\n".join([r"\begin{thm}[A]", r"See \ref{A}.", r"\end{thm}"]))
+    # patterns used through classmethods are counted too, without changing the processor's class or the class itself
+    assert metrics_extension.last_stats.stages["thm_ref"].regex_calls > 0
+    assert type(md.postprocessors["thm_ref"]) is ThmRefProcessor
+    assert isinstance(ThmRefProcessor.PATTERN, re.Pattern)
+
+
+def test_metrics_collect():
+    md, _ = make_md()
+    with collect() as outer:
+        with collect() as inner:
+            md.reset().convert(TEXT)
+        assert inner.conversions == 1
+        md.reset().convert(TEXT)
+    assert outer.conversions == 2
+    assert outer.stages["div"].runs == 6
+    assert inner.stages["div"].runs == 3
+
+
+def test_metrics_threads():
+    results = {}
+
+    def convert(i):
+        md, metrics_extension = make_md()
+        text = "\n\n".join([r"\begin{textbox}", "text", r"\end{textbox}"] * (i + 1))
+        with collect() as stats:
+            for _ in range(20):
+                md.reset().convert(text)
+        results[i] = (stats, metrics_extension.totals)
+
+    threads = [threading.Thread(target=convert, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, (stats, totals) in results.items():
+        assert stats.conversions == totals.conversions == 20
+        assert stats.stages["div"].runs == totals.stages["div"].runs == 20 * (i + 1)
+
+
+def test_metrics_prometheus(tmp_path):
+    stats = ConversionStats(conversions=2, seconds=0.5)
+    stats.stage('a"b').runs = 3
+    text = stats.to_prometheus(prefix="md")
+    assert "# TYPE md_conversions_total counter\nmd_conversions_total 2\n" in text
+    assert "md_conversion_seconds_total 0.5\n" in text
+    assert 'md_stage_runs_total{stage="a\\"b"} 3\n' in text
+
+    path = tmp_path / "metrics" / "md.prom"
+    md, metrics_extension = make_md(prometheus_path=str(path))
+    md.reset().convert(TEXT)
+    md.reset().convert(TEXT)
+    assert path.read_text(encoding="utf-8") == metrics_extension.totals.to_prometheus()
+    assert "markdown_environments_conversions_total 2\n" in path.read_text(encoding="utf-8")
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_metrics_disabled():
+    md = markdown.Markdown(extensions=[DivExtension(types={"textbox": {}})])
+    processor = md.parser.blockprocessors["div"]
+    run = processor.run
+    with collect() as stats:
+        md.reset().convert(TEXT)
+    # nothing's instrumented, so nothing's counted
+    assert stats.stages == {}
+    assert md.parser.blockprocessors["div"].run == run
+    assert not hasattr(md, "work_budget")
@@ -0,0 +1,76 @@
+import json
+
+from markdown_environments.paginate import Paginator
+from markdown_environments.render import Renderer
+
+
+EXTENSION_CONFIGS = {
+    "DivExtension": {"types": {"chapter": {"html_class": "chapter"}}},
+    "ThmsExtension": {"div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}},
+    "toc": {}
+}
+FIXTURE = (
+    "preface\n\n"
+    "# Intro\n\nsee \\ref{b} and [the lemma](#lemma)\n\n"
+    "\\begin{thm}{a}\nhi\n\\end{thm}\n\n"
+    "## Details\n\n\\begin{thm}[b]\nhi\n\\end{thm}\n\n"
+    "Lemma\n=====\n\nsee \\ref{a}\n\n"
+    "\\begin{chapter}\n# Inside\n\n\\begin{thm}\nhi\n\\end{thm}\n\\end{chapter}"
+)
+
+
+def test_paginator_split():
+    paginator = Paginator(EXTENSION_CONFIGS, split_heading_level=1)
+    pages = paginator.split(FIXTURE)
+    assert [page[0].split("\n")[0] for page in pages] == ["preface", "# Intro", "Lemma"]
+
+    paginator = Paginator(EXTENSION_CONFIGS, split_env_types=["chapter"], split_heading_level=2)
+    pages = paginator.split(FIXTURE)
+    # headings inside environments never split pages
+    assert [page[0].split("\n")[0] for page in pages] == [
+        "preface", "# Intro", "## Details", "Lemma", "\\begin{chapter}"
+    ]
+    # the preprocessors end the document with a blank line
+    assert "\n\n".join(block for page in pages for block in page) == FIXTURE + "\n\n"
+
+
+def test_paginator_split_headings():
+    paginator = Paginator({"fenced_code": {}}, split_heading_level=1)
+    # `#` lines in fenced code blocks aren't headings
+    fixture = "# Intro\n\n```\n\n# not a heading\n```\n\ntext"
+    assert len(paginator.split(fixture)) == 1
+    pages, _ = paginator.paginate(fixture)
+    assert pages == [Renderer({"fenced_code": {}}).convert(fixture)]
+
+    # headings in the middle of a block still start pages, but deeper ones and ones in indented code don't
+    fixture = "intro\n# Part 1\ntext\n## Section\n# Part 2\n\n    code\n    # not a heading"
+    pages = paginator.split(fixture)
+    assert pages == [["intro"], ["# Part 1\ntext\n## Section"], ["# Part 2", "    code\n    # not a heading", ""]]
+    pages, _ = paginator.paginate(fixture)
+    assert "\n".join(pages) == Renderer({}).convert(fixture)
+
+
+def test_paginator_paginate():
+    paginator = Paginator(EXTENSION_CONFIGS, split_env_types=["chapter"], split_heading_level=1)
+    pages, manifest = paginator.paginate(FIXTURE)
+    assert [page["file"] for page in manifest["pages"]] == ["page-1.html", "page-2.html", "page-3.html", "page-4.html"]
+    assert [page["title"] for page in manifest["pages"]] == ["", "Intro", "Lemma", "Inside"]
+    assert manifest["ids"]["lemma"] == 2
+    assert manifest["ids"]["b"] == 1
+
+    # numbering is global, `\ref{}`s to other pages become links, and same-page `\ref{}`s are unchanged
+    assert "<span>Theorem 0.3</span>" in pages[3]
+    assert '<p>see Theorem 0.2 and <a href="page-3.html#lemma">the lemma</a></p>' in pages[1]
+    assert '<p>see <a href="page-2.html#a">Theorem 0.1</a></p>' in pages[2]
+
+    # without splitting, pages are the whole document
+    pages, _ = Paginator(EXTENSION_CONFIGS).paginate(FIXTURE)
+    assert pages == [Renderer(EXTENSION_CONFIGS).convert(FIXTURE)]
+
+
+def test_paginator_write(tmp_path):
+    paginator = Paginator(EXTENSION_CONFIGS, split_heading_level=1)
+    paths = paginator.write(FIXTURE, str(tmp_path))
+    assert paths == [str(tmp_path / f"page-{i}.html") for i in range(1, 4)]
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert len(manifest["pages"]) == 3
@@ -0,0 +1,73 @@
+import glob
+
+import pytest
+
+from markdown_environments.parallel import ParallelRenderer
+from markdown_environments.render import Renderer
+from ..tests_utils import TESTS_PATH, read_file
+
+
+EXTENSION_CONFIGS = {
+    "CaptionedFigureExtension": {"html_class": "md-captioned-figure"},
+    "CitedBlockquoteExtension": {"html_class": "md-cited-blockquote"},
+    "DivExtension": {"types": {"default": {}, "textbox": {"html_class": "md-textbox"}}},
+    "DropdownExtension": {"types": {"dropdown": {}}, "html_class": "md-dropdown"},
+    "ThmsExtension": {
+        "div_config": {
+            "types": {
+                "thm": {"thm_type": "Theorem", "thm_counter_incr": "0,0,1"},
+                "lem": {"thm_type": "Lemma", "thm_counter_incr": "0,0,1"}
+            }
+        },
+        "dropdown_config": {
+            "types": {
+                "exer": {"thm_type": "Exercise", "thm_counter_incr": "0,0,1"},
+                "pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,0,1", "thm_name_overrides_thm_heading": True}
+            }
+        }
+    },
+    "toc": {}
+}
+
+# every fixture in the test suite, since parallel rendering must be byte-identical to serial rendering for any input
+FILENAMES = sorted(
+    filename[len(TESTS_PATH) + 1:] for filename in glob.glob(f"{TESTS_PATH}/**/*.txt", recursive=True)
+    if not filename.endswith("_expected.txt")
+)
+
+
+@pytest.fixture(scope="module")
+def parallel_renderer():
+    # `min_chunks=1` so that even tiny documents go through the process pool
+    with ParallelRenderer(EXTENSION_CONFIGS, processes=2, min_chunks=1) as parallel_renderer:
+        yield parallel_renderer
+
+
+@pytest.mark.parametrize("filename", FILENAMES)
+def test_parallel(parallel_renderer, filename):
+    fixture = read_file(filename)
+    renderer = Renderer(EXTENSION_CONFIGS)
+    assert parallel_renderer.convert(fixture) == renderer.convert(fixture)
+    assert parallel_renderer.get_thm_ref_map() == renderer.get_thm_ref_map()
+
+
+def test_parallel_link_references(parallel_renderer):
+    fixture = "\n\n".join(
+        f"\\begin{{thm}}\nsee [link][{i}]\n\\end{{thm}}\n\n[{i + 1}]: https://example.com/{i}" for i in range(20)
+    )
+    assert parallel_renderer.convert(fixture) == Renderer(EXTENSION_CONFIGS).convert(fixture)
+
+
+def test_parallel_pool_started_lazily():
+    fixture = read_file("thms/success_1.txt")
+    with ParallelRenderer(EXTENSION_CONFIGS, processes=2) as parallel_renderer:
+        # too few chunks to be worth the pool
+        assert parallel_renderer.convert(fixture) == Renderer(EXTENSION_CONFIGS).convert(fixture)
+        assert parallel_renderer.executor is None
+    assert parallel_renderer.executor is None
+
+    parallel_renderer = ParallelRenderer(EXTENSION_CONFIGS, processes=2, min_chunks=1)
+    parallel_renderer.convert(fixture)
+    assert parallel_renderer.executor is not None
+    parallel_renderer.close()
+    assert parallel_renderer.executor is None
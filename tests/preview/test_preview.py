@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from markdown_environments.preview import PreviewSession
+from markdown_environments.render import Renderer
+from ..tests_utils import read_file
+
+
+EXTENSION_CONFIGS = {
+    "ThmsExtension": {"div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}}
+}
+
+
+def test_preview():
+    text = "intro\n\n\\begin{thm}{a}\nhi\n\\end{thm}\n\n\\begin{thm}{b}\nhi\n\\end{thm}\n\nsee \\ref{b}"
+    session = PreviewSession(EXTENSION_CONFIGS)
+    update = session.set_text(text)
+    assert update["removed"] == []
+    assert list(update["fragments"]) == update["order"]
+    ids = update["order"]
+    assert len(ids) == 4
+    assert session.get_html().endswith('<div id="md-preview-3">\n<p>see Theorem 0.2</p>\n</div>')
+
+    # editing inside an environment only re-renders that environment
+    start = text.index("hi")
+    update = session.edit(start, start + 2, "hello")
+    assert update["removed"] == [ids[1]]
+    assert list(update["fragments"]) == [update["order"][1]]
+    assert update["order"][2:] == ids[2:]
+    ids = update["order"]
+
+    # inserting a theorem renumbers later theorems, and `\ref{}`s to them
+    update = session.edit(0, 0, "\\begin{thm}\nnew\n\\end{thm}\n\n")
+    assert update["order"][1:] == ids
+    assert list(update["fragments"]) == update["order"][:1] + update["order"][2:]
+    assert update["fragments"][update["order"][-1]].endswith("<p>see Theorem 0.3</p>\n</div>")
+
+
+def test_preview_matches_renderer():
+    for filename in ["thms/success_1.txt", "div/success_1.txt", "dropdown/success_1.txt"]:
+        text = read_file(filename)
+        session = PreviewSession({"ThmsExtension": {
+            "div_config": {"types": {"thm": {"thm_type": "Theorem"}}},
+            "dropdown_config": {"types": {"dropdown": {"thm_type": "Dropdown"}}}
+        }})
+        session.set_text(text)
+        # each unit renders the same as a document of its own
+        renderer = Renderer(session.renderer.extension_configs)
+        assert all(part.html == renderer.convert(part.text) for part in session.parts if "\\ref{" not in part.text)
+        assert "".join(part.text for part in session.parts).replace("\n", "") == text.replace("\n", "")
+
+
+def test_preview_edit_out_of_bounds():
+    session = PreviewSession(EXTENSION_CONFIGS)
+    session.set_text("hi")
+    with pytest.raises(IndexError):
+        session.edit(0, 3, "")
+
+
+def test_preview_edit_resplits_locally(monkeypatch):
+    units = [f"\\begin{{thm}}\nthm {i}\n\\end{{thm}}\n\npara {i}" for i in range(50)]
+    text = "\n\n".join(units)
+    session = PreviewSession(EXTENSION_CONFIGS)
+    session.set_text(text)
+    split_lens = []
+    split_top_level = session.renderer.split_top_level
+    monkeypatch.setattr(session.renderer, "split_top_level", lambda blocks: split_lens.append(len(blocks)) or
+                        split_top_level(blocks))
+    start = text.index("thm 20")
+    session.edit(start, start + 3, "theorem")
+    assert max(split_lens) < 10
+
+
+def test_preview_edit_matches_set_text():
+    rng = random.Random(0)
+    pieces = ["\\begin{thm}", "\\end{thm}", "\\begin{thm}{a}\nhi\n\\end{thm}", "para", "# heading", "- item",
+              "  indented", "\n", "\n\n", "\n\n\n", "see \\ref{a}", "```", "x"]
+    session = PreviewSession(EXTENSION_CONFIGS)
+    session.set_text("")
+    for _ in range(300):
+        start = rng.randrange(len(session.text) + 1)
+        end = rng.randrange(start, min(start + 30, len(session.text)) + 1)
+        replacement = "".join(rng.choice(pieces) for _ in range(rng.randrange(4)))
+        session.edit(start, end, replacement)
+        expected = PreviewSession(EXTENSION_CONFIGS)
+        expected.set_text(session.text)
+        assert [part.text for part in session.parts] == [part.text for part in expected.parts]
+        assert [part.html for part in session.parts] == [part.html for part in expected.parts]
@@ -0,0 +1,104 @@
+import copy
+import glob
+
+import pytest
+
+from markdown_environments.profiles import ProfileRenderer
+from markdown_environments.render import Renderer
+from ..tests_utils import TESTS_PATH, read_file
+
+
+def make_extension_configs(theme: str, compact: bool = False) -> dict:
+    # every `class` and `id` config set to something depending on `theme`, or left out if `theme` is empty
+    def html_class(name: str) -> dict:
+        return {"html_class": f"{theme}-{name}"} if theme != "" else {}
+
+    return {
+        "CaptionedFigureExtension": {
+            **html_class("figure"), **({"caption_html_class": f" {theme}-caption "} if theme != "" else {})
+        },
+        "CitedBlockquoteExtension": {**html_class("blockquote"), "citation_html_class": theme},
+        "DivExtension": {"types": {"default": {}, "textbox": html_class("textbox")}, "compact": compact},
+        "DropdownExtension": {
+            "types": {"dropdown": {}}, **html_class("dropdown"), "summary_html_class": f"{theme} summary",
+            "content_html_class": theme, "compact": compact
+        },
+        "ThmsExtension": {
+            "div_config": {
+                "types": {
+                    "thm": {"thm_type": "Theorem", "thm_counter_incr": "0,0,1", **html_class("thm")},
+                    "lem": {"thm_type": "Lemma", "thm_counter_incr": "0,0,1"}
+                },
+                **html_class("thm-div"), "compact": compact
+            },
+            "dropdown_config": {
+                "types": {
+                    "exer": {"thm_type": "Exercise", "thm_counter_incr": "0,0,1", **html_class("exer")},
+                    "pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,0,1", "thm_name_overrides_thm_heading": True}
+                },
+                "summary_html_class": f"{theme}-summary", "compact": compact
+            },
+            "thm_counter_config": {
+                "add_html_elem": True, "html_id_prefix": f"{theme}counter-", **html_class("counter")
+            },
+            "thm_heading_config": {
+                "html_id_prefix": theme, **html_class("heading"), "emph_html_class": f"{theme}  emph",
+                "compact": compact
+            }
+        },
+        "toc": {}
+    }
+
+
+FILENAMES = sorted(
+    filename[len(TESTS_PATH) + 1:] for filename in glob.glob(f"{TESTS_PATH}/**/*.txt", recursive=True)
+    if not filename.endswith("_expected.txt")
+)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_profile_renderer(compact):
+    profiles = {theme: make_extension_configs(theme, compact=compact) for theme in ("", "light", "dark")}
+    renderer = ProfileRenderer(profiles)
+    profile_renderers = {name: Renderer(extension_configs) for name, extension_configs in profiles.items()}
+    for filename in FILENAMES:
+        fixture = read_file(filename)
+        html_by_profile = renderer.convert(fixture)
+        assert list(html_by_profile) == list(profiles)
+        for name, profile_renderer in profile_renderers.items():
+            # byte-identical to rendering each profile on its own
+            assert html_by_profile[name] == profile_renderer.convert(fixture), (filename, name)
+            assert renderer.get_thm_ref_map(name) == profile_renderer.get_thm_ref_map(), (filename, name)
+            assert renderer.get_thm_id_map(name) == profile_renderer.get_thm_id_map(), (filename, name)
+
+
+def test_profile_renderer_fallback():
+    profiles = {theme: make_extension_configs(theme) for theme in ("light", "dark")}
+    renderer = ProfileRenderer(profiles)
+    # a document containing the tokens' prefix is rendered once per profile instead
+    fixture = f"\\begin{{thm}}[{renderer.nonce}]\nhi\n\\end{{thm}}\n\nsee \\ref{{{renderer.nonce}}}"
+    html_by_profile = renderer.convert(fixture)
+    assert renderer.fallback
+    for name, extension_configs in profiles.items():
+        profile_renderer = Renderer(extension_configs)
+        assert html_by_profile[name] == profile_renderer.convert(fixture)
+        assert renderer.get_thm_ref_map(name) == profile_renderer.get_thm_ref_map()
+
+    renderer.convert("hi")
+    assert not renderer.fallback
+
+
+def test_profile_renderer_invalid_profiles():
+    with pytest.raises(ValueError):
+        ProfileRenderer({})
+    light = make_extension_configs("light")
+    dark = make_extension_configs("dark")
+    dark["ThmsExtension"]["div_config"]["types"]["thm"]["thm_type"] = "Thm"
+    with pytest.raises(ValueError, match="differs"):
+        ProfileRenderer({"light": light, "dark": dark})
+    with pytest.raises(ValueError, match="substituted"):
+        ProfileRenderer({"light": light, "dark": make_extension_configs('da"rk')})
+    side_file = copy.deepcopy(light)
+    side_file["DropdownExtension"]["deferred_content"] = "side_file"
+    with pytest.raises(ValueError, match="side file"):
+        ProfileRenderer({"light": side_file})
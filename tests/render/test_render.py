@@ -0,0 +1,294 @@
+import glob
+import io
+import xml.etree.ElementTree as etree
+
+import pytest
+
+from markdown_environments import tree
+from markdown_environments.render import DocumentPart, Renderer, RendererRegistry
+from ..tests_utils import TESTS_PATH, read_file
+
+
+EXTENSION_CONFIGS = {
+    "ThmsExtension": {
+        "div_config": {
+            "types": {
+                "thm": {
+                    "thm_type": "Theorem",
+                    "thm_counter_incr": "0,0,1"
+                },
+                "lem": {
+                    "thm_type": "Lemma",
+                    "thm_counter_incr": "0,0,1"
+                }
+            }
+        }
+    }
+}
+
+
+@pytest.mark.parametrize("filename_base", ["thms/thm_ref/success_1", "thms/thm_ref/success_3"])
+def test_renderer_reuse(filename_base):
+    renderer = Renderer(EXTENSION_CONFIGS)
+    fixture = read_file(f"{filename_base}.txt")
+    expected = read_file(f"{filename_base}_expected.txt")
+    # rendering the same document repeatedly must not carry counters or `\ref{}` targets over between documents
+    for _ in range(3):
+        actual = renderer.convert(fixture)
+        print(actual, end="\n")
+        assert actual == expected
+
+
+def test_renderer_thm_ref_map():
+    renderer = Renderer(EXTENSION_CONFIGS)
+    renderer.convert(read_file("thms/thm_ref/success_3.txt"))
+    thm_ref_map = renderer.get_thm_ref_map()
+    assert thm_ref_map["Section 1"] == "1"
+    assert thm_ref_map["golly gosh i need to stop meowing :3"] == "Lemma 1.0.1"
+    assert thm_ref_map["owo"] == "Theorem 2.0.1"
+
+    renderer.convert("no theorems here")
+    assert renderer.get_thm_ref_map() == {}
+
+
+def test_renderer_does_not_mutate_configs():
+    extension_configs = {"DivExtension": {"types": {"default": {}}}}
+    Renderer(extension_configs)
+    assert extension_configs == {"DivExtension": {"types": {"default": {}}}}
+
+
+def test_renderer_registry():
+    registry = RendererRegistry(max_size=2)
+    renderer = registry.get(EXTENSION_CONFIGS)
+    # key order doesn't matter
+    assert registry.get(dict(reversed(EXTENSION_CONFIGS.items()))) is renderer
+    assert registry.get(EXTENSION_CONFIGS, resolve_refs=False) is not renderer
+
+    registry.get({"DivExtension": {}})
+    # `EXTENSION_CONFIGS` with `resolve_refs=True` was least recently used
+    assert registry.get(EXTENSION_CONFIGS) is not renderer
+    assert registry.stats() == {"size": 2, "hits": 1, "misses": 4, "evictions": 2}
+
+
+FILENAMES = sorted(
+    filename[len(TESTS_PATH) + 1:] for filename in glob.glob(f"{TESTS_PATH}/**/*.txt", recursive=True)
+    if not filename.endswith("_expected.txt")
+)
+ALL_EXTENSION_CONFIGS = {
+    "CaptionedFigureExtension": {"html_class": "md-captioned-figure"},
+    "CitedBlockquoteExtension": {"html_class": "md-cited-blockquote"},
+    "DivExtension": {"types": {"default": {}, "textbox": {"html_class": "md-textbox"}}},
+    "DropdownExtension": {"types": {"dropdown": {}}, "html_class": "md-dropdown"},
+    "ThmsExtension": {
+        "div_config": {"types": EXTENSION_CONFIGS["ThmsExtension"]["div_config"]["types"]},
+        "dropdown_config": {
+            "types": {"pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,0,1"}}
+        }
+    }
+}
+
+
+@pytest.mark.parametrize("filename", FILENAMES)
+def test_renderer_convert_stream(filename):
+    renderer = Renderer(ALL_EXTENSION_CONFIGS)
+    fixture = read_file(filename)
+    expected = renderer.convert(fixture)
+    assert "".join(renderer.convert_stream(fixture)) == expected
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)) == expected
+    file = io.StringIO()
+    renderer.convert_to_file(fixture, file)
+    assert file.getvalue() == expected
+
+
+def test_renderer_convert_stream_forward_refs():
+    renderer = Renderer(EXTENSION_CONFIGS)
+    fixture = "see \\ref{a}\n\nfoo\n\n\\begin{thm}{a}\nhi\n\\end{thm}\n\nbar\n\n\\begin{thm}\nhi\n\\end{thm}"
+    chunks = list(renderer.convert_stream(fixture, batch_blocks=1))
+    # the `\ref{}` holds back everything up to its theorem, but not what comes after that
+    assert len(chunks) == 4
+    assert chunks[0].startswith("<p>see Theorem 0.0.1</p>")
+    assert "".join(chunks) == renderer.convert(fixture)
+
+
+def test_renderer_convert_stream_link_references():
+    renderer = Renderer(EXTENSION_CONFIGS)
+    fixture = "[ref]: http://x.com\n\nsee [a][ref]\n\n\\begin{thm}\nsee [b][ref]\n\\end{thm}\n"
+    expected = renderer.convert(fixture)
+    assert '<a href="http://x.com">a</a>' in expected and '<a href="http://x.com">b</a>' in expected
+    assert "".join(renderer.convert_stream(fixture)) == expected
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)) == expected
+    # definitions further down aren't known yet when earlier chunks are finished
+    fixture = "see [a][ref]\n\n\\begin{thm}\nhi\n\\end{thm}\n\n[ref]: http://x.com\n"
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)).startswith("<p>see [a][ref]</p>")
+
+
+def test_renderer_convert_stream_max_pending_blocks(monkeypatch):
+    renderer = Renderer(EXTENSION_CONFIGS)
+    # a `\ref{}` that no theorem ever defines (e.g. MathJax's) would otherwise hold back the whole document
+    fixture = "$\\ref{eq}$\n\n" + "\n\n".join(
+        f"\\begin{{thm}}{{t{i}}}\nsee \\ref{{t{i}}}\n\\end{{thm}}" for i in range(20)
+    )
+    get_thm_ref_map = renderer.get_thm_ref_map
+    calls = []
+    monkeypatch.setattr(renderer, "get_thm_ref_map", lambda: calls.append(None) or get_thm_ref_map())
+    stream = renderer.convert_stream(fixture, batch_blocks=1)
+    next(stream)
+    assert "t19" in renderer.get_thm_id_map()
+    stream = renderer.convert_stream(fixture, batch_blocks=1, max_pending_blocks=3)
+    chunks = [next(stream)]
+    assert "\\ref{eq}" in chunks[0]
+    assert "t5" not in renderer.get_thm_id_map()
+    chunks.extend(stream)
+    assert "".join(chunks) == renderer.convert(fixture)
+    # the `\ref{}` targets are only merged when a chunk has a new `\ref{}` to resolve
+    assert len(calls) <= 21
+
+
+@pytest.mark.parametrize(
+    "fixture",
+    [
+        # `<cite>` isn't block-level, so nothing separates it from what comes next
+        "\\begin{cited_blockquote}\nquote\n\\begin{citation}\nme\n\\end{citation}\n\\end{cited_blockquote}\n\npara",
+        # the heading leaves the theorem starting in the middle of a block
+        "# heading\n\\begin{thm}\n\n\\begin{thm}\nhi\n\\end{thm}",
+        # the caption comes after the figure's `\end{}`, and is block-parsed before everything in between
+        "\\begin{captioned_figure}\n\\end{captioned_figure}\n\n\\begin{captioned_figure}\n\n"
+        "\\begin{caption}\\end{caption}\n\n\\end{captioned_figure}\n\n\\begin{caption}\\end{caption}"
+    ]
+)
+def test_renderer_convert_stream_chunk_boundaries(fixture):
+    renderer = Renderer(ALL_EXTENSION_CONFIGS)
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)) == renderer.convert(fixture)
+
+
+def test_renderer_thm_ref_map_raw_html():
+    renderer = Renderer({"ThmsExtension": {
+        "div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}},
+        "thm_counter_config": {"add_html_elem": True}
+    }})
+    fixture = "see \\ref{a}\n\n\\begin{thm}[a]\nhi\n\\end{thm}"
+    expected = renderer.convert(fixture)
+    # theorem counters' `<span>`s, not Python-Markdown's placeholders for them
+    assert renderer.get_thm_ref_map()["a"] == 'Theorem <span id="0-1">0.1</span>'
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)) == expected
+
+
+def canonicalize(content: list) -> str:
+    content = list(content)
+    if content and isinstance(content[0], str):
+        content[0] = content[0].lstrip()
+    if content and isinstance(content[-1], str):
+        content[-1] = content[-1].rstrip()
+    wrapper = etree.Element("fragment")
+    tree.set_content(wrapper, content)
+    return etree.tostring(wrapper, encoding="unicode")
+
+
+@pytest.mark.parametrize("filename", FILENAMES)
+def test_renderer_convert_tree(filename):
+    renderer = Renderer(ALL_EXTENSION_CONFIGS)
+    fixture = read_file(filename)
+    # `convert()` escapes ampersands in theorem names twice, while the tree holds the name as written
+    expected = canonicalize(tree.parse_html_fragment(renderer.convert(fixture))).replace("&amp;amp;", "&amp;")
+    expected_thm_ref_map = renderer.get_thm_ref_map()
+    assert canonicalize(tree.get_content(renderer.convert_tree(fixture))) == expected
+    assert renderer.get_thm_ref_map() == expected_thm_ref_map
+
+
+def test_renderer_convert_tree_compact():
+    thms_config = ALL_EXTENSION_CONFIGS["ThmsExtension"]
+    renderer = Renderer({
+        **ALL_EXTENSION_CONFIGS,
+        "ThmsExtension": {
+            "div_config": {**thms_config["div_config"], "compact": True},
+            "dropdown_config": {**thms_config["dropdown_config"], "compact": True},
+            "thm_heading_config": {"emph_html_class": "emph", "compact": True}
+        }
+    })
+    for filename in FILENAMES:
+        fixture = read_file(filename)
+        expected = canonicalize(tree.parse_html_fragment(renderer.convert(fixture))).replace("&amp;amp;", "&amp;")
+        assert canonicalize(tree.get_content(renderer.convert_tree(fixture))) == expected, filename
+
+
+def test_renderer_convert_tree_raw_html():
+    renderer = Renderer(EXTENSION_CONFIGS)
+    fixture = (
+        "\\begin{thm}[*nice* one]\nhi <b>raw</b> &amp; co\n\\end{thm}\n\n<div>\nblock\n</div>\n\n"
+        "see \\ref{*nice* one} [link](https://example.com/?a=1&b=2)"
+    )
+    expected = canonicalize(tree.parse_html_fragment(renderer.convert(fixture)))
+    root = renderer.convert_tree(fixture)
+    assert root.tag == "div"
+    assert root[1].tag == "div" and root[1].text == "\nblock\n"
+    assert canonicalize(tree.get_content(root)) == expected
+
+
+def test_renderer_deferred_content():
+    renderer = Renderer({"ThmsExtension": {"dropdown_config": {
+        "types": {"pf": {"thm_type": "Proof", "thm_counter_incr": "0,0,1"}}, "deferred_content": "side_file"
+    }}})
+    fixture = read_file("thms/success_1.txt")
+    html = renderer.convert(fixture)
+    deferred_content = renderer.get_deferred_content()
+    assert len(deferred_content) > 0
+    assert all(f'<template data-md-deferred="{key}"></template>' in html for key in deferred_content)
+
+    expected = canonicalize(tree.parse_html_fragment(html))
+    assert canonicalize(tree.get_content(renderer.convert_tree(fixture))) == expected
+    assert renderer.get_deferred_content() == deferred_content
+
+
+
+def test_renderer_css_numbering():
+    extension_configs = {"ThmsExtension": {
+        **EXTENSION_CONFIGS["ThmsExtension"], "thm_counter_config": {"numbering": "css", "add_html_elem": True}
+    }}
+    renderer = Renderer(extension_configs)
+    fixture = read_file("thms/thm_ref/success_3.txt")
+    html = renderer.convert(fixture)
+    thm_ref_map = renderer.get_thm_ref_map()
+    # `\ref{}`s resolve to the same text as with server numbering, just without the counters' `<span>`s
+    server_renderer = Renderer(EXTENSION_CONFIGS)
+    server_renderer.convert(fixture)
+    assert thm_ref_map == server_renderer.get_thm_ref_map()
+
+    expected = canonicalize(tree.parse_html_fragment(html))
+    assert canonicalize(tree.get_content(renderer.convert_tree(fixture))) == expected
+    assert renderer.get_thm_ref_map() == thm_ref_map
+    assert "".join(renderer.convert_stream(fixture, batch_blocks=1)) == html
+
+
+def test_renderer_update_parts_css_numbering():
+    extension_configs = {"ThmsExtension": {
+        **EXTENSION_CONFIGS["ThmsExtension"], "thm_counter_config": {"numbering": "css"}
+    }}
+    renderer = Renderer(extension_configs, resolve_refs=False)
+    texts = [
+        "\\begin{thm}[a]\nhi\n\\end{thm}",
+        "{{1}}{sec}\n\n\\begin{lem}{b}\nho\n\\end{lem}",
+        "see \\ref{a}, \\ref{sec}, and \\ref{b}"
+    ]
+    parts = [DocumentPart(text=text) for text in texts]
+    changed, thm_ref_map = renderer.update_parts(parts, {})
+    assert changed == [0, 1, 2]
+    assert parts[2].html == "<p>see Theorem 0.0.1, 1, and Lemma 1.0.1</p>"
+
+    # inserting a theorem before the others renumbers their `\ref{}`s without rendering them again
+    parts[0].text = "\\begin{thm}\nnew\n\\end{thm}\n\n" + texts[0]
+    parts[0].changed = True
+    unresolved_html = parts[1].unresolved_html
+    changed, thm_ref_map = renderer.update_parts(parts, thm_ref_map)
+    assert changed == [0, 2]
+    assert parts[1].unresolved_html is unresolved_html
+    assert parts[2].html == "<p>see Theorem 0.0.2, 1, and Lemma 1.0.1</p>"
+
+    parts[1].text = "{{0,1}}{sec}\n\n\\begin{lem}{b}\nho\n\\end{lem}"
+    parts[1].changed = True
+    changed, thm_ref_map = renderer.update_parts(parts, thm_ref_map)
+    assert parts[2].html == "<p>see Theorem 0.0.2, 0.1, and Lemma 0.1.1</p>"
+
+    # same as rendering everything from scratch
+    fresh_parts = [DocumentPart(text=part.text) for part in parts]
+    assert renderer.update_parts(fresh_parts, {})[1] == thm_ref_map
+    assert [part.html for part in fresh_parts] == [part.html for part in parts]
@@ -1,7 +1,10 @@
+import re
+
+import markdown
 import pytest
 
 from markdown_environments import ThmsExtension
-from ..tests_utils import run_extension_test
+from ..tests_utils import read_file, run_extension_test
 
 
 DIV_TYPES = {
@@ -65,3 +68,27 @@ DROPDOWN_TYPES = {
 )
 def test_thms(extension, filename_base):
     run_extension_test([extension], filename_base)
+
+
+def test_thms_compact():
+    def convert(compact: bool) -> str:
+        extension = ThmsExtension(
+            div_config={"types": DIV_TYPES, "compact": compact},
+            dropdown_config={
+                "types": DROPDOWN_TYPES, "summary_html_class": " md-dropdown__summary  mb-0", "compact": compact
+            },
+            thm_counter_config={"add_html_elem": True},
+            thm_heading_config={
+                "html_class": "md-thm-heading", "emph_html_class": "md-thm-heading__emph", "compact": compact
+            }
+        )
+        return markdown.markdown(read_file("thms/success_1.txt"), extensions=[extension])
+
+    html = convert(False)
+    compact_html = convert(True)
+    # same ids and text (so `\ref{}`s resolve the same), but one element fewer per theorem heading
+    assert re.findall(r'id="([^"]*)"', compact_html) == re.findall(r'id="([^"]*)"', html)
+    assert re.sub(r"<[^>]*>", "", compact_html) == re.sub(r"<[^>]*>", "", html)
+    assert compact_html.count("<span") == html.count("<span") - html.count('class="md-thm-heading"')
+    assert 'class=" md-thm"' in html and 'class="md-thm"' in compact_html
+    assert re.search(r'class="(?: |[^"]* (?: |"))', compact_html) is None
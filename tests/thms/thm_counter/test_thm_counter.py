@@ -1,6 +1,8 @@
+import markdown
 import pytest
 
 from markdown_environments import ThmsExtension
+from markdown_environments.thms import css_counter_stylesheet
 from ...tests_utils import run_extension_test
 
 
@@ -22,8 +24,52 @@ from ...tests_utils import run_extension_test
             ThmsExtension(thm_counter_config={"add_html_elem": True, "html_id_prefix": "alice", "html_class": "bob"}),
             "thms/thm_counter/success_5"
         ),
+        (
+            ThmsExtension(thm_counter_config={"numbering": "css", "html_class": "md-counter"}),
+            "thms/thm_counter/success_6"
+        ),
+        # `add_html_elem` ids would depend on position, so they're left out
+        (
+            ThmsExtension(thm_counter_config={"numbering": "css", "add_html_elem": True, "css_counter_name": "c"}),
+            "thms/thm_counter/success_7"
+        ),
         (ThmsExtension(), "thms/thm_counter/fail_1")
     ]
 )
 def test_thm_counter(extension, filename_base):
     run_extension_test([extension], filename_base)
+
+
+def test_css_counter_stylesheet():
+    assert css_counter_stylesheet(["0,1", "1", "0,01", "0,0"], counter_name="c", scope="article") == (
+        'article { counter-reset: c-0 0 c-1 0; }\n'
+        '[data-thm-counter="0,0"]::before { content: counter(c-0) "." counter(c-1); }\n'
+        '[data-thm-counter="0,1"] { counter-increment: c-1 1; }\n'
+        '[data-thm-counter="0,1"]::before { content: counter(c-0) "." counter(c-1); }\n'
+        '[data-thm-counter="1"] { counter-increment: c-0 1; counter-set: c-1 0; }\n'
+        '[data-thm-counter="1"]::before { content: counter(c-0); }\n'
+    )
+    assert css_counter_stylesheet(["2,1"], thm_counter=[3, 4, 5]) == (
+        ':root { counter-reset: thm-counter-0 3 thm-counter-1 4 thm-counter-2 5; }\n'
+        '[data-thm-counter="2,1"] { counter-increment: thm-counter-0 2; '
+        'counter-set: thm-counter-1 1 thm-counter-2 0; }\n'
+        '[data-thm-counter="2,1"]::before { content: counter(thm-counter-0) "." counter(thm-counter-1); }\n'
+    )
+    assert css_counter_stylesheet([]) == ""
+
+
+def test_thm_counter_css_numbering():
+    types = {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}, "sec": {"thm_type": "Section"}}
+    text = (
+        "\\begin{thm}[a]\nhi {{1}}{b}\n\\end{thm}\n\n\\begin{thm}{c}\nho\n\\end{thm}\n\n"
+        "\\ref{a}, \\ref{b}, \\ref{c}"
+    )
+    extension = ThmsExtension(div_config={"types": types}, thm_counter_config={"numbering": "css"})
+    html = markdown.markdown(text, extensions=[extension])
+    # `\ref{}`s get the digits server numbering would have output
+    assert html.endswith("<p>Theorem 0.1, 1, Theorem 1.1</p>")
+    assert "0.1" not in html.split("<p>Theorem 0.1")[0]
+    assert extension.get_css_counter_stylesheet().count("::before") == 2
+
+    with pytest.raises(ValueError):
+        ThmsExtension(thm_counter_config={"numbering": "client"})
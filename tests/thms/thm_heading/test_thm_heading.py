@@ -18,6 +18,13 @@ from ...tests_utils import run_extension_test
             }),
             "thms/thm_heading/success_6"
         ),
+        (
+            ThmsExtension(thm_heading_config={
+                "html_id_prefix": "defenestrate-", "html_class": "bottom-text", "emph_html_class": "top-text",
+                "compact": True
+            }),
+            "thms/thm_heading/success_9"
+        ),
 
         # test that curly braces (e.g. from LaTeX) don't interfere with parsing
         (ThmsExtension(), "thms/thm_heading/success_7"),
@@ -1,3 +1,6 @@
+import re
+
+import markdown
 import pytest
 
 from markdown_environments.thms import *
@@ -116,3 +119,47 @@ def test_prepend_thm_heading_md():
     assert elem.text == "outside para"
     assert para_1.text == "sd inside para 1" # should prepend into this only
     assert para_2.text == "inside para 2"
+
+
+def test_lru_cache():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3) # evicts "b", since "a" was used more recently
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_fingerprint_config():
+    assert fingerprint_config({"a": 1, "b": {"c": [2]}}) == fingerprint_config({"b": {"c": [2]}, "a": 1})
+    assert fingerprint_config({"a": 1}) != fingerprint_config({"a": "1"})
+
+
+def test_block_search():
+    pattern = re.compile(r"^\\end{a}", flags=re.MULTILINE)
+    block_search = BlockSearch()
+    blocks = ["\\begin{a}", "x", "y", "\\end{a}"]
+    assert block_search.find(blocks, pattern) == 3
+    assert block_search.find(blocks, pattern, start_block="\\end{a}") == 0
+    blocks = ["\\begin{a}", "x", "y", "z"]
+    assert block_search.find(blocks, pattern) is None
+    # blocks after the first are remembered not to match, even if the first block is replaced
+    blocks[0] = "\\end{a}"
+    assert block_search.find(blocks, pattern) == 0
+    # but not once the list ends differently
+    blocks[2] = "\\end{a}"
+    blocks.append("w")
+    assert block_search.find(blocks, pattern, start=1) == 2
+
+    # nor once blocks are removed from the middle of it, by any `BlockSearch` of the same `markdown.Markdown` object
+    md = markdown.Markdown()
+    block_search = BlockSearch(md)
+    other_block_search = BlockSearch(md)
+    blocks = ["\\begin{a}", "\\end{a}", "x", "y", "z"]
+    assert block_search.find(blocks, pattern, start=2) is None
+    del blocks[2:4]
+    other_block_search.forget(blocks)
+    assert block_search.find(blocks, pattern, start=1) == 1
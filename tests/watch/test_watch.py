@@ -0,0 +1,51 @@
+import os
+
+from markdown_environments.watch import Watcher
+
+
+EXTENSION_CONFIGS = {
+    "ThmsExtension": {"div_config": {"types": {"thm": {"thm_type": "Theorem", "thm_counter_incr": "0,1"}}}}
+}
+
+
+def write(path, text: str, mtime_ns: int):
+    path.write_text(text)
+    # make sure the change is noticed even on filesystems with coarse timestamps
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_watcher(tmp_path):
+    ch1 = tmp_path / "ch1.md"
+    ch2 = tmp_path / "ch2.md"
+    out_dir = tmp_path / "out"
+    write(ch1, "\\begin{thm}{a}\nhi\n\\end{thm}\n\nsee \\ref{b}", 1)
+    write(ch2, "\\begin{thm}{b}\nhi\n\\end{thm}\n\nsee \\ref{a}", 1)
+    watcher = Watcher(EXTENSION_CONFIGS, [str(ch1), str(ch2)], str(out_dir))
+
+    assert watcher.update() == [str(out_dir / "ch1.html"), str(out_dir / "ch2.html")]
+    assert (out_dir / "ch1.html").read_text().endswith("<p>see Theorem 0.2</p>")
+    assert (out_dir / "ch2.html").read_text().endswith("<p>see Theorem 0.1</p>")
+    assert watcher.update() == []
+
+    # editing without changing numbering or labels only rewrites the edited file
+    write(ch2, "\\begin{thm}{b}\nhello\n\\end{thm}\n\nsee \\ref{a}", 2)
+    assert watcher.update() == [str(out_dir / "ch2.html")]
+
+    # inserting a theorem renumbers the next file, and `\ref{}`s to it in earlier files
+    write(ch1, "\\begin{thm}\nnew\n\\end{thm}\n\n\\begin{thm}{a}\nhi\n\\end{thm}\n\nsee \\ref{b}", 3)
+    assert watcher.update() == [str(out_dir / "ch1.html"), str(out_dir / "ch2.html")]
+    assert (out_dir / "ch1.html").read_text().endswith("<p>see Theorem 0.3</p>")
+    assert (out_dir / "ch2.html").read_text().endswith("<p>see Theorem 0.2</p>")
+
+
+def test_watcher_separate_numbering(tmp_path):
+    ch1 = tmp_path / "ch1.md"
+    ch2 = tmp_path / "ch2.md"
+    write(ch1, "\\begin{thm}\nhi\n\\end{thm}", 1)
+    write(ch2, "\\begin{thm}\nhi\n\\end{thm}", 1)
+    watcher = Watcher(EXTENSION_CONFIGS, [str(ch1), str(ch2)], str(tmp_path), shared_numbering=False)
+    watcher.update()
+    assert (tmp_path / "ch1.html").read_text() == (tmp_path / "ch2.html").read_text()
+
+    write(ch1, "\\begin{thm}\nhi\n\\end{thm}\n\n\\begin{thm}\nhi\n\\end{thm}", 2)
+    assert watcher.update() == [str(tmp_path / "ch1.html")]